@@ -0,0 +1,317 @@
+"""
+Character based word embeddings: encoding text into character index tensors, batching sentences and a CNN model
+"""
+import collections
+import logging
+import random
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data import Dataset, DataLoader, Sampler
+
+LOGGER = logging.getLogger(__name__)
+
+PAD_TOKEN: str = '<pad>'
+UNK_TOKEN: str = '<unk>'
+DEFAULT_ALPHABET: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
+
+
+class CharEncoder:
+    """
+    Maps words to fixed length arrays of character indices
+
+    Characters of the alphabet are mapped to their position in the alphabet, <pad> and <unk> tokens are mapped to
+    len(alphabet) and len(alphabet)+1 respectively (same as char2index in character_based_embeddings_cnn notebook)
+    Words longer than max_word_len are truncated, shorter words are padded with <pad> token
+
+    Characters are looked up in a table indexed by unicode codepoint, all words of a batch at once
+    """
+    def __init__(self, alphabet: str = DEFAULT_ALPHABET, max_word_len: int = 15):
+        self.alphabet = alphabet
+        self.max_word_len = max_word_len
+        self.char2index: dict = {ch: i for i, ch in enumerate(alphabet)}
+        self.char2index[PAD_TOKEN] = len(self.char2index)
+        self.char2index[UNK_TOKEN] = len(self.char2index)
+        self.pad_index: int = self.char2index[PAD_TOKEN]
+        self.unk_index: int = self.char2index[UNK_TOKEN]
+        # codepoint -> index lookup table, codepoints beyond the table are unknown characters
+        self._lookup_table = np.full(max(ord(ch) for ch in alphabet) + 1 if alphabet else 1, self.unk_index,
+                                     dtype=np.int64)
+        for i, ch in enumerate(alphabet):
+            self._lookup_table[ord(ch)] = i
+
+    @property
+    def n_chars(self) -> int:
+        """
+        No.of character indices, including <pad> and <unk> tokens, i.e. no.of character embeddings needed
+        """
+        return len(self.char2index)
+
+    def encode_chars(self, text: str) -> np.ndarray:
+        """
+        Returns character indices of all characters in given text
+        """
+        codepoints = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+        known = codepoints < len(self._lookup_table)
+        return np.where(known, self._lookup_table[np.where(known, codepoints, 0)], self.unk_index)
+
+    def encode_words(self, words: list) -> np.ndarray:
+        """
+        Returns an array of shape (len(words), max_word_len) of character indices
+        """
+        truncated_words = [word[:self.max_word_len] for word in words]
+        lengths = np.fromiter((len(word) for word in truncated_words), dtype=np.int64, count=len(words))
+        encoded = np.full((len(words), self.max_word_len), self.pad_index, dtype=np.int64)
+        if lengths.sum():
+            # row/column of every character in the encoded array
+            rows = np.repeat(np.arange(len(words)), lengths)
+            starts = np.cumsum(lengths) - lengths
+            columns = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+            encoded[rows, columns] = self.encode_chars(''.join(truncated_words))
+        return encoded
+
+    def encode_batch(self, sentences: list, max_sent_len: int = None) -> torch.Tensor:
+        """
+        sentences: list of sentences, each sentence is a list of words
+        max_sent_len: sentences longer than max_sent_len words are truncated
+
+        Returns a tensor of shape (len(sentences), sentence_length, max_word_len), sentence_length is the no.of words
+        in the longest sentence of the batch (capped at max_sent_len). Shorter sentences are padded with words made of
+        <pad> tokens
+        """
+        if max_sent_len is not None:
+            sentences = [sentence[:max_sent_len] for sentence in sentences]
+        sent_lengths = np.fromiter((len(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences))
+        batch_sent_len = int(sent_lengths.max()) if len(sentences) else 0
+        batch = np.full((len(sentences), batch_sent_len, self.max_word_len), self.pad_index, dtype=np.int64)
+        if sent_lengths.sum():
+            rows = np.repeat(np.arange(len(sentences)), sent_lengths)
+            starts = np.cumsum(sent_lengths) - sent_lengths
+            columns = np.arange(sent_lengths.sum()) - np.repeat(starts, sent_lengths)
+            batch[rows, columns] = self.encode_words([word for sentence in sentences for word in sentence])
+        return torch.from_numpy(batch)
+
+
+class SentenceDataset(Dataset):
+    """
+    A dataset of sentences (each sentence is a list of words) and, optionally, their labels
+    """
+    def __init__(self, sentences: list, labels=None):
+        self.sentences = sentences
+        self.labels = labels
+
+    @classmethod
+    def from_texts(cls, texts, labels=None):
+        """
+        texts: iterable of strings, split into words on whitespaces
+        """
+        return cls([text.split() for text in texts], labels)
+
+    def get_lengths(self) -> list:
+        return [len(sentence) for sentence in self.sentences]
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def __getitem__(self, i):
+        if self.labels is None:
+            return self.sentences[i]
+        return self.sentences[i], self.labels[i]
+
+
+class CharBatchCollator:
+    """
+    Converts a list of SentenceDataset items into a batch tensor (see CharEncoder.encode_batch), or a tuple
+    (batch tensor, labels tensor) if the dataset has labels. Used as DataLoader's collate_fn
+    """
+    def __init__(self, encoder: CharEncoder, max_sent_len: int = None):
+        self.encoder = encoder
+        self.max_sent_len = max_sent_len
+
+    def __call__(self, items: list):
+        if items and isinstance(items[0], tuple):
+            sentences, labels = zip(*items)
+            return self.encoder.encode_batch(list(sentences), self.max_sent_len), torch.tensor(labels)
+        return self.encoder.encode_batch(items, self.max_sent_len)
+
+
+class BucketBatchSampler(Sampler):
+    """
+    Yields batches of indices, such that sentences in a batch have similar lengths, to reduce padding
+
+    Indices are shuffled, split into pools of batch_size*pool_batches indices, each pool is sorted by sentence length
+    and cut into batches. Finally, the order of batches is shuffled
+    """
+    def __init__(self, lengths: list, batch_size: int, pool_batches: int = 50, shuffle: bool = True, seed=None):
+        self.lengths = lengths
+        self.batch_size = batch_size
+        self.pool_batches = pool_batches
+        self.shuffle = shuffle
+        self._rng = random.Random(seed)
+
+    def _get_batches(self) -> list:
+        indices = list(range(len(self.lengths)))
+        if self.shuffle:
+            self._rng.shuffle(indices)
+        pool_size = self.batch_size * self.pool_batches
+        batches = []
+        for start in range(0, len(indices), pool_size):
+            pool = sorted(indices[start:start + pool_size], key=lambda i: self.lengths[i])
+            batches.extend(pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size))
+        if self.shuffle:
+            self._rng.shuffle(batches)
+        return batches
+
+    def __iter__(self):
+        return iter(self._get_batches())
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
+def get_char_data_loader(dataset: SentenceDataset, encoder: CharEncoder, batch_size: int, max_sent_len: int = None,
+                         bucket: bool = True, shuffle: bool = True, seed=None, **kwargs) -> DataLoader:
+    """
+    Returns a DataLoader of character index tensors for given dataset
+    bucket: batch sentences of similar lengths together, see BucketBatchSampler
+    kwargs: passed on to DataLoader. Eg: num_workers
+    """
+    collate_fn = CharBatchCollator(encoder, max_sent_len)
+    if bucket:
+        batch_sampler = BucketBatchSampler(dataset.get_lengths(), batch_size, shuffle=shuffle, seed=seed)
+        return DataLoader(dataset, batch_sampler=batch_sampler, collate_fn=collate_fn, **kwargs)
+    generator = torch.Generator().manual_seed(seed) if seed is not None else None
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, collate_fn=collate_fn, generator=generator,
+                      **kwargs)
+
+
+class CharBasedCNN(nn.Module):
+    """
+    Computes word embeddings from character embeddings: character embedding lookup, 1-D convolution over characters of
+    each word, followed by max pooling. See character_based_embeddings_cnn notebook for an illustration
+
+    Inference optimizations:
+        > dedup_words: embeddings are computed once per distinct word of a batch, instead of once per word occurrence
+        > embedding_cache_size: when > 0 and the module is in eval mode, embeddings of up to embedding_cache_size most
+          recently seen words are cached across batches. The cache is cleared when switching between train and eval
+          modes, and when loading a state dict. Call clear_embedding_cache after modifying parameters in eval mode
+    """
+    def __init__(self, char_embed_size, n_char_embeddings,
+                 conv_output_channels, conv_kernel_size,
+                 use_maxpool_1d=False, dedup_words: bool = False, embedding_cache_size: int = 0,
+                 verbose: bool = False):
+        """
+        char_embed_size: size of character embedding vector (hyperparameter)
+        n_char_embeddings: no.of character embeddings = no.of chars in the alphabet + 2 (<pad> & <unk>)
+        conv_output_channels: no.of output channels from convolution layer (hyperparameter)
+        conv_kernel_size: convolution kernel size (hyperparameter)
+        use_maxpool_1d: only used to compare nn.MaxPool1d and torch.max
+        dedup_words: compute embeddings of distinct words only
+        embedding_cache_size: max no.of word embeddings cached across batches, in eval mode. 0 disables the cache
+        verbose: print shapes of intermediate tensors
+        """
+        super(CharBasedCNN, self).__init__()
+        self.use_maxpool_1d = use_maxpool_1d
+        self.dedup_words = dedup_words
+        self.embedding_cache_size = embedding_cache_size
+        self.verbose = verbose
+        self.embedding = nn.Embedding(num_embeddings=n_char_embeddings,
+                                      embedding_dim=char_embed_size)
+        self.conv1d = nn.Conv1d(in_channels=char_embed_size, out_channels=conv_output_channels,
+                                kernel_size=conv_kernel_size)
+        self._embedding_cache = collections.OrderedDict()
+        self.n_computed_words = 0
+
+    def _log(self, message: str, *args):
+        if self.verbose:
+            print(message.format(*args))
+
+    def _compute_word_embeddings(self, words: torch.Tensor) -> torch.Tensor:
+        """
+        words: a 2-d tensor of shape (word_count, word_length)
+        Returns a tensor of shape (word_count, conv_output_channels)
+        """
+        self.n_computed_words += words.shape[0]
+
+        # lookup character embeddings, resulting tensor is of shape (word_count, word_length, char_embed_size)
+        input_char_embed_3d = self.embedding(words)
+        self._log('char embeded input 3d shape = {}', input_char_embed_3d.shape)
+
+        # nn.Conv1d convolves along the last dimension
+        # We need the convolution to run on characters of a word -- the 2nd dimension
+        # Transpose the tensor to get it into required shape
+        conv_input = input_char_embed_3d.transpose(dim0=1, dim1=2)
+        self._log('conv1d input shape = {}', conv_input.shape)
+
+        conv_out = self.conv1d(conv_input)
+        F.relu_(conv_out)
+        self._log('conv1d output shape = {}', conv_out.shape)
+
+        if self.use_maxpool_1d:
+            max_1d = nn.MaxPool1d(kernel_size=conv_out.shape[-1], stride=1)
+            maxpool_out = max_1d(conv_out).squeeze(dim=2)
+        else:
+            maxpool_out, _ = conv_out.max(dim=2)
+        self._log('maxpool out shape = {}', maxpool_out.shape)
+        return maxpool_out
+
+    def _get_cached_word_embeddings(self, words: torch.Tensor) -> torch.Tensor:
+        """
+        Same as _compute_word_embeddings, but only computes embeddings of words missing in the cache
+        """
+        cache = self._embedding_cache
+        keys = [word.tobytes() for word in words.cpu().numpy()]
+        embeddings = [cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            for i, embedding in zip(missing, self._compute_word_embeddings(words[missing])):
+                embeddings[i] = embedding
+        for key, embedding in zip(keys, embeddings):
+            cache[key] = embedding
+            cache.move_to_end(key)
+        while len(cache) > self.embedding_cache_size:
+            cache.popitem(last=False)
+        return torch.stack(embeddings) if embeddings else self._compute_word_embeddings(words)
+
+    def clear_embedding_cache(self):
+        self._embedding_cache.clear()
+
+    def train(self, mode: bool = True):
+        # parameters are only updated in train mode (Eg: optimizer steps), cached embeddings may be stale after it
+        self.clear_embedding_cache()
+        return super(CharBasedCNN, self).train(mode)
+
+    def load_state_dict(self, state_dict, *args, **kwargs):
+        self.clear_embedding_cache()
+        return super(CharBasedCNN, self).load_state_dict(state_dict, *args, **kwargs)
+
+    def forward(self, input):
+        """
+        Input is a tensor of dimension (batch_size, sentence_length, word_length)
+        batch_size = no.of sentences in the batch
+        sentence_length = no.of words in the sentence
+        word_length = no.of chars in the word
+        """
+        self._log('input shape = {}', input.shape)
+
+        # merge 1st 2 dimensions into a single dimension, to get a 2-d tensor of shape (word_count, word_length)
+        # word_count = batch_size * sentence_length
+        words = input.reshape(-1, input.shape[2])
+        use_cache = self.embedding_cache_size > 0 and not self.training
+        if self.dedup_words or use_cache:
+            unique_words, inverse = torch.unique(words, dim=0, return_inverse=True)
+            self._log('distinct words = {} of {}', unique_words.shape[0], words.shape[0])
+            if use_cache:
+                with torch.no_grad():
+                    unique_embeddings = self._get_cached_word_embeddings(unique_words)
+            else:
+                unique_embeddings = self._compute_word_embeddings(unique_words)
+            word_embeddings = unique_embeddings[inverse]
+        else:
+            word_embeddings = self._compute_word_embeddings(words)
+
+        output = word_embeddings.view(input.shape[0], input.shape[1], -1)
+        self._log('maxpool out final shape = {}\n', output.shape)
+        return output
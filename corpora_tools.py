@@ -1,54 +1,305 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import cProfile
+import json
 import logging
 import sys
+import time
 
-from corpora_utils import sample_stanford_imdb_dataset, get_stanford_imbd_vocabulary, \
-    STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, CORPORA_CONFIG_SECTION, STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, \
-    STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, get_stanford_imdb_markup_vocabulary
-from utils import ConfigHelper
+import numpy as np
+
+from corpora_utils import sample_stanford_imdb_dataset, STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, \
+    CORPORA_CONFIG_SECTION, STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, \
+    analyze_stanford_imdb_corpora, get_stanford_imdb_vocabulary_store, load_stanford_imdb_train_sparse_data, \
+    load_stanford_imdb_dev_sparse_data, get_stanford_imdb_labels_hashed_features, get_default_text_pipeline
+from features import vstack_csr_matrices, HashingVectorizer
+from linear_models import LinearClassifier
+from metrics import BinaryClassificationMetrics
+from model_selection import get_grid_configs, get_random_configs, get_k_fold_ids, get_holdout_fold_ids, run_sweep
+from scoring import LinearTextModel, DEFAULT_CHUNK_SIZE, iter_chunk_scores, get_scoring_server
+from utils import ConfigHelper, ProfileHelper, FileHelper
 
 LOGGER = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
 
-def _sample_stanford_imdb_dataset():
-    sample_stanford_imdb_dataset()
-
-
-def _analyze_stanford_imdb_data():
-    vocab: set = get_stanford_imbd_vocabulary(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH,
-                                                                            CORPORA_CONFIG_SECTION))
-    vocab.update(get_stanford_imbd_vocabulary(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH,
-                                                                            CORPORA_CONFIG_SECTION)))
-    vocab.update(get_stanford_imbd_vocabulary(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH,
-                                                                            CORPORA_CONFIG_SECTION)))
-    for word in sorted(vocab):
-        print(word)
-    print('Vocabulary size: %s' % len(vocab))
-
-    markup_vocab: set = get_stanford_imdb_markup_vocabulary(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH,
-                                                                                          CORPORA_CONFIG_SECTION))
-    markup_vocab.update(get_stanford_imdb_markup_vocabulary(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH,
-                                                                                          CORPORA_CONFIG_SECTION)))
-    markup_vocab.update(get_stanford_imdb_markup_vocabulary(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH,
-                                                                                          CORPORA_CONFIG_SECTION)))
-    for word in sorted(markup_vocab):
-        print(word)
-    print('Markup vocabulary size: %s' % len(markup_vocab))
-
-
-def _main():
-    valid_commands = {
-        'sample-stanford-imdb': _sample_stanford_imdb_dataset,
-        'analyze-stanford-imdb': _analyze_stanford_imdb_data,
+def _sample_stanford_imdb_dataset(args):
+    sample_stanford_imdb_dataset(streaming=args.streaming, n_shards=args.shards, compress=args.gzip)
+
+
+def _analyze_stanford_imdb_data(args):
+    file_paths = {
+        'train': ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, CORPORA_CONFIG_SECTION),
+        'dev': ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, CORPORA_CONFIG_SECTION),
+        'test': ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, CORPORA_CONFIG_SECTION),
     }
-    cmd = sys.argv[1]
-    if cmd in valid_commands:
-        valid_commands[cmd]()
+    summary = analyze_stanford_imdb_corpora(file_paths, top_k=args.top_k if args.top_k > 0 else None)
+    if args.format == 'json':
+        print(json.dumps(summary, indent=2))
+        return
+
+    for name, stats in summary['files'].items():
+        print('== {} ({})'.format(name, file_paths[name]))
+        print('Reviews: {}, labels: {}'.format(stats['n_docs'], stats['label_counts']))
+        print('Words: {}, vocabulary size: {}, markup vocabulary size: {}'.format(
+            stats['n_words'], stats['vocabulary_size'], stats['markup_vocabulary_size']))
+        print('Review length (words): min {min}, max {max}, mean {mean:.1f}, median {median:.1f}'.format(
+            **stats['doc_length']))
+        if 'oov' in stats:
+            print('OOV rate w.r.t. {}: {:.2%} of words, {:.2%} of distinct words'.format(
+                stats['oov']['reference'], stats['oov']['word_rate'], stats['oov']['distinct_word_rate']))
+        print('Top words: {}'.format(' '.join('{}:{}'.format(w, c) for w, c in stats['top_words'])))
+        print('Top markups: {}'.format(' '.join('{}:{}'.format(m, c) for m, c in stats['top_markups'])))
+    print('Vocabulary size: %s' % summary['vocabulary_size'])
+    print('Markup vocabulary size: %s' % summary['markup_vocabulary_size'])
+
+
+def _update_stanford_imdb_vocabulary(args):
+    store = get_stanford_imdb_vocabulary_store(store_path=args.store)
+    for file_path, source in store.sources.items():
+        print('{}: {} bytes read'.format(file_path, source['offset']))
+    vocabulary = store.to_vocabulary(args.min_count, args.max_size if args.max_size > 0 else None)
+    print('Vocabulary size: {} ({} after pruning), words: {}'.format(len(store), len(vocabulary), store.total_count))
+    print('Top words: {}'.format(' '.join('{}:{}'.format(w, c) for w, c in store.most_common(args.top_k))))
+    if args.output:
+        vocabulary.save(args.output)
+
+
+def _sweep_stanford_imdb_classifier(args):
+    train_labels, train_features, vocabulary = load_stanford_imdb_train_sparse_data()
+    dev_labels, dev_features, _ = load_stanford_imdb_dev_sparse_data(vocabulary)
+    features = vstack_csr_matrices([train_features, dev_features])
+    labels = np.concatenate([train_labels, dev_labels])
+    if args.folds > 1:
+        fold_ids = get_k_fold_ids(len(labels), args.folds, args.seed)
     else:
-        raise Exception('Invalid command %s. Valid commands are %s' % (cmd, valid_commands.keys()))
+        fold_ids = get_holdout_fold_ids(len(train_labels), len(dev_labels))
+
+    param_grid = {'eta': args.eta, 'n_epochs': args.epochs, 'alpha': args.alpha, 'batch_size': args.batch_size}
+    if args.search == 'grid':
+        configs = get_grid_configs(param_grid)
+    else:
+        configs = get_random_configs(param_grid, args.n_configs, args.seed)
+    results = run_sweep(features, labels, fold_ids, configs,
+                        base_params={'loss': args.loss, 'learning_rate': args.learning_rate, 'seed': args.seed},
+                        n_workers=args.workers if args.workers > 0 else None)
+    if args.format == 'json':
+        print(json.dumps(results, indent=2))
+        return
+
+    print('{:>10} {:>7} {:>10} {:>11} {:>15} {:>10} {:>10} {:>8} {:>9}'.format(
+        'eta', 'epochs', 'alpha', 'batch_size', 'accuracy', 'precision', 'recall', 'fit(s)', 'eval(s)'))
+    for result in results:
+        params = result['params']
+        print('{:>10g} {:>7} {:>10g} {:>11} {:>8.4f}±{:.4f} {:>10.4f} {:>10.4f} {:>8.2f} {:>9.2f}'.format(
+            params['eta'], params['n_epochs'], params['alpha'], params['batch_size'], result['accuracy_mean'],
+            result['accuracy_std'], result['precision_mean'], result['recall_mean'], result['fit_seconds'],
+            result['eval_seconds']))
+
+
+def _train_stanford_imdb_classifier(args):
+    text_pipeline = get_default_text_pipeline()
+    classifier = LinearClassifier(loss=args.loss, eta=args.eta, learning_rate=args.learning_rate, alpha=args.alpha,
+                                  batch_size=args.batch_size, n_epochs=args.epochs, seed=args.seed)
+    if args.hash_features > 0:
+        vectorizer = HashingVectorizer(args.hash_features)
+        train_labels, train_features = get_stanford_imdb_labels_hashed_features(
+            ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, CORPORA_CONFIG_SECTION), vectorizer,
+            text_pipeline)
+        dev_labels, dev_features = get_stanford_imdb_labels_hashed_features(
+            ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, CORPORA_CONFIG_SECTION), vectorizer,
+            text_pipeline)
+        model = LinearTextModel.from_classifier(classifier.fit(train_features, train_labels), text_pipeline,
+                                                vectorizer=vectorizer)
+    else:
+        train_labels, train_features, vocabulary = load_stanford_imdb_train_sparse_data()
+        dev_labels, dev_features, _ = load_stanford_imdb_dev_sparse_data(vocabulary)
+        model = LinearTextModel.from_classifier(classifier.fit(train_features, train_labels), text_pipeline,
+                                                vocabulary=vocabulary)
+    metrics = BinaryClassificationMetrics().update(dev_labels, classifier.predict(dev_features))
+    print('Dev accuracy: {:.4f}, precision: {:.4f}, recall: {:.4f}, f1: {:.4f}'.format(
+        metrics.accuracy, metrics.precision, metrics.recall, metrics.f1))
+    model.save(args.output)
+    LOGGER.info('Model saved into %s', args.output)
+
+
+def _iter_input_lines(file_paths: list):
+    for file_path in file_paths or ['-']:
+        if file_path == '-':
+            yield from sys.stdin
+        else:
+            yield from FileHelper.read_lines(file_path)
+
+
+def _score_texts(args):
+    model = LinearTextModel.load(args.model)
+    metrics = BinaryClassificationMetrics()
+    n_texts = 0
+    start = time.perf_counter()
+    for labels, scores in iter_chunk_scores(model, _iter_input_lines(args.files), args.chunk_size, args.labeled):
+        predictions = np.where(scores > 0, 1, -1)
+        if labels is not None:
+            metrics.update(labels, predictions)
+        if not args.quiet:
+            sys.stdout.write(''.join('{}\t{:.6g}\n'.format(prediction, score)
+                                     for prediction, score in zip(predictions.tolist(), scores.tolist())))
+        n_texts += len(scores)
+    seconds = time.perf_counter() - start
+    LOGGER.info('Scored %s texts in %.2fs (%.0f texts/sec)', n_texts, seconds, n_texts / seconds if seconds else 0)
+    if args.labeled:
+        print('Accuracy: {:.4f}, precision: {:.4f}, recall: {:.4f}, f1: {:.4f}'.format(
+            metrics.accuracy, metrics.precision, metrics.recall, metrics.f1), file=sys.stderr)
+
+
+def _serve_model(args):
+    server = get_scoring_server(LinearTextModel.load(args.model), args.host, args.port)
+    LOGGER.info('Scoring texts on http://%s:%s/score', *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _print_profile(summary: dict, file=None):
+    """
+    Prints stages (nested stages indented under their parent stage) and counters recorded by ProfileHelper
+    file: defaults to sys.stderr
+    """
+    file = file if file is not None else sys.stderr
+    print('{:<48} {:>7} {:>10} {:>10} {:>14}'.format('Stage', 'Calls', 'Seconds', 'Items', 'Bytes'), file=file)
+    for name, stage in summary['stages'].items():
+        depth = name.count('/')
+        print('{:<48} {:>7} {:>10.3f} {:>10} {:>14}'.format('  ' * depth + name.rsplit('/', 1)[-1], stage['n_calls'],
+                                                           stage['seconds'], stage['n_items'], stage['n_bytes']),
+              file=file)
+    for name, value in summary['counters'].items():
+        print('{}: {}'.format(name, value), file=file)
+
+
+def _get_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Tools to prepare and analyze corpora')
+    parser.add_argument('--profile', action='store_true',
+                        help='print durations, no.of items and bytes of each stage (to stderr) at the end')
+    parser.add_argument('--profile-output', help='file to write stage durations and counters (JSON) to')
+    parser.add_argument('--cprofile-output', help='file to dump cProfile stats to, see pstats')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    sample_parser = commands.add_parser('sample-stanford-imdb',
+                                        help='Download Stanford IMDB movie reviews and sample train/dev/test sets')
+    sample_parser.add_argument('--streaming', action='store_true',
+                               help='sample while reading the archive, without unpacking it to disk')
+    sample_parser.add_argument('--shards', type=int, default=1, help='no.of files to split each dataset into')
+    sample_parser.add_argument('--gzip', action='store_true', help='gzip dataset files')
+    sample_parser.set_defaults(func=_sample_stanford_imdb_dataset)
+
+    analyze_parser = commands.add_parser('analyze-stanford-imdb',
+                                         help='Print statistics of sampled Stanford IMDB train/dev/test sets')
+    analyze_parser.add_argument('--format', choices=['text', 'json'], default='text', help='output format')
+    analyze_parser.add_argument('--top-k', type=int, default=50,
+                                help='no.of most frequent words/markups to list per file, 0 lists all')
+    analyze_parser.set_defaults(func=_analyze_stanford_imdb_data)
+
+    vocabulary_parser = commands.add_parser('vocabulary-stanford-imdb',
+                                            help='Update the vocabulary store with reviews added to Stanford IMDB '
+                                                 'train/dev/test sets since the last update')
+    vocabulary_parser.add_argument('--store', help="vocabulary store file, defaults to 'vocabulary_store_path' config")
+    vocabulary_parser.add_argument('--min-count', type=int, default=1,
+                                   help='drop words occurring less than this many times from the vocabulary (counts '
+                                        'of all words are kept in the store)')
+    vocabulary_parser.add_argument('--max-size', type=int, default=0,
+                                   help='keep only this many most frequent words in the vocabulary, 0 keeps all')
+    vocabulary_parser.add_argument('--top-k', type=int, default=50, help='no.of most frequent words to list')
+    vocabulary_parser.add_argument('--output', help='file to save the vocabulary into, one word per line')
+    vocabulary_parser.set_defaults(func=_update_stanford_imdb_vocabulary)
+
+    sweep_parser = commands.add_parser('sweep-stanford-imdb',
+                                       help='Search hyperparameters of a linear classifier on Stanford IMDB train/dev '
+                                            'sets, in parallel')
+    sweep_parser.add_argument('--search', choices=['grid', 'random'], default='grid',
+                              help='evaluate all combinations of values, or --n-configs random combinations')
+    sweep_parser.add_argument('--n-configs', type=int, default=10, help='no.of configs evaluated by random search')
+    sweep_parser.add_argument('--eta', type=float, nargs='+', default=[0.001, 0.01, 0.1], help='learning rates')
+    sweep_parser.add_argument('--epochs', type=int, nargs='+', default=[5], help='no.of epochs')
+    sweep_parser.add_argument('--alpha', type=float, nargs='+', default=[0.0],
+                              help='L2 regularization strengths')
+    sweep_parser.add_argument('--batch-size', type=int, nargs='+', default=[32], help='mini-batch sizes')
+    sweep_parser.add_argument('--loss', choices=['hinge', 'log'], default='hinge', help='loss function')
+    sweep_parser.add_argument('--learning-rate', choices=['constant', 'invscaling'], default='constant',
+                              help='learning rate schedule')
+    sweep_parser.add_argument('--folds', type=int, default=0,
+                              help='no.of cross validation folds over train+dev, 0 or 1 trains on train and '
+                                   'evaluates on dev')
+    sweep_parser.add_argument('--workers', type=int, default=0, help='no.of processes, 0 = one per CPU')
+    sweep_parser.add_argument('--seed', type=int, default=0, help='seed for random search, folds and shuffling')
+    sweep_parser.add_argument('--format', choices=['text', 'json'], default='text', help='output format')
+    sweep_parser.set_defaults(func=_sweep_stanford_imdb_classifier)
+
+    train_parser = commands.add_parser('train-stanford-imdb',
+                                       help='Train a linear classifier on Stanford IMDB train set, evaluate it on dev '
+                                            'set and save it as a model file')
+    train_parser.add_argument('--output', required=True, help='model file (.npz) to save')
+    train_parser.add_argument('--hash-features', type=int, default=0,
+                              help='hash words into this many features, 0 maps words with a vocabulary')
+    train_parser.add_argument('--eta', type=float, default=0.01, help='learning rate')
+    train_parser.add_argument('--epochs', type=int, default=5, help='no.of epochs')
+    train_parser.add_argument('--alpha', type=float, default=0.0, help='L2 regularization strength')
+    train_parser.add_argument('--batch-size', type=int, default=32, help='mini-batch size')
+    train_parser.add_argument('--loss', choices=['hinge', 'log'], default='hinge', help='loss function')
+    train_parser.add_argument('--learning-rate', choices=['constant', 'invscaling'], default='constant',
+                              help='learning rate schedule')
+    train_parser.add_argument('--seed', type=int, default=0, help='seed for shuffling')
+    train_parser.set_defaults(func=_train_stanford_imdb_classifier)
+
+    score_parser = commands.add_parser('score', help='Score texts (one per line) with a model file, in chunks. '
+                                                     'Prints a tab separated prediction and score for every text')
+    score_parser.add_argument('--model', required=True, help='model file, see train-stanford-imdb')
+    score_parser.add_argument('files', nargs='*', help="files to score, '-' or none reads stdin")
+    score_parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='no.of texts scored at a time')
+    score_parser.add_argument('--labeled', action='store_true',
+                              help="lines are '<label> <text>' (Eg: dataset files), print metrics to stderr at the end")
+    score_parser.add_argument('--quiet', action='store_true', help='do not print scores')
+    score_parser.set_defaults(func=_score_texts)
+
+    serve_parser = commands.add_parser('serve', help='Score texts with a model file over HTTP. POST {"texts": [...]} '
+                                                     'to /score')
+    serve_parser.add_argument('--model', required=True, help='model file, see train-stanford-imdb')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    serve_parser.add_argument('--port', type=int, default=8000, help='port to listen on')
+    serve_parser.set_defaults(func=_serve_model)
+    return parser
+
+
+def _main(argv=None):
+    args = _get_arg_parser().parse_args(argv)
+    if not (args.profile or args.profile_output or args.cprofile_output):
+        args.func(args)
+        return
+
+    ProfileHelper.reset()
+    ProfileHelper.enable()
+    profiler = cProfile.Profile() if args.cprofile_output else None
+    try:
+        with ProfileHelper.span(args.command):
+            if profiler is not None:
+                profiler.runcall(args.func, args)
+            else:
+                args.func(args)
+    finally:
+        ProfileHelper.enable(False)
+        if profiler is not None:
+            profiler.dump_stats(args.cprofile_output)
+            LOGGER.info('cProfile stats saved into %s', args.cprofile_output)
+        summary = ProfileHelper.get_summary()
+        if args.profile_output:
+            with open(args.profile_output, 'w') as f:
+                json.dump(summary, f, indent=2)
+        if args.profile:
+            _print_profile(summary)
 
 
 if __name__ == '__main__':
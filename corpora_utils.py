@@ -1,37 +1,84 @@
 """
 Utility/helper functions to read corpora
 """
+import array
 import collections
+import functools
 import glob
+import gzip
+import hashlib
+import itertools
 import logging
 import os
 import re
 import shutil
+import tarfile
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
-from utils import ConfigHelper, get_sample_dataset, HttpHelper, FileHelper
+import numpy as np
+
+from features import CsrMatrix, CsrMatrixBuilder, Vocabulary, HashingVectorizer, vstack_csr_matrices, \
+    VocabularyStore
+from text_utils import TextPipeline
+from utils import ConfigHelper, get_sample_dataset, HttpHelper, FileHelper, ReservoirSampler, ArrayCache, \
+    get_chunks, ProfileHelper
 
 LOGGER = logging.getLogger(__name__)
 CORPORA_CONFIG_SECTION: str = 'corpora'
 STANFORD_MOVIE_REVIEW_URL: str = 'stanford_movie_review_dataset_url'
+STANFORD_MOVIE_REVIEW_SHA256: str = 'stanford_movie_review_dataset_sha256'
 STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH: str = 'stanford_movie_review_train_file_path'
 STANFORD_MOVIE_REVIEW_TEST_FILE_PATH: str = 'stanford_movie_review_test_file_path'
 STANFORD_MOVIE_REVIEW_DEV_FILE_PATH: str = 'stanford_movie_review_dev_file_path'
+CORPUS_LOADER_WORKERS: str = 'corpus_loader_workers'
+# no.of shards a file is split into, per worker process, when loading corpora with multiple processes
+SHARDS_PER_WORKER: int = 4
+FEATURE_CACHE_DIR: str = 'feature_cache_dir'
+FEATURE_CACHE_MAX_BYTES: str = 'feature_cache_max_bytes'
+# bump when the layout of cached features changes, to ignore existing cache entries
+FEATURE_CACHE_FORMAT_VERSION: int = 1
+# any substring that begins with < and ends with > is treated as a markup
+MARKUP_PATTERN = re.compile(r'<.*?>')
+DATASET_READER_THREADS: str = 'dataset_reader_threads'
+DEFAULT_READER_THREADS: int = 8
+# no.of sampled review files read concurrently, at a time
+SAVE_DATASET_BATCH_SIZE: int = 256
+WRITE_BUFFER_SIZE: int = 1024 * 1024
+# no.of reviews cleaned and tokenized at a time, see TextPipeline.transform_batch
+TEXT_BATCH_SIZE: int = 1000
+VOCABULARY_STORE_PATH: str = 'vocabulary_store_path'
 HTML_WHITESPACE_PATTERNS: list = [r'<br */?>']
+_default_text_pipeline: TextPipeline = None
+# SHA-256 digests of dataset files, by (absolute path, size, modification time), see _get_file_sha256
+_file_digests: dict = {}
 
 
-def sample_stanford_imdb_dataset(train_size: int = 5000, dev_size: int = 1000, test_size: int = 5000):
+@ProfileHelper.profile()
+def sample_stanford_imdb_dataset(train_size: int = 5000, dev_size: int = 1000, test_size: int = 5000,
+                                 streaming: bool = False, n_shards: int = 1, compress: bool = False):
     """
     Samples from 'Large Movie Review Dataset' and creates a smaller dataset for training, validation and testing
     The corpora is hosted at https://ai.stanford.edu/~amaas/data/sentiment/aclImdb_v1.tar.gz
 
     Files are processed as follows:
-    1. Raw/gzipped file is downloaded to a temp working directory
+    1. Raw/gzipped file is downloaded to a temp working directory. Downloads are cached in 'download_cache_dir'
+       (if configured), so repeat runs don't access the network
     2. gzip file is extracted
     3. train-positive, train-negative, test-positive, test-negative files are selected
     4. a sample (of specified sizes) is selected from all 4 types listed above
     5. read sampled files and save into train, dev and test files
     6. each row in new files contain both text and corresponding label
+
+    When streaming is True, steps 2-5 are replaced with a single pass over the archive members, without extracting
+    the archive to disk. Train/dev and test samples are selected using reservoir sampling. See
+    _sample_stanford_imdb_archive
+
+    n_shards: no.of files each of train, dev and test datasets is split into, see _get_shard_file_paths
+    compress: gzip train, dev and test files. '.gz' is appended to file names
+
+    Durations, no.of files and bytes of each step are recorded as stages, when ProfileHelper is enabled
     """
     # file paths
     # ensure data folder exists
@@ -45,6 +92,9 @@ def sample_stanford_imdb_dataset(train_size: int = 5000, dev_size: int = 1000, t
     temp_folder_path: str = ConfigHelper.get_config_value('temp_dir')
     temp_working_directory: str = '{}/{}'.format(temp_folder_path, str(uuid.uuid4()))
     raw_data_file_path = '{}/{}'.format(temp_working_directory, 'data.tar.gz')
+    train_file_path = ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, CORPORA_CONFIG_SECTION)
+    dev_file_path = ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, CORPORA_CONFIG_SECTION)
+    test_file_path = ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, CORPORA_CONFIG_SECTION)
     LOGGER.debug('Temp working directory: %s', temp_working_directory)
     LOGGER.debug('Data file path: %s', raw_data_file_path)
     LOGGER.debug('Stanford IMDB dataset URL: %s', master_data_set_url)
@@ -55,44 +105,70 @@ def sample_stanford_imdb_dataset(train_size: int = 5000, dev_size: int = 1000, t
 
     try:
         # download
-        _download_file(master_data_set_url, raw_data_file_path)
+        with ProfileHelper.span('download') as span:
+            _download_file(master_data_set_url, raw_data_file_path)
+            span.add(1, os.path.getsize(raw_data_file_path))
+
+        if streaming:
+            LOGGER.debug('Sampling from %s without unpacking', raw_data_file_path)
+            with ProfileHelper.span('sample_archive') as span:
+                train_dev_samples, test_samples = _sample_stanford_imdb_archive(raw_data_file_path,
+                                                                                train_size+dev_size, test_size)
+                span.add(1, os.path.getsize(raw_data_file_path))
+            LOGGER.debug('Saving training dataset to %s', train_file_path)
+            with ProfileHelper.span('save_train') as span:
+                span.add(*_save_samples(train_file_path, train_dev_samples[:train_size], n_shards, compress))
+            LOGGER.debug('Saving dev dataset to %s', dev_file_path)
+            with ProfileHelper.span('save_dev') as span:
+                span.add(*_save_samples(dev_file_path, train_dev_samples[train_size:], n_shards, compress))
+            LOGGER.debug('Saving test dataset to %s', test_file_path)
+            with ProfileHelper.span('save_test') as span:
+                span.add(*_save_samples(test_file_path, test_samples, n_shards, compress))
+            return
 
         # unpack/extract
         LOGGER.debug('Unpacking %s', raw_data_file_path)
-        shutil.unpack_archive(raw_data_file_path, temp_working_directory)
-
-        # collect training files for both positive and negative classes
-        training_class_files: dict = {
-            1: glob.glob('{}/**/train/**/pos/**/*.txt'.format(temp_working_directory), recursive=True),
-            -1: glob.glob('{}/**/train/**/neg/**/*.txt'.format(temp_working_directory), recursive=True)
-        }
-        # collect test files for both positive and negative classes
-        test_class_files: dict = {
-            1: glob.glob('{}/**/test/**/pos/**/*.txt'.format(temp_working_directory), recursive=True),
-            -1: glob.glob('{}/**/test/**/neg/**/*.txt'.format(temp_working_directory), recursive=True)
-        }
+        with ProfileHelper.span('unpack') as span:
+            shutil.unpack_archive(raw_data_file_path, temp_working_directory)
+            span.add(1, os.path.getsize(raw_data_file_path))
+
+        with ProfileHelper.span('glob') as span:
+            # collect training files for both positive and negative classes
+            training_class_files: dict = {
+                1: glob.glob('{}/**/train/**/pos/**/*.txt'.format(temp_working_directory), recursive=True),
+                -1: glob.glob('{}/**/train/**/neg/**/*.txt'.format(temp_working_directory), recursive=True)
+            }
+            # collect test files for both positive and negative classes
+            test_class_files: dict = {
+                1: glob.glob('{}/**/test/**/pos/**/*.txt'.format(temp_working_directory), recursive=True),
+                -1: glob.glob('{}/**/test/**/neg/**/*.txt'.format(temp_working_directory), recursive=True)
+            }
+            span.add(sum(len(files) for files in itertools.chain(training_class_files.values(),
+                                                                 test_class_files.values())))
 
         # sample from the population of train and test files, to create smaller datasets
         # indices collected below are indices to train/test file paths
-        train_dev_indices: list = get_sample_dataset([(c, len(arr)) for c, arr in training_class_files.items()],
-                                                     train_size+dev_size)
-        train_indices: list = train_dev_indices[:train_size]
-        dev_indices: list = train_dev_indices[train_size:]
-        test_indices: list = get_sample_dataset([(c, len(arr)) for c, arr in test_class_files.items()],
-                                                test_size)
+        with ProfileHelper.span('sample') as span:
+            train_dev_indices: list = get_sample_dataset([(c, len(arr)) for c, arr in training_class_files.items()],
+                                                         train_size+dev_size)
+            train_indices: list = train_dev_indices[:train_size]
+            dev_indices: list = train_dev_indices[train_size:]
+            test_indices: list = get_sample_dataset([(c, len(arr)) for c, arr in test_class_files.items()],
+                                                    test_size)
+            span.add(len(train_dev_indices) + len(test_indices))
 
         # read from sampled raw files and save to train/dev/test files
-        train_file_path = ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, CORPORA_CONFIG_SECTION)
         LOGGER.debug('Saving training dataset to %s', train_file_path)
-        _save_dataset(train_file_path, train_indices, training_class_files)
+        with ProfileHelper.span('save_train') as span:
+            span.add(*_save_dataset(train_file_path, train_indices, training_class_files, n_shards, compress))
 
-        dev_file_path = ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, CORPORA_CONFIG_SECTION)
-        LOGGER.debug('Saving dev dataset to %s', train_file_path)
-        _save_dataset(dev_file_path, dev_indices, training_class_files)
+        LOGGER.debug('Saving dev dataset to %s', dev_file_path)
+        with ProfileHelper.span('save_dev') as span:
+            span.add(*_save_dataset(dev_file_path, dev_indices, training_class_files, n_shards, compress))
 
-        test_file_path = ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, CORPORA_CONFIG_SECTION)
-        LOGGER.debug('Saving test dataset to %s', train_file_path)
-        _save_dataset(test_file_path, test_indices, test_class_files)
+        LOGGER.debug('Saving test dataset to %s', test_file_path)
+        with ProfileHelper.span('save_test') as span:
+            span.add(*_save_dataset(test_file_path, test_indices, test_class_files, n_shards, compress))
     finally:
         LOGGER.debug('Deleting temp working directory %s', temp_working_directory)
         shutil.rmtree(temp_working_directory)
@@ -100,15 +176,200 @@ def sample_stanford_imdb_dataset(train_size: int = 5000, dev_size: int = 1000, t
 
 def _download_file(url: str, local_file_path: str):
     LOGGER.debug('Downloading %s and saving into %s', url, local_file_path)
-    HttpHelper.download_file(url, local_file_path)
+    HttpHelper.download_file(url, local_file_path,
+                             sha256=ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_SHA256, CORPORA_CONFIG_SECTION),
+                             cache_dir=ConfigHelper.get_config_value('download_cache_dir'))
+
+
+def _save_dataset(file_path: str, class_indices: list, class_files: dict, n_shards: int = 1,
+                  compress: bool = False, n_threads: int = None):
+    """
+    Reads sampled files and saves them into file_path, one line per file, in the sampled order
+    Files are read concurrently, by a pool of n_threads threads (defaults to 'dataset_reader_threads' config value),
+    in batches of SAVE_DATASET_BATCH_SIZE files
+    See _write_dataset for n_shards and compress
+    """
+    if n_threads is None:
+        n_threads = int(ConfigHelper.get_config_value(DATASET_READER_THREADS, default_value=DEFAULT_READER_THREADS))
+    samples = ((c, class_files[c][i]) for c, i in class_indices)
+    if n_threads <= 1:
+        lines = map(_read_sample_file, samples)
+        return _write_dataset(file_path, lines, len(class_indices), n_shards, compress)
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        lines = (line for batch in get_chunks(samples, SAVE_DATASET_BATCH_SIZE)
+                 for line in executor.map(_read_sample_file, batch))
+        return _write_dataset(file_path, lines, len(class_indices), n_shards, compress)
+
+
+def _read_sample_file(sample: tuple) -> str:
+    """
+    sample: a tuple (<label 1/-1>, <path of review file>). Returns the dataset line of the sample
+    """
+    c, sample_file_path = sample
+    with open(sample_file_path, 'r', encoding='utf-8') as sf:
+        return '{} {}\n'.format(c, sf.read().strip())
+
 
+def _save_samples(file_path: str, samples: list, n_shards: int = 1, compress: bool = False):
+    """
+    samples: list of tuples (<label 1/-1>, <utf-8 encoded review text>)
+    See _write_dataset for n_shards and compress
+    """
+    lines = ('{} {}\n'.format(c, text.decode('utf-8').strip()) for c, text in samples)
+    return _write_dataset(file_path, lines, len(samples), n_shards, compress)
 
-def _save_dataset(file_path: str, class_indices: list, class_files: dict):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for c, i in class_indices:
-            sample_file_path = class_files[c][i]
-            with open(sample_file_path, 'r', encoding='utf-8') as sf:
-                f.write('{} {}\n'.format(c, sf.read().strip()))
+
+def _get_shard_file_paths(file_path: str, n_shards: int, compress: bool = False) -> list:
+    """
+    Returns file paths of all shards of a dataset file
+    Eg: for data/train.txt and 2 shards, returns data/train-00000-of-00002.txt and data/train-00001-of-00002.txt
+    """
+    file_paths = [file_path]
+    if n_shards > 1:
+        root, ext = os.path.splitext(file_path)
+        file_paths = ['{}-{:05d}-of-{:05d}{}'.format(root, i, n_shards, ext) for i in range(n_shards)]
+    if compress:
+        file_paths = ['{}.gz'.format(path) for path in file_paths]
+    return file_paths
+
+
+def _find_shard_file_paths(file_path: str) -> list:
+    """
+    Returns sorted file paths of all existing shards of a dataset file (any no.of shards, gzipped or not)
+    """
+    root, ext = os.path.splitext(file_path)
+    pattern = '{}-{}-of-{}{}'.format(glob.escape(root), '[0-9]' * 5, '[0-9]' * 5, glob.escape(ext))
+    return sorted(glob.glob(pattern) + glob.glob('{}.gz'.format(pattern)))
+
+
+def get_dataset_file_paths(file_path: str) -> list:
+    """
+    Returns files a dataset file was saved into (see sample_stanford_imdb_dataset), in the order of lines: the file
+    itself if it exists, else its gzipped version, else all of its shards. Returns [file_path] if none exist
+    Eg: for data/train.txt saved with 2 gzipped shards, returns data/train-00000-of-00002.txt.gz and
+    data/train-00001-of-00002.txt.gz
+    """
+    for candidate in (file_path, '{}.gz'.format(file_path)):
+        if os.path.exists(candidate):
+            return [candidate]
+    return _find_shard_file_paths(file_path) or [file_path]
+
+
+def _read_dataset_lines(file_path: str):
+    """
+    Reads lines of all files of a dataset file (see get_dataset_file_paths), in order
+    """
+    for dataset_file_path in get_dataset_file_paths(file_path):
+        yield from FileHelper.read_lines(dataset_file_path)
+
+
+def _read_dataset_lines_in_range(file_path: str, start: int, end: int):
+    """
+    Reads lines in byte range [start, end) of file_path, or all of its lines if end is None (Eg: a gzipped file)
+    """
+    if end is None:
+        return FileHelper.read_lines(file_path)
+    return FileHelper.read_lines_in_range(file_path, start, end)
+
+
+def _write_dataset(file_path: str, lines, n_lines: int, n_shards: int = 1, compress: bool = False) -> tuple:
+    """
+    Writes lines into file_path, through a buffer of WRITE_BUFFER_SIZE bytes. Returns a tuple (no.of lines, bytes)
+
+    n_lines: no.of lines, used to split lines across shards
+    n_shards: no.of files to split lines into, see _get_shard_file_paths. Each shard gets a contiguous block of lines,
+        so that reading shards in order reads lines in the original order
+    compress: gzip files
+    Other files of the same dataset (Eg: written with other n_shards) are deleted, see get_dataset_file_paths
+    """
+    start_time = time.perf_counter()
+    file_paths = _get_shard_file_paths(file_path, n_shards, compress)
+    # files of a previous run with other n_shards/compress settings would be read instead of (or along with) new ones
+    for stale_file_path in [file_path, '{}.gz'.format(file_path)] + _find_shard_file_paths(file_path):
+        if stale_file_path not in file_paths and os.path.exists(stale_file_path):
+            LOGGER.debug('Deleting %s', stale_file_path)
+            os.remove(stale_file_path)
+    n_written = 0
+    n_bytes = 0
+    lines = iter(lines)
+    for shard, shard_file_path in enumerate(file_paths):
+        shard_n_lines = n_lines * (shard + 1) // len(file_paths) - n_written
+        with open(shard_file_path, 'wb', buffering=WRITE_BUFFER_SIZE) as raw_file:
+            f = gzip.GzipFile(fileobj=raw_file, mode='wb') if compress else raw_file
+            try:
+                for line in itertools.islice(lines, shard_n_lines):
+                    encoded_line = line.encode('utf-8')
+                    f.write(encoded_line)
+                    n_bytes += len(encoded_line)
+                    n_written += 1
+            finally:
+                if compress:
+                    f.close()
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    LOGGER.info('Saved %s files (%s bytes) into %s file(s) in %.2fs: %.1f files/s, %.1f MB/s', n_written, n_bytes,
+                len(file_paths), elapsed, n_written / elapsed, n_bytes / elapsed / 1e6)
+    return n_written, n_bytes
+
+
+def _get_stanford_imdb_member_class(member_path: str):
+    """
+    Given path of a file in the archive, returns a tuple (<'train'/'test'>, <label 1/-1>), or None if the file is not
+    a review. Matches the same files as glob patterns '**/<train/test>/**/<pos/neg>/**/*.txt'
+    """
+    if not member_path.endswith('.txt'):
+        return None
+    folders = member_path.split('/')[:-1]
+    for split in ('train', 'test'):
+        if split in folders:
+            sub_folders = folders[folders.index(split)+1:]
+            for class_folder, c in (('pos', 1), ('neg', -1)):
+                if class_folder in sub_folders:
+                    return split, c
+    return None
+
+
+def _sample_stanford_imdb_archive(archive_path: str, train_sample_size: int, test_sample_size: int):
+    """
+    Reads archive members sequentially, once, and selects a uniform random sample of train and test reviews
+    Returns a tuple of lists (train samples, test samples), samples are in random order
+    Each sample is a tuple (<label 1/-1>, <utf-8 encoded review text>)
+    """
+    samplers: dict = {
+        'train': ReservoirSampler(train_sample_size),
+        'test': ReservoirSampler(test_sample_size)
+    }
+    with tarfile.open(archive_path, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            member_class = _get_stanford_imdb_member_class(member.name)
+            if member_class:
+                split, c = member_class
+                samplers[split].add((c, archive.extractfile(member).read()))
+    ProfileHelper.count('archive_reviews_read', sum(sampler.n_seen for sampler in samplers.values()))
+
+    samples: list = []
+    for split, sampler in samplers.items():
+        if sampler.n_seen < sampler.sample_size:
+            LOGGER.error('Sample size %s is greater than the population size %s', sampler.sample_size,
+                         sampler.n_seen)
+            samples.append([])
+        else:
+            samples.append(sampler.get_sample())
+    return tuple(samples)
+
+
+def get_default_text_pipeline() -> TextPipeline:
+    """
+    Returns the TextPipeline used by clean_text, get_bow_dictionary and corpus loaders, when no pipeline is given
+    It replaces HTML_WHITESPACE_PATTERNS with spaces and splits text on whitespaces. The pipeline is rebuilt if
+    HTML_WHITESPACE_PATTERNS is modified
+    """
+    global _default_text_pipeline
+    if _default_text_pipeline is None or \
+            _default_text_pipeline.whitespace_patterns != tuple(HTML_WHITESPACE_PATTERNS):
+        _default_text_pipeline = TextPipeline(HTML_WHITESPACE_PATTERNS)
+    return _default_text_pipeline
 
 
 def clean_text(text: str):
@@ -117,12 +378,7 @@ def clean_text(text: str):
         > removes leading/trailing whitespaces
         > replaces whitespace html tags with a space. Eg: <br />
     """
-    text = text.strip()
-    matching_tags = [tag for ptrn in HTML_WHITESPACE_PATTERNS for tag in re.findall(ptrn, text)]
-    for tag in matching_tags:
-        text = text.replace(tag, ' ')
-
-    return text
+    return get_default_text_pipeline().clean(text)
 
 
 def get_bow_dictionary(text: str):
@@ -130,36 +386,300 @@ def get_bow_dictionary(text: str):
     Splits given text into words and returns a bag-of-word representation as a dictionary
     The dictionary basically contains word counts
     """
-    return collections.Counter(text.split())
+    return collections.Counter(get_default_text_pipeline().tokenize(text))
 
 
-def get_stanford_imbd_vocabulary(file_path: str):
+def _get_n_workers(n_workers: int = None) -> int:
     """
-    Extracts all words from given file. Returns a set
+    Returns no.of worker processes to use for loading corpora. Defaults to 'corpus_loader_workers' config value,
+    0 means one worker per CPU
     """
-    vocab = set()
-    for line in FileHelper.read_lines(file_path):
+    if n_workers is None:
+        n_workers = int(ConfigHelper.get_config_value(CORPUS_LOADER_WORKERS, default_value=1))
+    return n_workers if n_workers > 0 else os.cpu_count()
+
+
+def _map_file_shards(file_path: str, shard_function, n_workers: int):
+    """
+    Splits files of given dataset file (see get_dataset_file_paths) into line aligned shards, applies
+    shard_function(file_path, start, end) to each shard in a pool of n_workers processes and yields the results in the
+    order of shards (i.e. in the order of lines). Gzipped files can't be split, they are single shards with end None
+    """
+    shards = []
+    for dataset_file_path in get_dataset_file_paths(file_path):
+        if dataset_file_path.endswith('.gz'):
+            shards.append((dataset_file_path, 0, None))
+        else:
+            shards.extend((dataset_file_path, start, end) for start, end in
+                          FileHelper.get_line_aligned_shards(dataset_file_path, n_workers * SHARDS_PER_WORKER))
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        yield from executor.map(shard_function, *zip(*shards))
+
+
+def _iter_stanford_imdb_labels_texts(lines):
+    """
+    Yields a tuple (<label as string>, <text>) for every non-empty line
+    """
+    for line in lines:
         line = line.strip()
         if line:
-            label, text = line.split(sep=' ', maxsplit=1)
-            vocab.update(text.strip().split())
+            yield line.split(sep=' ', maxsplit=1)
+
+
+def _get_vocabulary(lines) -> set:
+    vocab = set()
+    for label, text in _iter_stanford_imdb_labels_texts(lines):
+        vocab.update(text.strip().split())
+    return vocab
+
+
+def _get_shard_vocabulary(file_path: str, start: int, end: int) -> set:
+    return _get_vocabulary(_read_dataset_lines_in_range(file_path, start, end))
+
+
+def _get_markup_vocabulary(lines) -> set:
+    vocab = set()
+    for label, text in _iter_stanford_imdb_labels_texts(lines):
+        vocab.update(MARKUP_PATTERN.findall(text))
     return vocab
 
 
-def get_stanford_imdb_markup_vocabulary(file_path: str):
+def _get_shard_markup_vocabulary(file_path: str, start: int, end: int) -> set:
+    return _get_markup_vocabulary(_read_dataset_lines_in_range(file_path, start, end))
+
+
+@ProfileHelper.profile()
+def get_stanford_imbd_vocabulary(file_path: str, n_workers: int = None):
+    """
+    Extracts all words from given file. Returns a set
+    n_workers: no.of processes to load the file with, see _get_n_workers
+    """
+    n_workers = _get_n_workers(n_workers)
+    if n_workers == 1:
+        return _get_vocabulary(_read_dataset_lines(file_path))
+    return set().union(*_map_file_shards(file_path, _get_shard_vocabulary, n_workers))
+
+
+@ProfileHelper.profile()
+def update_stanford_imdb_vocabulary_store(store: VocabularyStore, file_path: str) -> int:
+    """
+    Adds word counts of reviews appended to given file since the store was last updated with it (all reviews, the
+    first time) to the store. Returns no.of reviews read
+    Words are whitespace separated tokens of raw text, same as get_stanford_imbd_vocabulary. A partially written last
+    line is left to be read by the next update
+    Each file of a sharded dataset (see get_dataset_file_paths) is tracked separately. Gzipped files are read whole,
+    once, they can't be appended to
+    """
+    n_docs = 0
+    for dataset_file_path in get_dataset_file_paths(file_path):
+        start = store.get_file_offset(dataset_file_path)
+        if dataset_file_path.endswith('.gz'):
+            end = os.path.getsize(dataset_file_path)
+            if start == end:
+                continue
+            if start > 0:
+                raise ValueError('{} was appended to, gzipped files must be written at once'.format(dataset_file_path))
+            lines = FileHelper.read_lines(dataset_file_path)
+        else:
+            end = FileHelper.get_complete_lines_size(dataset_file_path)
+            lines = FileHelper.read_lines_in_range(dataset_file_path, start, end)
+        n_docs += _update_vocabulary_store(store, lines, end - start)
+        store.set_file_offset(dataset_file_path, end)
+        LOGGER.debug('Read %s bytes of %s into vocabulary store', end - start, dataset_file_path)
+    return n_docs
+
+
+def _update_vocabulary_store(store: VocabularyStore, lines, n_bytes: int) -> int:
+    # words of all reviews are counted first, and merged into the store once (see VocabularyStore.update)
+    n_docs = 0
+    with ProfileHelper.span('update_vocabulary_store') as span:
+        word_counts = collections.Counter()
+        for _, text in _iter_stanford_imdb_labels_texts(lines):
+            word_counts.update(text.split())
+            n_docs += 1
+        store.update(word_counts)
+        span.add(n_docs, n_bytes)
+    return n_docs
+
+
+def get_stanford_imdb_vocabulary_store(file_paths: list = None, store_path: str = None) -> VocabularyStore:
+    """
+    Loads the vocabulary store saved at store_path (a new store, if there's none), updates it with reviews appended to
+    given files since the last call (see update_stanford_imdb_vocabulary_store), and saves it if anything changed.
+    Returns the store
+
+    The store keeps counts of all words, so that it's always the same as a store built from scratch, and ids of words
+    never change. Rare words are dropped when exporting a vocabulary, see VocabularyStore.to_vocabulary
+
+    file_paths: files to count words of, defaults to train, dev and test files
+    store_path: defaults to 'vocabulary_store_path' config value, or <dataset_dir>/vocabulary.npz
+    """
+    if file_paths is None:
+        file_paths = [ConfigHelper.get_config_value(key, CORPORA_CONFIG_SECTION)
+                      for key in (STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, STANFORD_MOVIE_REVIEW_DEV_FILE_PATH,
+                                  STANFORD_MOVIE_REVIEW_TEST_FILE_PATH)]
+    if store_path is None:
+        store_path = ConfigHelper.get_config_value(VOCABULARY_STORE_PATH)
+        if not store_path:
+            store_path = os.path.join(ConfigHelper.get_config_value('dataset_dir'), 'vocabulary.npz')
+    store = VocabularyStore.load(store_path) if os.path.exists(store_path) else VocabularyStore()
+    sources = dict(store.sources)
+    n_words = len(store)
+    for file_path in file_paths:
+        update_stanford_imdb_vocabulary_store(store, file_path)
+    if store.sources != sources or len(store) != n_words:
+        store.save(store_path)
+    return store
+
+
+def get_stanford_imdb_markup_vocabulary(file_path: str, n_workers: int = None):
     """
     Returns all markup substrings. Eg: <br>, <p>, <br />, etc
+    n_workers: no.of processes to load the file with, see _get_n_workers
     """
-    vocab = set()
-    for line in FileHelper.read_lines(file_path):
-        line = line.strip()
-        if line:
-            label, text = line.split(sep=' ', maxsplit=1)
-            vocab.update(re.findall(r'<.*?>', text))
-    return vocab
+    n_workers = _get_n_workers(n_workers)
+    if n_workers == 1:
+        return _get_markup_vocabulary(_read_dataset_lines(file_path))
+    return set().union(*_map_file_shards(file_path, _get_shard_markup_vocabulary, n_workers))
+
+
+def _get_labels_bows(lines, text_pipeline: TextPipeline) -> list:
+    labels, texts = [], []
+    for label, text in _iter_stanford_imdb_labels_texts(lines):
+        labels.append(int(label))
+        texts.append(text)
+    return [(label, collections.Counter(tokens))
+            for label, tokens in zip(labels, text_pipeline.transform_batch(texts))]
+
+
+def _get_shard_labels_bows(file_path: str, start: int, end: int, text_pipeline: TextPipeline) -> list:
+    return _get_labels_bows(_read_dataset_lines_in_range(file_path, start, end), text_pipeline)
 
 
-def get_stanford_imdb_labels_features(file_path: str):
+def _iter_stanford_imdb_labels_bows(file_path: str, n_workers: int = None, text_pipeline: TextPipeline = None):
+    """
+    Yields a tuple (<label 1/-1>, <dictionary of word counts>) for every non-empty line in given file, in order
+    n_workers: no.of processes to load the file with, see _get_n_workers
+    text_pipeline: pipeline to clean and tokenize text with, defaults to get_default_text_pipeline()
+    """
+    n_workers = _get_n_workers(n_workers)
+    text_pipeline = text_pipeline if text_pipeline is not None else get_default_text_pipeline()
+    if n_workers == 1:
+        for labels_bows in iter_stanford_imdb_labels_features(file_path, TEXT_BATCH_SIZE, text_pipeline):
+            yield from labels_bows
+    else:
+        shard_function = functools.partial(_get_shard_labels_bows, text_pipeline=text_pipeline)
+        for shard_labels_bows in _map_file_shards(file_path, shard_function, n_workers):
+            yield from shard_labels_bows
+
+
+class CorpusStats:
+    """
+    Statistics of a Stanford IMDB movie reviews file: word/markup frequencies, review lengths and label counts
+    Words are whitespace separated tokens of raw text (no cleaning), same as get_stanford_imbd_vocabulary
+    Memory used is bounded by the vocabulary size and no.of distinct review lengths, not by the no.of reviews
+    """
+    def __init__(self):
+        self.word_counts = collections.Counter()
+        self.markup_counts = collections.Counter()
+        self.label_counts = collections.Counter()
+        # review length (no.of words) -> no.of reviews of that length
+        self.doc_length_counts = collections.Counter()
+        self.n_docs = 0
+        self.n_words = 0
+
+    def add(self, label: int, text: str):
+        words = text.split()
+        self.word_counts.update(words)
+        self.markup_counts.update(MARKUP_PATTERN.findall(text))
+        self.label_counts[label] += 1
+        self.doc_length_counts[len(words)] += 1
+        self.n_docs += 1
+        self.n_words += len(words)
+
+    def get_oov_rates(self, vocabulary) -> tuple:
+        """
+        Returns a tuple (fraction of words, fraction of distinct words) not in given vocabulary
+        """
+        oov_words = [(word, count) for word, count in self.word_counts.items() if word not in vocabulary]
+        n_oov_words = sum(count for _, count in oov_words)
+        return n_oov_words / max(self.n_words, 1), len(oov_words) / max(len(self.word_counts), 1)
+
+    def to_dict(self, top_k: int = None) -> dict:
+        """
+        Returns a JSON serializable summary. top_k limits no.of most frequent words/markups listed, None lists all
+        """
+        if self.n_docs:
+            lengths, counts = zip(*sorted(self.doc_length_counts.items()))
+        else:
+            lengths, counts = (0,), (1,)
+        # median is the mean of the middle two lengths, or the middle length if no.of reviews is odd
+        cumulative_counts = np.cumsum(counts)
+        n = int(cumulative_counts[-1])
+        middle = np.searchsorted(cumulative_counts, [(n - 1) // 2, n // 2], side='right')
+        return {
+            'n_docs': self.n_docs,
+            'n_words': self.n_words,
+            'label_counts': {str(label): count for label, count in sorted(self.label_counts.items())},
+            'vocabulary_size': len(self.word_counts),
+            'markup_vocabulary_size': len(self.markup_counts),
+            'doc_length': {
+                'min': int(lengths[0]),
+                'max': int(lengths[-1]),
+                'mean': float(np.dot(lengths, counts) / n),
+                'median': float((lengths[middle[0]] + lengths[middle[1]]) / 2),
+            },
+            'top_words': self.word_counts.most_common(top_k),
+            'top_markups': self.markup_counts.most_common(top_k),
+        }
+
+
+@ProfileHelper.profile()
+def analyze_stanford_imdb_corpus(file_path: str) -> CorpusStats:
+    """
+    Reads given file once and returns its CorpusStats
+    """
+    stats = CorpusStats()
+    for label, text in _iter_stanford_imdb_labels_texts(_read_dataset_lines(file_path)):
+        stats.add(int(label), text)
+    return stats
+
+
+def analyze_stanford_imdb_corpora(file_paths: dict, reference_name: str = 'train', top_k: int = None) -> dict:
+    """
+    Analyzes multiple files concurrently, one process per file, and returns a JSON serializable summary
+
+    file_paths: dictionary of name -> file path. Eg: {'train': <train file path>, 'dev': <dev file path>}
+    reference_name: name of the file, whose vocabulary is used to compute out-of-vocabulary (OOV) rates of other files
+    top_k: no.of most frequent words/markups listed per file, None lists all
+    """
+    names = list(file_paths.keys())
+    with ProcessPoolExecutor(max_workers=max(len(names), 1)) as executor:
+        all_stats = dict(zip(names, executor.map(analyze_stanford_imdb_corpus, [file_paths[n] for n in names])))
+
+    summary = {name: stats.to_dict(top_k) for name, stats in all_stats.items()}
+    reference_stats = all_stats.get(reference_name)
+    if reference_stats is not None:
+        for name, stats in all_stats.items():
+            if name != reference_name:
+                oov_word_rate, oov_type_rate = stats.get_oov_rates(reference_stats.word_counts)
+                summary[name]['oov'] = {'reference': reference_name, 'word_rate': oov_word_rate,
+                                        'distinct_word_rate': oov_type_rate}
+
+    vocabulary = set()
+    markup_vocabulary = set()
+    for stats in all_stats.values():
+        vocabulary.update(stats.word_counts.keys())
+        markup_vocabulary.update(stats.markup_counts.keys())
+    return {
+        'files': summary,
+        'vocabulary_size': len(vocabulary),
+        'markup_vocabulary_size': len(markup_vocabulary),
+    }
+
+
+@ProfileHelper.profile()
+def get_stanford_imdb_labels_features(file_path: str, n_workers: int = None, text_pipeline: TextPipeline = None):
     """
     Stanford IMDB movie reviews will be in the format
     <label#1 1/-1> <text#1>
@@ -170,14 +690,205 @@ def get_stanford_imdb_labels_features(file_path: str):
 
     This utility function reads all lines from the file, and returns an array of tuples.
     Each tuple contains (<label 1/-1>, <dictionary of word counts>)
+
+    n_workers: no.of processes to load the file with, see _get_n_workers. When more than 1, the file is split into
+    line aligned shards, each shard is parsed in a separate process, and results are merged in the order of lines
+    text_pipeline: pipeline to clean and tokenize text with, defaults to get_default_text_pipeline()
+
+    See get_stanford_imdb_labels_sparse_features for a compact alternative, and iter_stanford_imdb_labels_features
+    to read large files in chunks
     """
-    data = []
-    for line in FileHelper.read_lines(file_path):
-        line = line.strip()
-        if line:
-            label, text = line.split(sep=' ', maxsplit=1)
-            data.append((int(label), get_bow_dictionary(clean_text(text))))
-    return data
+    return list(_iter_stanford_imdb_labels_bows(file_path, n_workers, text_pipeline))
+
+
+def iter_stanford_imdb_labels_features(file_path: str, chunk_size: int = TEXT_BATCH_SIZE,
+                                       text_pipeline: TextPipeline = None):
+    """
+    Same as get_stanford_imdb_labels_features, but reads the file lazily and yields lists of (at most) chunk_size
+    tuples (<label 1/-1>, <dictionary of word counts>), in the order of lines. Memory used is bounded by chunk_size,
+    irrespective of the file size
+    text_pipeline: pipeline to clean and tokenize text with, defaults to get_default_text_pipeline()
+    """
+    text_pipeline = text_pipeline if text_pipeline is not None else get_default_text_pipeline()
+    for labels, tokens in _iter_stanford_imdb_labels_tokens(file_path, chunk_size, text_pipeline):
+        yield [(label, collections.Counter(review_tokens)) for label, review_tokens in zip(labels, tokens)]
+
+
+def _iter_stanford_imdb_labels_tokens(file_path: str, chunk_size: int, text_pipeline: TextPipeline):
+    """
+    Yields a tuple (labels, tokens) for every chunk_size reviews, labels is an array.array of 1/-1 labels and tokens is
+    a list of lists of tokens
+    """
+    for labels_texts in get_chunks(_iter_stanford_imdb_labels_texts(_read_dataset_lines(file_path)), chunk_size):
+        labels = array.array('b', [int(label) for label, _ in labels_texts])
+        yield labels, text_pipeline.transform_batch([text for _, text in labels_texts])
+
+
+@ProfileHelper.profile()
+def get_stanford_imdb_labels_sparse_features(file_path: str, vocabulary: Vocabulary = None,
+                                             extend_vocabulary: bool = True, n_workers: int = None,
+                                             text_pipeline: TextPipeline = None):
+    """
+    Same as get_stanford_imdb_labels_features, but returns a tuple (labels, features, vocabulary)
+        labels: int8 NumPy array of 1/-1 labels
+        features: CsrMatrix of word counts, one row per review and one column per vocabulary word
+        vocabulary: Vocabulary used to map words to column ids
+
+    If vocabulary is not given, a new one is built from the file. When extend_vocabulary is False, words missing in
+    the given vocabulary are dropped. Eg: dev/test features are usually built with the training vocabulary, as is
+    """
+    if vocabulary is None:
+        vocabulary = Vocabulary()
+    labels = array.array('b')
+    features = CsrMatrixBuilder()
+    for label, bow in _iter_stanford_imdb_labels_bows(file_path, n_workers, text_pipeline):
+        labels.append(label)
+        features.add_row(vocabulary.get_bow_ids(bow, extend_vocabulary))
+    return np.frombuffer(labels, dtype=np.int8), features.build(len(vocabulary)), vocabulary
+
+
+def iter_stanford_imdb_labels_sparse_features(file_path: str, vocabulary: Vocabulary, extend_vocabulary: bool = True,
+                                              chunk_size: int = TEXT_BATCH_SIZE, text_pipeline: TextPipeline = None):
+    """
+    Same as get_stanford_imdb_labels_sparse_features, but reads the file lazily and yields a tuple (labels, features)
+    for every chunk_size reviews. Each features matrix has one column per word in vocabulary at the time the chunk was
+    read, so when vocabulary is extended, later chunks may have more columns than earlier chunks
+    Eg: see LinearClassifier.partial_fit to train on chunks
+    """
+    for labels_bows in iter_stanford_imdb_labels_features(file_path, chunk_size, text_pipeline):
+        features = CsrMatrixBuilder()
+        for _, bow in labels_bows:
+            features.add_row(vocabulary.get_bow_ids(bow, extend_vocabulary))
+        yield np.array([label for label, _ in labels_bows], dtype=np.int8), features.build(len(vocabulary))
+
+
+@ProfileHelper.profile()
+def get_stanford_imdb_labels_texts(file_path: str, text_pipeline: TextPipeline = None):
+    """
+    Returns a tuple (labels, texts), labels is an int8 NumPy array of 1/-1 labels, texts is a list of cleaned texts
+    Eg: as input to character based models, see char_cnn.SentenceDataset
+    text_pipeline: pipeline to clean text with, defaults to get_default_text_pipeline()
+    """
+    text_pipeline = text_pipeline if text_pipeline is not None else get_default_text_pipeline()
+    labels = array.array('b')
+    texts = []
+    for label, text in _iter_stanford_imdb_labels_texts(_read_dataset_lines(file_path)):
+        labels.append(int(label))
+        texts.append(text_pipeline.clean(text))
+    return np.frombuffer(labels, dtype=np.int8), texts
+
+
+@ProfileHelper.profile()
+def get_stanford_imdb_labels_hashed_features(file_path: str, vectorizer: HashingVectorizer,
+                                             text_pipeline: TextPipeline = None):
+    """
+    Same as get_stanford_imdb_labels_sparse_features, but features are hashed (see HashingVectorizer), instead of
+    being mapped to columns by a vocabulary. Returns a tuple (labels, features)
+
+    The file is read in batches of TEXT_BATCH_SIZE reviews, so memory used is bounded by the no.of non-zero features
+    text_pipeline: pipeline to clean and tokenize text with, defaults to get_default_text_pipeline()
+    """
+    labels = []
+    features = []
+    for chunk_labels, chunk_features in iter_stanford_imdb_labels_hashed_features(file_path, vectorizer,
+                                                                                  TEXT_BATCH_SIZE, text_pipeline):
+        labels.append(chunk_labels)
+        features.append(chunk_features)
+    if not features:
+        return np.zeros(0, dtype=np.int8), vectorizer.transform([])
+    return np.concatenate(labels), vstack_csr_matrices(features)
+
+
+def iter_stanford_imdb_labels_hashed_features(file_path: str, vectorizer: HashingVectorizer,
+                                              chunk_size: int = TEXT_BATCH_SIZE, text_pipeline: TextPipeline = None):
+    """
+    Same as get_stanford_imdb_labels_hashed_features, but reads the file lazily and yields a tuple (labels, features)
+    for every chunk_size reviews. All features matrices have vectorizer.n_features columns
+    """
+    text_pipeline = text_pipeline if text_pipeline is not None else get_default_text_pipeline()
+    for labels, tokens in _iter_stanford_imdb_labels_tokens(file_path, chunk_size, text_pipeline):
+        yield np.frombuffer(labels, dtype=np.int8), vectorizer.transform(tokens)
+
+
+def _get_feature_cache() -> ArrayCache:
+    cache_dir = ConfigHelper.get_config_value(FEATURE_CACHE_DIR)
+    if not cache_dir:
+        cache_dir = os.path.join(ConfigHelper.get_config_value('dataset_dir'), 'feature_cache')
+    max_bytes = ConfigHelper.get_config_value(FEATURE_CACHE_MAX_BYTES)
+    return ArrayCache(cache_dir, int(max_bytes) if max_bytes else None)
+
+
+def _get_file_sha256(file_path: str) -> str:
+    """
+    Returns SHA-256 digest of the file's content. Digests are memoized by the file's size and modification time, so
+    that an unchanged file isn't read again on warm loads
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_digests:
+        _file_digests[key] = FileHelper.get_sha256(file_path)
+    return _file_digests[key]
+
+
+def _get_feature_cache_key(file_path: str, vocabulary: Vocabulary, extend_vocabulary: bool,
+                           text_pipeline: TextPipeline) -> str:
+    """
+    Cache key depends on file content, text pipeline settings and the vocabulary features are built with
+    """
+    key_parts = [
+        'v{}'.format(FEATURE_CACHE_FORMAT_VERSION),
+        ','.join(_get_file_sha256(path) for path in get_dataset_file_paths(file_path)),
+        text_pipeline.get_fingerprint(),
+        vocabulary.get_fingerprint() if vocabulary is not None else '',
+        str(extend_vocabulary),
+    ]
+    return hashlib.sha256('\n'.join(key_parts).encode('utf-8')).hexdigest()
+
+
+@ProfileHelper.profile()
+def get_cached_stanford_imdb_labels_sparse_features(file_path: str, vocabulary: Vocabulary = None,
+                                                    extend_vocabulary: bool = True, n_workers: int = None,
+                                                    cache: ArrayCache = None, text_pipeline: TextPipeline = None):
+    """
+    Same as get_stanford_imdb_labels_sparse_features, but caches labels, features and vocabulary on disk, as .npy files
+    Cached labels and feature arrays are memory mapped (read-only), so warm loads don't copy or parse anything
+
+    cache: cache to use, defaults to 'feature_cache_dir' config value (or <dataset_dir>/feature_cache). Cache size is
+    bounded by 'feature_cache_max_bytes' config value, least recently used entries are evicted first
+    """
+    cache = cache if cache is not None else _get_feature_cache()
+    text_pipeline = text_pipeline if text_pipeline is not None else get_default_text_pipeline()
+    key = _get_feature_cache_key(file_path, vocabulary, extend_vocabulary, text_pipeline)
+    arrays = cache.get(key)
+    if arrays is None:
+        LOGGER.debug('Feature cache miss for %s', file_path)
+        ProfileHelper.count('feature_cache_misses')
+        labels, features, vocabulary = get_stanford_imdb_labels_sparse_features(file_path, vocabulary,
+                                                                                extend_vocabulary, n_workers,
+                                                                                text_pipeline)
+        arrays = {
+            'labels': labels,
+            'indptr': features.indptr,
+            'indices': features.indices,
+            'data': features.data,
+            'n_cols': np.array(features.shape[1]),
+        }
+        if extend_vocabulary:
+            arrays['vocabulary'] = vocabulary.to_array()
+        cache.put(key, arrays)
+        return labels, features, vocabulary
+
+    LOGGER.debug('Feature cache hit for %s', file_path)
+    ProfileHelper.count('feature_cache_hits')
+    if extend_vocabulary:
+        cached_vocabulary = Vocabulary.from_array(arrays['vocabulary'])
+        if vocabulary is None:
+            vocabulary = cached_vocabulary
+        else:
+            # cached vocabulary is the given vocabulary followed by words added while reading the file
+            vocabulary.extend(cached_vocabulary.words[len(vocabulary):])
+    features = CsrMatrix(arrays['indptr'], arrays['indices'], arrays['data'], int(arrays['n_cols']))
+    return arrays['labels'], features, vocabulary
 
 
 def load_stanford_imdb_train_data():
@@ -193,3 +904,62 @@ def load_stanford_imdb_test_data():
 def load_stanford_imdb_dev_data():
     return get_stanford_imdb_labels_features(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH,
                                                                            CORPORA_CONFIG_SECTION))
+
+
+def iter_stanford_imdb_train_data(chunk_size: int = TEXT_BATCH_SIZE):
+    """
+    Same as load_stanford_imdb_train_data, but yields lists of (at most) chunk_size tuples, see
+    iter_stanford_imdb_labels_features
+    """
+    return iter_stanford_imdb_labels_features(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH,
+                                                                            CORPORA_CONFIG_SECTION), chunk_size)
+
+
+def iter_stanford_imdb_test_data(chunk_size: int = TEXT_BATCH_SIZE):
+    """
+    Same as load_stanford_imdb_test_data, but yields lists of (at most) chunk_size tuples, see
+    iter_stanford_imdb_labels_features
+    """
+    return iter_stanford_imdb_labels_features(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH,
+                                                                            CORPORA_CONFIG_SECTION), chunk_size)
+
+
+def iter_stanford_imdb_dev_data(chunk_size: int = TEXT_BATCH_SIZE):
+    """
+    Same as load_stanford_imdb_dev_data, but yields lists of (at most) chunk_size tuples, see
+    iter_stanford_imdb_labels_features
+    """
+    return iter_stanford_imdb_labels_features(ConfigHelper.get_config_value(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH,
+                                                                            CORPORA_CONFIG_SECTION), chunk_size)
+
+
+def load_stanford_imdb_train_sparse_data(use_cache: bool = True):
+    """
+    Returns a tuple (labels, features, vocabulary) for training data. Vocabulary is built from training data
+    use_cache: see get_cached_stanford_imdb_labels_sparse_features
+    """
+    return _load_stanford_imdb_sparse_data(STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, None, use_cache)
+
+
+def load_stanford_imdb_test_sparse_data(vocabulary: Vocabulary, use_cache: bool = True):
+    """
+    Returns a tuple (labels, features, vocabulary) for test data. Features are built using given (training) vocabulary
+    use_cache: see get_cached_stanford_imdb_labels_sparse_features
+    """
+    return _load_stanford_imdb_sparse_data(STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, vocabulary, use_cache)
+
+
+def load_stanford_imdb_dev_sparse_data(vocabulary: Vocabulary, use_cache: bool = True):
+    """
+    Returns a tuple (labels, features, vocabulary) for dev data. Features are built using given (training) vocabulary
+    use_cache: see get_cached_stanford_imdb_labels_sparse_features
+    """
+    return _load_stanford_imdb_sparse_data(STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, vocabulary, use_cache)
+
+
+def _load_stanford_imdb_sparse_data(file_path_config_key: str, vocabulary: Vocabulary, use_cache: bool):
+    file_path = ConfigHelper.get_config_value(file_path_config_key, CORPORA_CONFIG_SECTION)
+    extend_vocabulary = vocabulary is None
+    if use_cache:
+        return get_cached_stanford_imdb_labels_sparse_features(file_path, vocabulary, extend_vocabulary)
+    return get_stanford_imdb_labels_sparse_features(file_path, vocabulary, extend_vocabulary)
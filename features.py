@@ -0,0 +1,494 @@
+"""
+Feature representations: word vocabularies and sparse (CSR) feature matrices
+"""
+import array
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+import zlib
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+
+class CsrMatrix:
+    """
+    Minimal compressed sparse row (CSR) matrix backed by 3 NumPy arrays
+
+    Non-zero values of row i are data[indptr[i]:indptr[i+1]], their column ids are indices[indptr[i]:indptr[i+1]]
+    Memory used is proportional to the no.of non-zero values, not to the no.of rows or columns
+    """
+    def __init__(self, indptr, indices, data, n_cols: int):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+        self.shape = (len(self.indptr) - 1, int(n_cols))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def row_ids(self):
+        """
+        Returns the row id of every non-zero value, i.e. the 'expanded' form of indptr
+        """
+        return np.repeat(np.arange(self.shape[0], dtype=np.int64), np.diff(self.indptr))
+
+    def dot(self, w) -> np.ndarray:
+        """
+        Matrix-vector product. w is a dense vector of size n_cols, returns a dense vector of size n_rows
+        Columns >= len(w) (Eg: words added to the vocabulary after the weights were created) are ignored
+        """
+        w = np.asarray(w)
+        mask = self.indices < len(w)
+        products = self.data[mask] * w[self.indices[mask]]
+        return np.bincount(self.row_ids()[mask], weights=products, minlength=self.shape[0])
+
+    def take_rows(self, rows):
+        """
+        Returns a new CsrMatrix containing given rows, in the given order
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        # position of every selected non-zero value in the source arrays
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1], dtype=np.int64)
+        return CsrMatrix(indptr, self.indices[positions], self.data[positions], self.shape[1])
+
+    def get_row(self, i: int) -> dict:
+        """
+        Returns row i as a dictionary of column id -> value
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return dict(zip(self.indices[start:end].tolist(), self.data[start:end].tolist()))
+
+
+def vstack_csr_matrices(matrices: list) -> CsrMatrix:
+    """
+    Stacks rows of given CsrMatrices (in the given order) into a single CsrMatrix
+    """
+    indptrs = [np.zeros(1, dtype=np.int64)]
+    offset = 0
+    for m in matrices:
+        indptrs.append(m.indptr[1:] + offset)
+        offset += m.nnz
+    return CsrMatrix(np.concatenate(indptrs),
+                     np.concatenate([m.indices for m in matrices] or [np.zeros(0, dtype=np.int32)]),
+                     np.concatenate([m.data for m in matrices] or [np.zeros(0, dtype=np.float32)]),
+                     max((m.shape[1] for m in matrices), default=0))
+
+
+class CsrMatrixBuilder:
+    """
+    Builds a CsrMatrix one row at a time. Rows are kept in compact typed arrays, not Python objects
+    """
+    def __init__(self):
+        self._indptr = array.array('q', [0])
+        self._indices = array.array('i')
+        self._data = array.array('f')
+
+    def add_row(self, column_values: dict):
+        """
+        column_values: dictionary of column id -> value
+        """
+        self._indices.extend(column_values.keys())
+        self._data.extend(column_values.values())
+        self._indptr.append(len(self._indices))
+
+    def build(self, n_cols: int) -> CsrMatrix:
+        return CsrMatrix(np.frombuffer(self._indptr, dtype=np.int64),
+                         np.frombuffer(self._indices, dtype=np.int32),
+                         np.frombuffer(self._data, dtype=np.float32),
+                         n_cols)
+
+
+class Vocabulary:
+    """
+    Word to id mapping. Ids are assigned in the order words are added, starting at 0
+    A vocabulary can be saved to (and loaded from) a text file containing one word per line, line no. = word id
+    """
+    def __init__(self, words=None):
+        self._word_ids: dict = {}
+        self._words: list = []
+        if words:
+            self.extend(words)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word in self._word_ids
+
+    def add(self, word: str) -> int:
+        """
+        Returns id of given word, assigning a new id if the word isn't in the vocabulary
+        """
+        word_id = self._word_ids.get(word)
+        if word_id is None:
+            word_id = len(self._words)
+            self._word_ids[word] = word_id
+            self._words.append(word)
+        return word_id
+
+    def extend(self, words):
+        for word in words:
+            self.add(word)
+
+    def get_id(self, word: str, default=None):
+        return self._word_ids.get(word, default)
+
+    def get_ids(self, words, default: int = -1, count: int = -1) -> np.ndarray:
+        """
+        Returns ids of given words as an int64 array, default for words not in the vocabulary
+        count: no.of words, if known (Eg: when words is a generator), to avoid resizing the array
+        """
+        return np.fromiter(map(self._word_ids.get, words, itertools.repeat(default)), dtype=np.int64, count=count)
+
+    def get_word(self, word_id: int) -> str:
+        return self._words[word_id]
+
+    @property
+    def words(self) -> list:
+        return list(self._words)
+
+    def get_bow_ids(self, bow: dict, extend: bool = True) -> dict:
+        """
+        Converts a bag-of-words dictionary (word -> count) to a dictionary of word id -> count
+        When extend is False, words missing in the vocabulary are dropped
+        """
+        if extend:
+            return {self.add(word): count for word, count in bow.items()}
+        word_ids = self._word_ids
+        return {word_ids[word]: count for word, count in bow.items() if word in word_ids}
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a hash of all words and their ids
+        """
+        return hashlib.sha256('\n'.join(self._words).encode('utf-8')).hexdigest()
+
+    def to_array(self) -> np.ndarray:
+        """
+        Returns all words, newline separated and utf-8 encoded, as a uint8 array. See from_array
+        """
+        return np.frombuffer('\n'.join(self._words).encode('utf-8'), dtype=np.uint8)
+
+    @classmethod
+    def from_array(cls, words_array: np.ndarray):
+        words = bytes(words_array).decode('utf-8')
+        return cls(words.split('\n') if words else None)
+
+    def save(self, file_path: str):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            for word in self._words:
+                f.write(word)
+                f.write('\n')
+
+    @classmethod
+    def load(cls, file_path: str):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return cls(f.read().split('\n')[:-1])
+
+
+# updates of less than 1/SMALL_UPDATE_RATIO of the store's no.of words are searched without splitting the blob
+SMALL_UPDATE_RATIO: int = 64
+
+
+class _BlobWords:
+    """
+    Read-only sequence of words (utf-8 encoded) stored back to back in a uint8 array, word i is
+    blob[offsets[i]:offsets[i+1]]. Supports bisect, without creating a Python object per word
+    """
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+class VocabularyStore:
+    """
+    Persistent word to (id, count) mapping, updated incrementally
+
+    Words are kept sorted (by their utf-8 encoding) in compact arrays, not as Python objects:
+        > blob: all words, utf-8 encoded, back to back
+        > offsets: start of each word in blob (and the end of the last word)
+        > counts: no.of occurrences of each word
+        > ids: id of each word. Ids are dense (0 to no.of words - 1) and stable, new words get ids after existing ones
+    so a word costs its length plus 20 bytes. Lookups use binary search
+
+    Store also remembers how many bytes of each file it has read (see get_file_offset), so that only data appended
+    to a file since the last update needs to be read. Eg: see corpora_utils.update_stanford_imdb_vocabulary_store
+    Saved as a .npz file containing the arrays above, see save and load
+    """
+    FORMAT_VERSION: int = 1
+    # no.of bytes before the last read offset of a file, hashed to detect files modified other than by appending
+    TAIL_SIZE: int = 4096
+
+    def __init__(self):
+        self._blob = np.zeros(0, dtype=np.uint8)
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._ids = np.zeros(0, dtype=np.int32)
+        # position (in sorted order) of each id, computed when needed
+        self._id_positions = None
+        # file path -> {'offset': no.of bytes read, 'tail_sha256': hash of TAIL_SIZE bytes before offset}
+        self.sources: dict = {}
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __contains__(self, word):
+        return self._find(word.encode('utf-8')) >= 0
+
+    @property
+    def total_count(self) -> int:
+        return int(self._counts.sum())
+
+    def _get_sorted_words(self) -> _BlobWords:
+        return _BlobWords(self._blob, self._offsets)
+
+    def _find(self, word: bytes) -> int:
+        """
+        Returns position of word in sorted order, or -1 if word is not in the store
+        """
+        sorted_words = self._get_sorted_words()
+        position = bisect.bisect_left(sorted_words, word)
+        return position if position < len(sorted_words) and sorted_words[position] == word else -1
+
+    def get_id(self, word: str, default=None):
+        position = self._find(word.encode('utf-8'))
+        return int(self._ids[position]) if position >= 0 else default
+
+    def get_count(self, word: str) -> int:
+        position = self._find(word.encode('utf-8'))
+        return int(self._counts[position]) if position >= 0 else 0
+
+    def get_word(self, word_id: int) -> str:
+        if self._id_positions is None:
+            self._id_positions = np.empty(len(self), dtype=np.int64)
+            self._id_positions[self._ids] = np.arange(len(self))
+        return self._get_sorted_words()[self._id_positions[word_id]].decode('utf-8')
+
+    def update(self, word_counts: dict):
+        """
+        Adds word counts (word -> count) to the store. New words get ids after all existing ids, in the order of
+        word_counts. Eg: a collections.Counter lists words in the order they were first counted
+        """
+        if not word_counts:
+            return
+        words = [word.encode('utf-8') for word in word_counts.keys()]
+        counts = np.fromiter(word_counts.values(), dtype=np.int64, count=len(words))
+        order = sorted(range(len(words)), key=words.__getitem__)
+
+        # find (insert) positions of words, in sorted order. Each search starts at the previous word's position
+        # when many words are added, existing words are split into a (temporary) list of bytes, so that searches don't
+        # call back into Python. A few words are searched in the blob directly, not to pay for splitting all words
+        n_words = len(self)
+        if len(words) * SMALL_UPDATE_RATIO < n_words:
+            sorted_words = _BlobWords(self._blob, self._offsets)
+        else:
+            blob = self._blob.tobytes()
+            offsets = self._offsets.tolist()
+            sorted_words = [blob[start:end] for start, end in zip(offsets, offsets[1:])]
+        positions = np.zeros(len(order), dtype=np.int64)
+        found = np.zeros(len(order), dtype=bool)
+        position = 0
+        for i, word_index in enumerate(order):
+            word = words[word_index]
+            position = bisect.bisect_left(sorted_words, word, position)
+            positions[i] = position
+            found[i] = position < n_words and sorted_words[position] == word
+        order = np.array(order, dtype=np.int64)
+        self._counts[positions[found]] += counts[order[found]]
+
+        new = ~found
+        if not new.any():
+            return
+        new_positions = positions[new]
+        new_words = [words[i] for i in order[new]]
+        new_lengths = np.fromiter((len(word) for word in new_words), dtype=np.int64, count=len(new_words))
+        # new words are inserted before the word at their position, np.insert keeps words at the same position sorted
+        self._blob = np.insert(self._blob, np.repeat(self._offsets[new_positions], new_lengths),
+                               np.frombuffer(b''.join(new_words), dtype=np.uint8))
+        lengths = np.insert(np.diff(self._offsets), new_positions, new_lengths)
+        self._offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(lengths)])
+        self._counts = np.insert(self._counts, new_positions, counts[order[new]])
+        # ids of new words follow the order of word_counts
+        new_ids = n_words + np.argsort(np.argsort(order[new]))
+        self._ids = np.insert(self._ids, new_positions, new_ids.astype(np.int32))
+        self._id_positions = None
+
+    def _get_kept_positions(self, min_count: int = 1, max_size: int = None) -> np.ndarray:
+        """
+        Returns sorted positions of words with at least min_count occurrences, limited to the max_size most frequent
+        of them (ties broken by id)
+        """
+        kept = np.flatnonzero(self._counts >= min_count)
+        if max_size is not None and len(kept) > max_size:
+            kept = np.sort(kept[np.lexsort((self._ids[kept], -self._counts[kept]))[:max_size]])
+        return kept
+
+    def prune(self, min_count: int = 1, max_size: int = None):
+        """
+        Drops words occurring less than min_count times, then keeps only the max_size most frequent words
+        Ids of remaining words are renumbered to be dense, preserving their order. Counts of dropped words are lost,
+        if they appear again, they are counted from 0. So a store that is updated incrementally must not be pruned,
+        use to_vocabulary(min_count, max_size) instead
+        """
+        kept = self._get_kept_positions(min_count, max_size)
+        if len(kept) == len(self):
+            return
+        lengths = np.diff(self._offsets)
+        kept_mask = np.zeros(len(self), dtype=bool)
+        kept_mask[kept] = True
+        self._blob = self._blob[np.repeat(kept_mask, lengths)]
+        self._offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.cumsum(lengths[kept])])
+        self._counts = self._counts[kept]
+        self._ids = np.argsort(np.argsort(self._ids[kept])).astype(np.int32)
+        self._id_positions = None
+
+    def most_common(self, k: int = None) -> list:
+        """
+        Returns a list of (word, count) tuples of the k most frequent words (all words if k is None), most frequent
+        first, same as collections.Counter.most_common
+        """
+        positions = np.lexsort((self._ids, -self._counts))[:k]
+        sorted_words = self._get_sorted_words()
+        return [(sorted_words[p].decode('utf-8'), int(self._counts[p])) for p in positions]
+
+    def to_vocabulary(self, min_count: int = 1, max_size: int = None) -> Vocabulary:
+        """
+        Returns a Vocabulary of words with at least min_count occurrences, limited to the max_size most frequent
+        words, in the order of their ids. Ids in the vocabulary are the same as in the store, if nothing is dropped
+        """
+        kept = self._get_kept_positions(min_count, max_size)
+        sorted_words = self._get_sorted_words()
+        return Vocabulary([sorted_words[p].decode('utf-8') for p in kept[np.argsort(self._ids[kept])]])
+
+    def get_file_offset(self, file_path: str) -> int:
+        """
+        Returns no.of bytes of given file already read into the store, 0 if the file was never read
+        Raises ValueError if the file was modified other than by appending data, since then counts can't be updated
+        incrementally and the store must be rebuilt
+        """
+        source = self.sources.get(os.path.abspath(file_path))
+        if source is None:
+            return 0
+        offset = source['offset']
+        if os.path.getsize(file_path) < offset or self._get_tail_sha256(file_path, offset) != source['tail_sha256']:
+            raise ValueError('{} was modified since it was read into the vocabulary store'.format(file_path))
+        return offset
+
+    def set_file_offset(self, file_path: str, offset: int):
+        """
+        Records that the first offset bytes of given file are read into the store
+        """
+        self.sources[os.path.abspath(file_path)] = {'offset': offset,
+                                                    'tail_sha256': self._get_tail_sha256(file_path, offset)}
+
+    @classmethod
+    def _get_tail_sha256(cls, file_path: str, offset: int) -> str:
+        start = max(offset - cls.TAIL_SIZE, 0)
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            return hashlib.sha256(f.read(offset - start)).hexdigest()
+
+    def save(self, file_path: str):
+        """
+        Saves the store into a .npz file. The file is replaced atomically
+        """
+        metadata = {'format_version': self.FORMAT_VERSION, 'sources': self.sources}
+        temp_file_path = '{}.tmp'.format(file_path)
+        with open(temp_file_path, 'wb') as f:
+            np.savez(f, blob=self._blob, offsets=self._offsets, counts=self._counts, ids=self._ids,
+                     metadata=np.frombuffer(json.dumps(metadata).encode('utf-8'), dtype=np.uint8))
+        os.replace(temp_file_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str):
+        with np.load(file_path) as arrays:
+            metadata = json.loads(arrays['metadata'].tobytes().decode('utf-8'))
+            if metadata['format_version'] != cls.FORMAT_VERSION:
+                raise ValueError('Unsupported vocabulary store format version {} in {}'.format(
+                    metadata['format_version'], file_path))
+            store = cls()
+            store._blob = arrays['blob']
+            store._offsets = arrays['offsets']
+            store._counts = arrays['counts']
+            store._ids = arrays['ids']
+        store.sources = metadata['sources']
+        return store
+
+
+class HashingVectorizer:
+    """
+    Converts lists of tokens to a CsrMatrix of token (and token n-gram) counts, without a vocabulary
+
+    Each token/n-gram is hashed (CRC-32 of its utf-8 encoding) into one of n_features columns, so memory needed doesn't
+    grow with the no.of distinct tokens. Different tokens may collide into the same column. When signed is True, a
+    2nd (independent) bit of the hash decides whether +1 or -1 is added to the column, so that colliding counts tend to
+    cancel out instead of adding up
+    """
+    def __init__(self, n_features: int = 2 ** 20, ngram_range: tuple = (1, 1), signed: bool = True):
+        """
+        n_features: no.of columns (hash buckets), at most 2^31
+        ngram_range: (min n, max n) of n-grams to extract. Eg: (1, 2) extracts unigrams and bigrams
+        signed: use signed hashing
+        """
+        if not 0 < n_features <= 2 ** 31:
+            raise ValueError('n_features must be in [1, 2^31], got {}'.format(n_features))
+        if not 1 <= ngram_range[0] <= ngram_range[1]:
+            raise ValueError('Invalid n-gram range {}'.format(ngram_range))
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.signed = signed
+
+    def get_ngrams(self, tokens: list) -> list:
+        """
+        Returns all n-grams of given tokens, n-grams are space separated tokens. Eg: 'not good'
+        """
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            ngrams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return ngrams
+
+    def transform(self, token_lists) -> CsrMatrix:
+        """
+        token_lists: an iterable of lists of tokens, one list per row (document)
+        """
+        ngram_lists = [self.get_ngrams(tokens) for tokens in token_lists]
+        lengths = np.fromiter((len(ngrams) for ngrams in ngram_lists), dtype=np.int64, count=len(ngram_lists))
+        hashes = np.fromiter((zlib.crc32(ngram.encode('utf-8')) for ngrams in ngram_lists for ngram in ngrams),
+                             dtype=np.int64, count=int(lengths.sum()))
+        columns = (hashes & 0x7fffffff) % self.n_features
+        values = np.where(hashes & 0x80000000, -1.0, 1.0) if self.signed else np.ones(len(hashes))
+
+        # sum up values of the same column in a row
+        rows = np.repeat(np.arange(len(ngram_lists), dtype=np.int64), lengths)
+        keys, inverse = np.unique(rows * self.n_features + columns, return_inverse=True)
+        sums = np.bincount(inverse.ravel(), weights=values, minlength=len(keys))
+        keys_rows = keys // self.n_features
+        nonzero = sums != 0
+        indptr = np.zeros(len(ngram_lists) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys_rows[nonzero], minlength=len(ngram_lists)), out=indptr[1:])
+        return CsrMatrix(indptr, (keys % self.n_features)[nonzero], sums[nonzero], self.n_features)
+
+    def get_settings(self) -> dict:
+        return {'n_features': self.n_features, 'ngram_range': list(self.ngram_range), 'signed': self.signed}
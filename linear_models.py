@@ -0,0 +1,170 @@
+"""
+Linear classifiers trained with mini-batch stochastic gradient descent, on sparse (CSR) features
+"""
+import logging
+
+import numpy as np
+
+from features import CsrMatrix
+
+LOGGER = logging.getLogger(__name__)
+
+LOSS_FUNCTIONS = ('hinge', 'log')
+LEARNING_RATE_SCHEDULES = ('constant', 'invscaling')
+
+
+class LinearClassifier:
+    """
+    Binary linear classifier, score = x.w + b, labels are 1/-1
+
+    Supported loss functions:
+        > hinge: max{0, 1 - y*score}, same as a linear SVM
+        > log: log(1 + exp(-y*score)), same as logistic regression
+
+    Supported learning rate schedules:
+        > constant: eta
+        > invscaling: eta / t^power_t, t = no.of weight updates so far (starting at 1)
+        > any callable that takes t and returns the learning rate
+    """
+    def __init__(self, loss: str = 'hinge', eta: float = 0.01, learning_rate='constant', power_t: float = 0.5,
+                 alpha: float = 0.0, batch_size: int = 32, n_epochs: int = 5, shuffle: bool = True, seed=None):
+        """
+        loss: 'hinge' or 'log'
+        eta: initial learning rate
+        learning_rate: 'constant', 'invscaling' or a callable
+        power_t: exponent used by 'invscaling' schedule
+        alpha: L2 regularization strength, 0 disables regularization
+        batch_size: no.of training samples per weight update
+        n_epochs: no.of passes over training data
+        shuffle: shuffle training data before each epoch
+        seed: seed for the random number generator used to shuffle
+        """
+        if loss not in LOSS_FUNCTIONS:
+            raise ValueError('Invalid loss {}. Valid values are {}'.format(loss, LOSS_FUNCTIONS))
+        if not callable(learning_rate) and learning_rate not in LEARNING_RATE_SCHEDULES:
+            raise ValueError('Invalid learning rate schedule {}. Valid values are {} or a callable'.format(
+                learning_rate, LEARNING_RATE_SCHEDULES))
+        if batch_size < 1:
+            raise ValueError('Invalid batch size {}. It must be at least 1'.format(batch_size))
+        if n_epochs < 1:
+            raise ValueError('Invalid no.of epochs {}. It must be at least 1'.format(n_epochs))
+        self.loss = loss
+        self.eta = eta
+        self.learning_rate = learning_rate
+        self.power_t = power_t
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.n_epochs = n_epochs
+        self.shuffle = shuffle
+        self.seed = seed
+        self.weights: np.ndarray = None
+        self.bias: float = 0.0
+        self.loss_history: list = []
+        self._rng = None
+        # no.of weight updates so far
+        self._t = 0
+
+    def _get_learning_rate(self, t: int) -> float:
+        if callable(self.learning_rate):
+            return self.learning_rate(t)
+        if self.learning_rate == 'invscaling':
+            return self.eta / (t ** self.power_t)
+        return self.eta
+
+    def _get_loss_and_gradient_coefs(self, margins: np.ndarray):
+        """
+        Given margins y*score, returns loss per sample and d(loss)/d(score) divided by y, per sample
+        """
+        if self.loss == 'hinge':
+            losses = np.maximum(0.0, 1.0 - margins)
+            return losses, np.where(margins < 1.0, -1.0, 0.0)
+        losses = np.logaddexp(0.0, -margins)
+        return losses, -0.5 * (1.0 - np.tanh(0.5 * margins))  # -sigmoid(-margin), without overflow
+
+    def fit(self, features: CsrMatrix, labels, rows: np.ndarray = None):
+        """
+        Trains the classifier from scratch
+        features: CsrMatrix, one row per training sample
+        labels: array of 1/-1 labels
+        rows: optional ids of rows to train on, all rows by default. Eg: training folds in cross validation, without
+            copying their features
+        """
+        labels = np.asarray(labels, dtype=np.float64)
+        self._reset(features.shape[1])
+        for epoch in range(1, self.n_epochs + 1):
+            self.loss_history.append(self._fit_epoch(features, labels, rows))
+            LOGGER.debug('Epoch# %s avg. training loss = %s', epoch, self.loss_history[-1])
+        return self
+
+    def partial_fit(self, features: CsrMatrix, labels):
+        """
+        Continues training with one pass over given samples, Eg: a chunk of a file too large to be loaded at once
+        Weights are extended with zeros if features have more columns than seen so far (Eg: a growing vocabulary)
+        Average loss of the pass is appended to loss_history, learning rate schedule continues across calls
+        """
+        if self.weights is None:
+            self._reset(features.shape[1])
+        elif features.shape[1] > len(self.weights):
+            self.weights = np.concatenate([self.weights, np.zeros(features.shape[1] - len(self.weights))])
+        self.loss_history.append(self._fit_epoch(features, np.asarray(labels, dtype=np.float64)))
+        return self
+
+    def _reset(self, n_features: int):
+        self.weights = np.zeros(n_features, dtype=np.float64)
+        self.bias = 0.0
+        self.loss_history = []
+        self._rng = np.random.default_rng(self.seed)
+        self._t = 0
+
+    def _fit_epoch(self, features: CsrMatrix, labels: np.ndarray, rows: np.ndarray = None) -> float:
+        """
+        Applies gradient descent steps for all batches of given samples (rows, or all rows). Returns avg. loss per
+        sample
+        """
+        order = np.arange(features.shape[0]) if rows is None else np.asarray(rows)
+        n_samples = len(order)
+        if self.shuffle:
+            order = order[self._rng.permutation(n_samples)]
+        total_loss = 0.0
+        for start in range(0, n_samples, self.batch_size):
+            self._t += 1
+            batch_rows = order[start:start + self.batch_size]
+            total_loss += self._fit_batch(features.take_rows(batch_rows), labels[batch_rows],
+                                          self._get_learning_rate(self._t))
+        return total_loss / max(n_samples, 1)
+
+    def _fit_batch(self, batch_features: CsrMatrix, batch_labels: np.ndarray, lr: float) -> float:
+        """
+        Applies one gradient descent step for given batch. Returns total loss of the batch (before the update)
+        """
+        margins = batch_labels * (batch_features.dot(self.weights) + self.bias)
+        losses, coefs = self._get_loss_and_gradient_coefs(margins)
+        # gradient of the loss w.r.t. score, per sample, averaged over the batch
+        score_grads = coefs * batch_labels / len(batch_labels)
+        if self.alpha:
+            self.weights *= 1.0 - lr * self.alpha
+        active = np.flatnonzero(score_grads)
+        if len(active):
+            active_features = batch_features.take_rows(active)
+            np.add.at(self.weights, active_features.indices,
+                      -lr * active_features.data * np.repeat(score_grads[active], np.diff(active_features.indptr)))
+            self.bias -= lr * score_grads.sum()
+        return float(losses.sum())
+
+    def decision_function(self, features: CsrMatrix) -> np.ndarray:
+        """
+        Returns scores x.w + b for all rows
+        """
+        return features.dot(self.weights) + self.bias
+
+    def predict(self, features: CsrMatrix) -> np.ndarray:
+        """
+        Returns predicted labels 1/-1 for all rows
+        """
+        return np.where(self.decision_function(features) > 0, 1, -1).astype(np.int8)
+
+    def score(self, features: CsrMatrix, labels) -> float:
+        """
+        Returns accuracy of predictions, a value in [0, 1]
+        """
+        return float(np.mean(self.predict(features) == np.asarray(labels)))
@@ -0,0 +1,99 @@
+"""
+Evaluation metrics, accumulated incrementally over batches of predictions
+"""
+import numpy as np
+
+
+class BinaryClassificationMetrics:
+    """
+    Confusion counts of 1/-1 labels and predictions, and metrics derived from them. 1 is the positive class
+    Counts are updated one batch at a time, so predictions on arbitrarily large files can be evaluated in constant
+    memory
+    Eg:
+        metrics = BinaryClassificationMetrics()
+        for labels, features in iter_stanford_imdb_labels_sparse_features(file_path, vocabulary, False):
+            metrics.update(labels, classifier.predict(features))
+        print(metrics.accuracy, metrics.precision, metrics.recall)
+    """
+    def __init__(self):
+        self.true_positives = 0
+        self.false_positives = 0
+        self.true_negatives = 0
+        self.false_negatives = 0
+
+    def update(self, labels, predictions):
+        """
+        labels, predictions: arrays (or lists) of 1/-1 values of the same length, or single 1/-1 values
+        """
+        labels = np.asarray(labels).ravel() > 0
+        predictions = np.asarray(predictions).ravel() > 0
+        if len(labels) != len(predictions):
+            raise ValueError('{} labels but {} predictions'.format(len(labels), len(predictions)))
+        n_positive_predictions = int(predictions.sum())
+        true_positives = int(np.count_nonzero(labels & predictions))
+        self.true_positives += true_positives
+        self.false_positives += n_positive_predictions - true_positives
+        self.false_negatives += int(labels.sum()) - true_positives
+        self.true_negatives += len(labels) - int(np.count_nonzero(labels | predictions))
+        return self
+
+    def merge(self, other: 'BinaryClassificationMetrics'):
+        """
+        Adds counts of other, Eg: to combine metrics of chunks evaluated in parallel
+        """
+        self.true_positives += other.true_positives
+        self.false_positives += other.false_positives
+        self.true_negatives += other.true_negatives
+        self.false_negatives += other.false_negatives
+        return self
+
+    @property
+    def n_samples(self) -> int:
+        return self.true_positives + self.false_positives + self.true_negatives + self.false_negatives
+
+    @property
+    def accuracy(self) -> float:
+        return _safe_divide(self.true_positives + self.true_negatives, self.n_samples)
+
+    @property
+    def precision(self) -> float:
+        return _safe_divide(self.true_positives, self.true_positives + self.false_positives)
+
+    @property
+    def recall(self) -> float:
+        return _safe_divide(self.true_positives, self.true_positives + self.false_negatives)
+
+    @property
+    def f1(self) -> float:
+        return _safe_divide(2 * self.precision * self.recall, self.precision + self.recall)
+
+    def to_dict(self) -> dict:
+        return {
+            'n_samples': self.n_samples,
+            'true_positives': self.true_positives,
+            'false_positives': self.false_positives,
+            'true_negatives': self.true_negatives,
+            'false_negatives': self.false_negatives,
+            'accuracy': self.accuracy,
+            'precision': self.precision,
+            'recall': self.recall,
+            'f1': self.f1,
+        }
+
+
+def _safe_divide(numerator, denominator) -> float:
+    """
+    Returns 0.0 when denominator is 0. Eg: precision when nothing is predicted positive
+    """
+    return float(numerator / denominator) if denominator else 0.0
+
+
+def evaluate_batches(predict_function, batches) -> BinaryClassificationMetrics:
+    """
+    Evaluates predictions over an iterable of (labels, features) tuples, one batch at a time
+    predict_function: function that takes features of a batch and returns 1/-1 predictions. Eg: classifier.predict
+    """
+    metrics = BinaryClassificationMetrics()
+    for labels, features in batches:
+        metrics.update(labels, predict_function(features))
+    return metrics
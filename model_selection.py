@@ -0,0 +1,153 @@
+"""
+Hyperparameter search (grid or random) for LinearClassifier, with k-fold cross validation, run in a process pool
+
+Features and labels are copied into shared memory once (see utils.SharedArrays). Worker processes attach to it when
+they start, so tasks only carry a config and a fold id, never the dataset
+"""
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import CsrMatrix
+from linear_models import LinearClassifier
+from metrics import BinaryClassificationMetrics
+from utils import SharedArrays
+
+LOGGER = logging.getLogger(__name__)
+
+# features/labels/fold ids of the current worker process, see _init_sweep_worker
+_worker_data: tuple = None
+
+
+def get_grid_configs(param_grid: dict) -> list:
+    """
+    Returns all combinations of parameter values, as a list of dictionaries
+    Eg: {'eta': [0.1, 0.01], 'n_epochs': [5]} -> [{'eta': 0.1, 'n_epochs': 5}, {'eta': 0.01, 'n_epochs': 5}]
+    """
+    names = list(param_grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def get_random_configs(param_distributions: dict, n_configs: int, seed=None) -> list:
+    """
+    Returns n_configs random combinations of parameter values, as a list of dictionaries
+
+    param_distributions: parameter name -> list of values, or a function that takes a np.random.Generator and returns
+        a value. Eg: {'eta': lambda rng: 10 ** rng.uniform(-4, 0), 'batch_size': [16, 32, 64]}
+    When all parameters are lists, configs are sampled from the grid without replacement (all of the grid is
+    returned if it's not larger than n_configs). Otherwise each parameter is sampled independently
+    """
+    rng = np.random.default_rng(seed)
+    if not any(callable(values) for values in param_distributions.values()):
+        grid = get_grid_configs(param_distributions)
+        if n_configs >= len(grid):
+            return grid
+        return [grid[i] for i in rng.choice(len(grid), size=n_configs, replace=False)]
+    return [{name: values(rng) if callable(values) else values[rng.integers(len(values))]
+             for name, values in param_distributions.items()} for _ in range(n_configs)]
+
+
+def get_k_fold_ids(n_samples: int, n_folds: int, seed=None) -> np.ndarray:
+    """
+    Assigns each sample to one of n_folds folds of (almost) equal size, at random. Returns an array of fold ids
+    """
+    if n_folds < 2 or n_folds > n_samples:
+        raise ValueError('n_folds must be in [2, {}], got {}'.format(n_samples, n_folds))
+    fold_ids = np.empty(n_samples, dtype=np.int32)
+    fold_ids[np.random.default_rng(seed).permutation(n_samples)] = np.arange(n_samples) % n_folds
+    return fold_ids
+
+
+def get_holdout_fold_ids(n_train_samples: int, n_eval_samples: int) -> np.ndarray:
+    """
+    Returns fold ids for a single train/eval split, where the first n_train_samples are always used for training
+    (fold id -1) and the last n_eval_samples are evaluated (fold 0). Eg: train and dev sets stacked together
+    """
+    return np.concatenate([np.full(n_train_samples, -1, dtype=np.int32), np.zeros(n_eval_samples, dtype=np.int32)])
+
+
+def evaluate_config(features: CsrMatrix, labels: np.ndarray, fold_ids: np.ndarray, params: dict, fold: int) -> dict:
+    """
+    Trains a LinearClassifier with given params on samples not in fold, and evaluates it on samples in fold
+    Returns a dictionary of metrics (see BinaryClassificationMetrics.to_dict), with training/evaluation durations
+    """
+    eval_rows = np.flatnonzero(fold_ids == fold)
+    train_rows = np.flatnonzero(fold_ids != fold)
+    start = time.perf_counter()
+    classifier = LinearClassifier(**params).fit(features, labels, rows=train_rows)
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    metrics = BinaryClassificationMetrics().update(labels[eval_rows], classifier.predict(features.take_rows(eval_rows)))
+    result = metrics.to_dict()
+    result['fit_seconds'] = fit_seconds
+    result['eval_seconds'] = time.perf_counter() - start
+    result['final_loss'] = classifier.loss_history[-1] if classifier.loss_history else None
+    return result
+
+
+def _init_sweep_worker(spec: dict):
+    global _worker_data
+    shared = SharedArrays.attach(spec)
+    arrays = shared.arrays
+    features = CsrMatrix(arrays['indptr'], arrays['indices'], arrays['data'], int(arrays['n_cols']))
+    # shared is kept referenced, so shared memory stays attached as long as the worker lives
+    _worker_data = (shared, features, arrays['labels'], arrays['fold_ids'])
+
+
+def _run_sweep_task(config_index: int, params: dict, fold: int) -> tuple:
+    _, features, labels, fold_ids = _worker_data
+    return config_index, fold, evaluate_config(features, labels, fold_ids, params, fold)
+
+
+def run_sweep(features: CsrMatrix, labels, fold_ids: np.ndarray, configs: list, base_params: dict = None,
+              n_workers: int = None) -> list:
+    """
+    Evaluates every config on every fold (fold ids >= 0, see get_k_fold_ids and get_holdout_fold_ids), with
+    n_workers processes (defaults to no.of CPUs, 1 runs in the current process)
+
+    configs: list of dictionaries of LinearClassifier parameters. Eg: see get_grid_configs and get_random_configs
+    base_params: LinearClassifier parameters common to all configs. Eg: {'loss': 'hinge', 'seed': 0}
+
+    Returns a list of results, best mean accuracy first. Each result is a dictionary with the config's params,
+    per fold metrics, mean/std of accuracy, precision, recall and f1 across folds, and total training/evaluation
+    durations (in seconds)
+    """
+    labels = np.asarray(labels, dtype=np.int8)
+    fold_ids = np.asarray(fold_ids, dtype=np.int32)
+    folds = sorted(int(fold) for fold in np.unique(fold_ids) if fold >= 0)
+    all_params = [dict(base_params or {}, **config) for config in configs]
+    tasks = [(i, params, fold) for i, params in enumerate(all_params) for fold in folds]
+    n_workers = n_workers or os.cpu_count()
+    fold_results = [dict() for _ in configs]
+    start = time.perf_counter()
+    if n_workers == 1:
+        for i, params, fold in tasks:
+            fold_results[i][fold] = evaluate_config(features, labels, fold_ids, params, fold)
+    else:
+        arrays = {'indptr': features.indptr, 'indices': features.indices, 'data': features.data,
+                  'n_cols': np.array(features.shape[1]), 'labels': labels, 'fold_ids': fold_ids}
+        with SharedArrays.create(arrays) as shared, \
+                ProcessPoolExecutor(max_workers=n_workers, initializer=_init_sweep_worker,
+                                    initargs=(shared.spec,)) as executor:
+            for i, fold, result in executor.map(_run_sweep_task, *zip(*tasks)):
+                fold_results[i][fold] = result
+    LOGGER.info('Evaluated %s configs on %s folds in %.2fs', len(configs), len(folds), time.perf_counter() - start)
+
+    results = [_get_config_result(params, [fold_results[i][fold] for fold in folds])
+               for i, params in enumerate(all_params)]
+    return sorted(results, key=lambda result: -result['accuracy_mean'])
+
+
+def _get_config_result(params: dict, fold_results: list) -> dict:
+    result = {'params': params, 'folds': fold_results}
+    for metric in ['accuracy', 'precision', 'recall', 'f1']:
+        values = [fold_result[metric] for fold_result in fold_results]
+        result['{}_mean'.format(metric)] = float(np.mean(values))
+        result['{}_std'.format(metric)] = float(np.std(values))
+    result['fit_seconds'] = sum(fold_result['fit_seconds'] for fold_result in fold_results)
+    result['eval_seconds'] = sum(fold_result['eval_seconds'] for fold_result in fold_results)
+    return result
@@ -0,0 +1,210 @@
+"""
+Linear text classification models: a compact model file format, batch scoring of raw texts and a local HTTP scoring
+endpoint
+"""
+import itertools
+import json
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from features import CsrMatrix, Vocabulary, HashingVectorizer
+from linear_models import LinearClassifier
+from text_utils import TextPipeline
+
+LOGGER = logging.getLogger(__name__)
+
+MODEL_FORMAT_VERSION: int = 1
+# no.of texts scored at a time
+DEFAULT_CHUNK_SIZE: int = 1000
+# limits of a single HTTP scoring request
+MAX_REQUEST_BYTES: int = 16 * 1024 * 1024
+MAX_REQUEST_TEXTS: int = 10000
+
+
+class LinearTextModel:
+    """
+    Weights and bias of a linear classifier, together with the text pipeline and the vocabulary (or hashing
+    vectorizer) its features were built with, so that raw texts can be scored
+
+    Texts are scored a batch at a time: all texts are tokenized, all tokens are mapped to columns in a single pass,
+    and scores are computed with one sparse matrix-vector product
+
+    Model files are .npz files containing:
+        > weights (float32) and bias
+        > vocabulary: words with a weight, as a utf-8 blob (see Vocabulary.to_array), or
+          hashing: HashingVectorizer settings (JSON)
+        > text pipeline settings and format version (JSON)
+    """
+    def __init__(self, weights, bias: float, text_pipeline: TextPipeline, vocabulary: Vocabulary = None,
+                 vectorizer: HashingVectorizer = None):
+        if (vocabulary is None) == (vectorizer is None):
+            raise ValueError('Exactly one of vocabulary and vectorizer must be given')
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.text_pipeline = text_pipeline
+        self.vocabulary = vocabulary
+        self.vectorizer = vectorizer
+
+    @classmethod
+    def from_classifier(cls, classifier: LinearClassifier, text_pipeline: TextPipeline, vocabulary: Vocabulary = None,
+                        vectorizer: HashingVectorizer = None):
+        return cls(classifier.weights, classifier.bias, text_pipeline, vocabulary, vectorizer)
+
+    def transform(self, texts) -> CsrMatrix:
+        """
+        Returns features of given texts, one row per text
+        With a vocabulary, every occurrence of a word is a separate non-zero value (repeated column ids), which is
+        equivalent to word counts for dot products, and words without a weight are dropped
+        """
+        token_lists = self.text_pipeline.transform_batch(texts)
+        if self.vectorizer is not None:
+            return self.vectorizer.transform(token_lists)
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=len(token_lists))
+        ids = self.vocabulary.get_ids(itertools.chain.from_iterable(token_lists), count=int(lengths.sum()))
+        known = (ids >= 0) & (ids < len(self.weights))
+        rows = np.repeat(np.arange(len(token_lists), dtype=np.int64), lengths)[known]
+        indptr = np.zeros(len(token_lists) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(token_lists)), out=indptr[1:])
+        return CsrMatrix(indptr, ids[known], np.ones(len(rows), dtype=np.float32), len(self.weights))
+
+    def decision_function(self, texts) -> np.ndarray:
+        """
+        Returns scores x.w + b of given texts
+        """
+        return self.transform(texts).dot(self.weights) + self.bias
+
+    def predict(self, texts) -> np.ndarray:
+        """
+        Returns predicted labels 1/-1 of given texts
+        """
+        return np.where(self.decision_function(texts) > 0, 1, -1).astype(np.int8)
+
+    def save(self, file_path: str):
+        """
+        Saves the model into a .npz file. The file is replaced atomically, so a model being served is never read
+        half written
+        """
+        metadata = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'text_pipeline': self.text_pipeline.get_settings(),
+        }
+        arrays = {'weights': self.weights, 'bias': np.array(self.bias)}
+        if self.vectorizer is not None:
+            metadata['hashing'] = self.vectorizer.get_settings()
+        else:
+            # words added to the vocabulary after training have no weights, they are not saved
+            arrays['vocabulary'] = Vocabulary(self.vocabulary.words[:len(self.weights)]).to_array()
+        arrays['metadata'] = np.frombuffer(json.dumps(metadata).encode('utf-8'), dtype=np.uint8)
+        temp_file_path = '{}.tmp'.format(file_path)
+        with open(temp_file_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_file_path, file_path)
+
+    @classmethod
+    def load(cls, file_path: str):
+        with np.load(file_path) as arrays:
+            metadata = json.loads(arrays['metadata'].tobytes().decode('utf-8'))
+            if metadata['format_version'] != MODEL_FORMAT_VERSION:
+                raise ValueError('Unsupported model format version {} in {}'.format(metadata['format_version'],
+                                                                                   file_path))
+            vocabulary = Vocabulary.from_array(arrays['vocabulary']) if 'vocabulary' in arrays else None
+            weights = arrays['weights']
+            bias = float(arrays['bias'])
+        settings = metadata['text_pipeline']
+        text_pipeline = TextPipeline(settings['whitespace_patterns'], settings['lowercase'],
+                                     settings['split_punctuation'], settings['stopwords'])
+        vectorizer = None
+        if 'hashing' in metadata:
+            hashing = metadata['hashing']
+            vectorizer = HashingVectorizer(hashing['n_features'], tuple(hashing['ngram_range']), hashing['signed'])
+        return cls(weights, bias, text_pipeline, vocabulary, vectorizer)
+
+
+def iter_chunk_scores(model: LinearTextModel, lines, chunk_size: int = DEFAULT_CHUNK_SIZE, labeled: bool = False):
+    """
+    Scores lines of text chunk_size lines at a time, yields a tuple (labels, scores) for every chunk
+    labeled: lines are '<label> <text>' (Eg: Stanford IMDB dataset files), empty lines are skipped, and labels are
+        returned as an int8 array. Otherwise every line (empty or not) is a text and labels are None
+    """
+    lines = iter(lines)
+    for chunk in iter(lambda: list(itertools.islice(lines, chunk_size)), []):
+        if not labeled:
+            yield None, model.decision_function(chunk)
+            continue
+        labels_texts = [line.split(sep=' ', maxsplit=1) for line in chunk if line.strip()]
+        if not labels_texts:
+            continue
+        labels = np.array([label_text[0] for label_text in labels_texts]).astype(np.int8)
+        yield labels, model.decision_function([label_text[-1] if len(label_text) > 1 else ''
+                                               for label_text in labels_texts])
+
+
+class _ScoringRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /score with a JSON body {"texts": [<text>, ...]} returns {"labels": [1/-1, ...], "scores": [...]}
+    GET /health returns {"status": "ok"}
+    """
+    def _send_json(self, status: int, content: dict):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        self._send_json(200, {'status': 'ok'})
+
+    def do_POST(self):
+        if self.path != '/score':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            n_bytes = int(self.headers.get('Content-Length', 0))
+            if n_bytes < 0:
+                raise ValueError('Content-Length must not be negative')
+        except ValueError as e:
+            # the body is not read, so the connection can't be reused
+            self.close_connection = True
+            self._send_json(400, {'error': 'Invalid request: {}'.format(e)})
+            return
+        if n_bytes > MAX_REQUEST_BYTES:
+            self.close_connection = True
+            self._send_json(413, {'error': 'Request is larger than {} bytes'.format(MAX_REQUEST_BYTES)})
+            return
+        try:
+            texts = json.loads(self.rfile.read(n_bytes).decode('utf-8'))['texts']
+            if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                raise ValueError('texts must be a list of strings')
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': 'Invalid request: {}'.format(e)})
+            return
+        if len(texts) > MAX_REQUEST_TEXTS:
+            self._send_json(413, {'error': 'Request has more than {} texts'.format(MAX_REQUEST_TEXTS)})
+            return
+        try:
+            scores = self.server.model.decision_function(texts)
+        except Exception as e:
+            LOGGER.exception('Failed to score %s texts', len(texts))
+            self._send_json(500, {'error': 'Scoring failed: {}'.format(e)})
+            return
+        self._send_json(200, {'labels': np.where(scores > 0, 1, -1).tolist(), 'scores': scores.tolist()})
+
+    def log_message(self, format, *args):
+        LOGGER.debug('%s - %s', self.address_string(), format % args)
+
+
+def get_scoring_server(model: LinearTextModel, host: str = '127.0.0.1', port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Returns an HTTP server scoring texts with given model, see _ScoringRequestHandler. Call serve_forever() to start it
+    Each request is scored as one batch, so clients should send texts in (micro) batches rather than one at a time
+    """
+    server = ThreadingHTTPServer((host, port), _ScoringRequestHandler)
+    server.model = model
+    return server
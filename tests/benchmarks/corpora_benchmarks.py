@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmarks of corpora_utils and utils hot paths, on synthetic Stanford IMDB corpora
+(see synthetic_corpora). Run from the repository root:
+
+    PYTHONPATH=. python tests/benchmarks/corpora_benchmarks.py --reviews 10000 --baseline tests/benchmarks/baseline.json
+
+Every benchmark is run --repeat times and the fastest run is reported, as docs/sec. Peak memory is measured with
+tracemalloc in a separate run, so tracing doesn't slow down timed runs. Only allocations of this process are traced,
+set corpus_loader_workers to 1 (the default) to include file parsing.
+
+Results are written as JSON (--output, default stdout). When a baseline file is given, results are compared with
+the baseline and the script exits with status 1 if any benchmark is more than --threshold slower, or uses more than
+--threshold extra memory. --update-baseline overwrites the baseline file with the results.
+Baselines are machine specific, regenerate them when moving to a different machine.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from corpora_utils import CORPORA_CONFIG_SECTION, STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, \
+    STANFORD_MOVIE_REVIEW_DEV_FILE_PATH, STANFORD_MOVIE_REVIEW_TEST_FILE_PATH, clean_text, get_bow_dictionary, \
+    get_stanford_imdb_labels_features, get_stanford_imbd_vocabulary, get_stanford_imdb_markup_vocabulary, \
+    sample_stanford_imdb_dataset
+from tests.benchmarks.synthetic_corpora import SyntheticReviewGenerator
+from utils import ConfigHelper, get_sample_dataset
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_N_REVIEWS: int = 10000
+DEFAULT_REPEAT: int = 3
+DEFAULT_THRESHOLD: float = 0.2
+# sampled train/dev/test sizes, as fractions of the no.of reviews per archive split
+TRAIN_SAMPLE_FRACTION: float = 0.4
+DEV_SAMPLE_FRACTION: float = 0.1
+TEST_SAMPLE_FRACTION: float = 0.4
+
+
+class BenchmarkCorpora:
+    """
+    Synthetic corpora shared by benchmarks, generated on first use. Files are kept in work_dir, so repeat runs with
+    the same work_dir, no.of reviews and seed don't generate them again
+    """
+    def __init__(self, work_dir: str, n_reviews: int, seed: int = 0):
+        self.work_dir = work_dir
+        self.n_reviews = n_reviews
+        self.seed = seed
+        self._texts = None
+
+    def _get_file_path(self, name: str, generate_function) -> str:
+        file_path = os.path.join(self.work_dir, '{}-{}-{}'.format(self.n_reviews, self.seed, name))
+        if not os.path.exists(file_path):
+            LOGGER.info('Generating %s', file_path)
+            temp_file_path = file_path + '.part'
+            generate_function(SyntheticReviewGenerator(seed=self.seed), temp_file_path)
+            os.replace(temp_file_path, file_path)
+        return file_path
+
+    def get_dataset_file_path(self) -> str:
+        return self._get_file_path('reviews.txt', lambda g, p: g.write_dataset_file(p, self.n_reviews))
+
+    def get_archive_file_path(self) -> str:
+        """
+        Returns an archive with n_reviews reviews in total, n_reviews/2 in each of train and test splits
+        """
+        return self._get_file_path('aclImdb.tar.gz', lambda g, p: g.write_archive(p, self.n_reviews // 2))
+
+    def get_texts(self) -> list:
+        if self._texts is None:
+            self._texts = [text for _, text in SyntheticReviewGenerator(seed=self.seed).iter_reviews(self.n_reviews)]
+        return self._texts
+
+
+def _benchmark_clean_text(corpora: BenchmarkCorpora):
+    texts = corpora.get_texts()
+
+    def run():
+        for text in texts:
+            clean_text(text)
+    return run, len(texts)
+
+
+def _benchmark_get_bow_dictionary(corpora: BenchmarkCorpora):
+    texts = corpora.get_texts()
+
+    def run():
+        for text in texts:
+            get_bow_dictionary(text)
+    return run, len(texts)
+
+
+def _benchmark_get_stanford_imdb_labels_features(corpora: BenchmarkCorpora):
+    file_path = corpora.get_dataset_file_path()
+    return lambda: get_stanford_imdb_labels_features(file_path), corpora.n_reviews
+
+
+def _benchmark_get_stanford_imbd_vocabulary(corpora: BenchmarkCorpora):
+    file_path = corpora.get_dataset_file_path()
+    return lambda: get_stanford_imbd_vocabulary(file_path), corpora.n_reviews
+
+
+def _benchmark_get_stanford_imdb_markup_vocabulary(corpora: BenchmarkCorpora):
+    file_path = corpora.get_dataset_file_path()
+    return lambda: get_stanford_imdb_markup_vocabulary(file_path), corpora.n_reviews
+
+
+def _benchmark_get_sample_dataset(corpora: BenchmarkCorpora):
+    """
+    Samples half of a population of n_reviews rows in 2 classes. docs/sec is the no.of sampled rows per second
+    """
+    n_positive = corpora.n_reviews // 2
+    class_counts = [(1, n_positive), (-1, corpora.n_reviews - n_positive)]
+    sample_size = corpora.n_reviews // 2
+    return lambda: get_sample_dataset(class_counts, sample_size), sample_size
+
+
+@contextlib.contextmanager
+def _override_config(values: dict):
+    """
+    Sets ConfigHelper config values (a dictionary of section -> {key: value}) and restores previous values on exit,
+    the same way patch restores patched attributes
+    """
+    config = ConfigHelper.config
+    new_sections = [section for section in values
+                    if section != config.default_section and not config.has_section(section)]
+    previous_values = [(section, key, config.get(section, key, raw=True) if config.has_option(section, key) else None)
+                       for section, section_values in values.items() if section not in new_sections
+                       for key in section_values]
+    config.read_dict(values)
+    try:
+        yield
+    finally:
+        for section in new_sections:
+            config.remove_section(section)
+        for section, key, value in previous_values:
+            if value is None:
+                config.remove_option(section, key)
+            else:
+                config.set(section, key, value)
+
+
+def _get_sample_stanford_imdb_dataset_benchmark(streaming: bool):
+    def benchmark(corpora: BenchmarkCorpora):
+        archive_file_path = corpora.get_archive_file_path()
+        dataset_dir = os.path.join(corpora.work_dir, 'dataset')
+        n_reviews_per_split = corpora.n_reviews // 2
+        config = {
+            'DEFAULT': {
+                'dataset_dir': dataset_dir,
+                'temp_dir': os.path.join(corpora.work_dir, 'temp'),
+            },
+            CORPORA_CONFIG_SECTION: {
+                STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH: os.path.join(dataset_dir, 'train.txt'),
+                STANFORD_MOVIE_REVIEW_DEV_FILE_PATH: os.path.join(dataset_dir, 'dev.txt'),
+                STANFORD_MOVIE_REVIEW_TEST_FILE_PATH: os.path.join(dataset_dir, 'test.txt'),
+            },
+        }
+
+        def download_file(url: str, local_file_path: str):
+            shutil.copy(archive_file_path, local_file_path)
+
+        def run():
+            # download is mocked, same as in corpora_tests, and config is only changed while sampling
+            with patch('corpora_utils._download_file', download_file), _override_config(config):
+                sample_stanford_imdb_dataset(train_size=int(n_reviews_per_split * TRAIN_SAMPLE_FRACTION),
+                                             dev_size=int(n_reviews_per_split * DEV_SAMPLE_FRACTION),
+                                             test_size=int(n_reviews_per_split * TEST_SAMPLE_FRACTION),
+                                             streaming=streaming)
+
+        # docs/sec is the no.of reviews in the archive per second
+        return run, 2 * n_reviews_per_split
+    return benchmark
+
+
+BENCHMARKS: dict = {
+    'clean_text': _benchmark_clean_text,
+    'get_bow_dictionary': _benchmark_get_bow_dictionary,
+    'get_stanford_imdb_labels_features': _benchmark_get_stanford_imdb_labels_features,
+    'get_stanford_imbd_vocabulary': _benchmark_get_stanford_imbd_vocabulary,
+    'get_stanford_imdb_markup_vocabulary': _benchmark_get_stanford_imdb_markup_vocabulary,
+    'get_sample_dataset': _benchmark_get_sample_dataset,
+    'sample_stanford_imdb_dataset': _get_sample_stanford_imdb_dataset_benchmark(streaming=False),
+    'sample_stanford_imdb_dataset_streaming': _get_sample_stanford_imdb_dataset_benchmark(streaming=True),
+}
+
+
+def run_benchmark(run, n_docs: int, repeat: int = DEFAULT_REPEAT, measure_memory: bool = True) -> dict:
+    """
+    Times run() repeat times and returns the fastest run's duration and throughput, and optionally peak memory
+    allocated (in bytes) during an additional, traced run
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    result = {
+        'n_docs': n_docs,
+        'seconds': min(seconds),
+        'docs_per_sec': n_docs / min(seconds) if min(seconds) > 0 else float('inf'),
+    }
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run_benchmarks(corpora: BenchmarkCorpora, names: list = None, repeat: int = DEFAULT_REPEAT,
+                   measure_memory: bool = True) -> dict:
+    results = {}
+    for name in names or BENCHMARKS:
+        LOGGER.info('Running %s', name)
+        run, n_docs = BENCHMARKS[name](corpora)
+        results[name] = run_benchmark(run, n_docs, repeat, measure_memory)
+        LOGGER.info('%s: %.1f docs/sec', name, results[name]['docs_per_sec'])
+    return {
+        'n_reviews': corpora.n_reviews,
+        'seed': corpora.seed,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    Returns a list of regressions (as messages) of benchmarks found in both report and baseline:
+        > docs/sec below (1 - threshold) * baseline docs/sec
+        > peak memory above (1 + threshold) * baseline peak memory
+    Reports of different corpus sizes are not comparable, a ValueError is raised
+    """
+    if report['n_reviews'] != baseline['n_reviews']:
+        raise ValueError('Baseline was recorded with {} reviews, not {}'.format(baseline['n_reviews'],
+                                                                               report['n_reviews']))
+    regressions = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+        baseline_result = baseline['results'][name]
+        if result['docs_per_sec'] < (1 - threshold) * baseline_result['docs_per_sec']:
+            regressions.append('{}: {:.1f} docs/sec, baseline {:.1f} docs/sec'.format(
+                name, result['docs_per_sec'], baseline_result['docs_per_sec']))
+        if 'peak_memory_bytes' in result and 'peak_memory_bytes' in baseline_result and \
+                result['peak_memory_bytes'] > (1 + threshold) * baseline_result['peak_memory_bytes']:
+            regressions.append('{}: peak memory {} bytes, baseline {} bytes'.format(
+                name, result['peak_memory_bytes'], baseline_result['peak_memory_bytes']))
+    return regressions
+
+
+def _get_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Benchmarks of corpora_utils and utils on synthetic corpora')
+    parser.add_argument('--reviews', type=int, default=DEFAULT_N_REVIEWS, help='no.of reviews in synthetic corpora')
+    parser.add_argument('--seed', type=int, default=0, help='seed of synthetic corpora generator')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='no.of timed runs per benchmark')
+    parser.add_argument('--benchmark', action='append', choices=sorted(BENCHMARKS), dest='benchmarks',
+                        help='benchmark to run, can be repeated. All benchmarks are run by default')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurement')
+    parser.add_argument('--work-dir', help='folder to keep generated corpora in, a temp folder by default')
+    parser.add_argument('--output', help='file to write results (JSON) to, stdout by default')
+    parser.add_argument('--baseline', help='baseline results (JSON) to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed relative slowdown/memory increase w.r.t. baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='write results to the baseline file')
+    return parser
+
+
+def _main(argv=None) -> int:
+    args = _get_arg_parser().parse_args(argv)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='corpora-benchmarks-')
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        report = run_benchmarks(BenchmarkCorpora(work_dir, args.reviews, args.seed), args.benchmarks, args.repeat,
+                                not args.no_memory)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output + '\n')
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.threshold)
+        for regression in regressions:
+            LOGGER.error('Regression: %s', regression)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(_main())
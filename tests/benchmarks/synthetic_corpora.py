@@ -0,0 +1,70 @@
+"""
+Generates synthetic corpora in Stanford IMDB movie reviews formats, for benchmarks:
+    > sampled dataset files: one review per line, '<label 1/-1> <text>'
+    > aclImdb_v1.tar.gz like archives: aclImdb/<train/test>/<pos/neg>/<id>_<rating>.txt, one review per file
+Word frequencies follow a Zipf distribution and review lengths a log-normal distribution (mean ~230 words), reviews
+contain punctuation and <br /> markups, same as real reviews
+"""
+import io
+import tarfile
+
+import numpy as np
+
+VOCABULARY_SIZE: int = 50000
+MEAN_REVIEW_LENGTH: int = 230
+MIN_REVIEW_LENGTH: int = 5
+PUNCTUATION: list = ['.', ',', '!', '?']
+# reviews are generated in batches, words of a batch are drawn with a single call
+GENERATOR_BATCH_SIZE: int = 1000
+
+
+class SyntheticReviewGenerator:
+    def __init__(self, seed: int = 0, vocabulary_size: int = VOCABULARY_SIZE,
+                 mean_review_length: int = MEAN_REVIEW_LENGTH):
+        self._rng = np.random.default_rng(seed)
+        self.words = np.array(['w{}'.format(i) for i in range(vocabulary_size)], dtype=object)
+        # every 15th word is followed by a punctuation character, every 80th by line breaks
+        for i in range(0, vocabulary_size, 15):
+            self.words[i] += PUNCTUATION[i % len(PUNCTUATION)]
+        for i in range(7, vocabulary_size, 80):
+            self.words[i] += '<br /><br />'
+        self._word_cdf = np.cumsum(1.0 / np.arange(1, vocabulary_size + 1))
+        self._word_cdf /= self._word_cdf[-1]
+        # mean of a log-normal distribution is exp(mu + sigma^2/2)
+        self._sigma = 0.75
+        self._mu = np.log(mean_review_length) - self._sigma ** 2 / 2
+
+    def iter_reviews(self, n_reviews: int):
+        """
+        Yields (label, text) tuples, labels are 1 or -1 with equal probability
+        """
+        for start in range(0, n_reviews, GENERATOR_BATCH_SIZE):
+            batch_size = min(GENERATOR_BATCH_SIZE, n_reviews - start)
+            lengths = np.maximum(self._rng.lognormal(self._mu, self._sigma, size=batch_size).astype(np.int64),
+                                 MIN_REVIEW_LENGTH)
+            word_ids = np.searchsorted(self._word_cdf, self._rng.random(lengths.sum()))
+            words = self.words[word_ids].tolist()
+            labels = np.where(self._rng.random(batch_size) < 0.5, 1, -1).tolist()
+            offset = 0
+            for label, length in zip(labels, lengths.tolist()):
+                yield label, ' '.join(words[offset:offset + length])
+                offset += length
+
+    def write_dataset_file(self, file_path: str, n_reviews: int):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            for label, text in self.iter_reviews(n_reviews):
+                f.write('{} {}\n'.format(label, text))
+
+    def write_archive(self, archive_path: str, n_reviews_per_split: int):
+        """
+        Writes a gzipped tar archive with n_reviews_per_split train and n_reviews_per_split test reviews
+        """
+        with tarfile.open(archive_path, 'w:gz', compresslevel=1) as archive:
+            for split in ['train', 'test']:
+                for i, (label, text) in enumerate(self.iter_reviews(n_reviews_per_split)):
+                    rating = 7 + i % 4 if label == 1 else 1 + i % 4
+                    content = text.encode('utf-8')
+                    member = tarfile.TarInfo('aclImdb/{}/{}/{}_{}.txt'.format(split, 'pos' if label == 1 else 'neg',
+                                                                              i, rating))
+                    member.size = len(content)
+                    archive.addfile(member, io.BytesIO(content))
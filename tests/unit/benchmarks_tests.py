@@ -0,0 +1,64 @@
+import os
+import tarfile
+import tempfile
+import unittest
+
+from corpora_utils import get_stanford_imdb_labels_features, STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH
+from tests.benchmarks.corpora_benchmarks import BenchmarkCorpora, run_benchmarks, compare_with_baseline
+from tests.benchmarks.synthetic_corpora import SyntheticReviewGenerator
+from utils import ConfigHelper
+
+
+class TestSyntheticCorpora(unittest.TestCase):
+    def test_write_dataset_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            SyntheticReviewGenerator(seed=1).write_dataset_file(file_path, 50)
+            labels_features = get_stanford_imdb_labels_features(file_path)
+            self.assertEqual(50, len(labels_features))
+            self.assertTrue(all(label in (1, -1) and len(bow) > 0 for label, bow in labels_features))
+        self.assertEqual(list(SyntheticReviewGenerator(seed=1).iter_reviews(3)),
+                         list(SyntheticReviewGenerator(seed=1).iter_reviews(3)))
+
+    def test_write_archive(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            archive_path = os.path.join(temp_dir, 'aclImdb.tar.gz')
+            SyntheticReviewGenerator().write_archive(archive_path, 20)
+            with tarfile.open(archive_path) as archive:
+                names = archive.getnames()
+        self.assertEqual(40, len(names))
+        self.assertEqual(20, len([n for n in names if n.startswith('aclImdb/train/')]))
+        self.assertTrue(all(n.split('/')[2] in ('pos', 'neg') and n.endswith('.txt') for n in names))
+
+
+class TestCorporaBenchmarks(unittest.TestCase):
+    def test_run_benchmarks(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report = run_benchmarks(BenchmarkCorpora(temp_dir, 100), ['clean_text', 'get_stanford_imbd_vocabulary'],
+                                    repeat=1)
+        self.assertEqual(100, report['n_reviews'])
+        self.assertEqual({'clean_text', 'get_stanford_imbd_vocabulary'}, set(report['results']))
+        for result in report['results'].values():
+            self.assertEqual(100, result['n_docs'])
+            self.assertGreater(result['docs_per_sec'], 0)
+            self.assertGreater(result['peak_memory_bytes'], 0)
+
+    def test_sample_benchmark_restores_config(self):
+        keys = [('dataset_dir', 'DEFAULT'), ('temp_dir', 'DEFAULT'), (STANFORD_MOVIE_REVIEW_TRAIN_FILE_PATH, 'corpora')]
+        values = [ConfigHelper.get_config_value(key, section) for key, section in keys]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            report = run_benchmarks(BenchmarkCorpora(temp_dir, 40), ['sample_stanford_imdb_dataset'], repeat=1,
+                                    measure_memory=False)
+        self.assertEqual(40, report['results']['sample_stanford_imdb_dataset']['n_docs'])
+        self.assertEqual(values, [ConfigHelper.get_config_value(key, section) for key, section in keys])
+
+    def test_compare_with_baseline(self):
+        baseline = {'n_reviews': 10, 'results': {'a': {'docs_per_sec': 100.0, 'peak_memory_bytes': 1000},
+                                                 'b': {'docs_per_sec': 100.0}}}
+        report = {'n_reviews': 10, 'results': {'a': {'docs_per_sec': 85.0, 'peak_memory_bytes': 1100},
+                                               'b': {'docs_per_sec': 70.0, 'peak_memory_bytes': 1},
+                                               'c': {'docs_per_sec': 1.0}}}
+        self.assertEqual(1, len(compare_with_baseline(report, baseline, threshold=0.2)))
+        self.assertEqual(3, len(compare_with_baseline(report, baseline, threshold=0.05)))
+        with self.assertRaises(ValueError):
+            compare_with_baseline({'n_reviews': 20, 'results': {}}, baseline)
@@ -0,0 +1,137 @@
+import contextlib
+import io
+import unittest
+
+import torch
+import torch.nn.functional as F
+
+from char_cnn import CharEncoder, SentenceDataset, BucketBatchSampler, get_char_data_loader, CharBasedCNN
+from corpora_utils import get_stanford_imdb_labels_texts
+
+
+def _encode_batch(char2index: dict, sentences: list, max_word_len: int) -> list:
+    """
+    Same as sentence batch preparation in character_based_embeddings_cnn notebook
+    """
+    pad, unk = char2index['<pad>'], char2index['<unk>']
+    sent_batch = [[[char2index.get(ch, unk) for ch in word] for word in sent] for sent in sentences]
+    max_sent_len = max(len(sent) for sent in sent_batch)
+    for sent in sent_batch:
+        for w in range(len(sent)):
+            sent[w] = (sent[w] + [pad] * max_word_len)[:max_word_len]
+        sent.extend([[pad] * max_word_len] * (max_sent_len - len(sent)))
+    return sent_batch
+
+
+class TestCharCnn(unittest.TestCase):
+    def test_char_encoder(self):
+        encoder = CharEncoder(max_word_len=6)
+        self.assertEqual(64, encoder.n_chars)
+        self.assertEqual(62, encoder.char2index['<pad>'])
+        sentences = [['To', 'be', 'or', 'not', 'to', 'be'], ['Programming', 'is', 'fun!'], ['Ünïcode', '€', '']]
+        batch = encoder.encode_batch(sentences)
+        self.assertEqual((3, 6, 6), batch.shape)
+        self.assertEqual(torch.int64, batch.dtype)
+        self.assertEqual(_encode_batch(encoder.char2index, sentences, 6), batch.tolist())
+        self.assertEqual((3, 2, 6), encoder.encode_batch(sentences, max_sent_len=2).shape)
+        self.assertEqual((0, 6), encoder.encode_words([]).shape)
+
+    def test_bucket_batch_sampler(self):
+        lengths = [i % 17 for i in range(1000)]
+        batches = list(BucketBatchSampler(lengths, batch_size=10, pool_batches=100, seed=1))
+        self.assertEqual(100, len(batches))
+        self.assertEqual(list(range(1000)), sorted(i for batch in batches for i in batch))
+        # a pool of all sentences sorted by length leaves at most 16 batches with mixed lengths
+        self.assertLessEqual(len([b for b in batches if len({lengths[i] for i in b}) > 1]), 16)
+
+    def test_char_data_loader(self):
+        labels, texts = get_stanford_imdb_labels_texts('text_file_for_test.txt')
+        dataset = SentenceDataset.from_texts(texts, labels.tolist())
+        encoder = CharEncoder()
+        for bucket in [True, False]:
+            loader = get_char_data_loader(dataset, encoder, batch_size=2, bucket=bucket, seed=5)
+            batches = list(loader)
+            self.assertEqual(3, len(batches))
+            self.assertEqual(sorted(labels.tolist()), sorted(l for _, batch_labels in batches for l in batch_labels))
+            for batch, batch_labels in batches:
+                self.assertEqual(encoder.max_word_len, batch.shape[2])
+                self.assertEqual(len(batch_labels), batch.shape[0])
+
+    def _get_input_batch(self, encoder: CharEncoder) -> torch.Tensor:
+        sentences = ['To be or not to be', 'Programming is fun', 'Light at the end of the tunnel.',
+                     'Uranus and Neptune are ice giants', 'to be or not to be']
+        return encoder.encode_batch([sent.split() for sent in sentences])
+
+    def test_char_based_cnn(self):
+        encoder = CharEncoder()
+        input_batch = self._get_input_batch(encoder)
+        torch.manual_seed(3)
+        ch_cnn = CharBasedCNN(5, encoder.n_chars, 7, 4)
+        ch_cnn.eval()
+        embeddings = ch_cnn(input_batch)
+        self.assertEqual((5, 7, 7), embeddings.shape)
+
+        ch_cnn.use_maxpool_1d = True
+        self.assertTrue(torch.allclose(embeddings, ch_cnn(input_batch)))
+
+        # convolutions applied to individual words produce the same result as when applied to the batch
+        words = input_batch[2]
+        conv_out = F.relu(ch_cnn.conv1d(ch_cnn.embedding(words).transpose(dim0=1, dim1=2)))
+        self.assertTrue(torch.allclose(embeddings[2], conv_out.max(dim=2)[0]))
+
+        # nothing is printed unless verbose
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ch_cnn(input_batch)
+            self.assertEqual('', output.getvalue())
+            ch_cnn.verbose = True
+            ch_cnn(input_batch)
+            self.assertIn('input shape', output.getvalue())
+
+    def test_char_based_cnn_dedup_and_cache(self):
+        encoder = CharEncoder()
+        input_batch = self._get_input_batch(encoder)
+        n_distinct_words = len({tuple(word) for word in input_batch.view(-1, encoder.max_word_len).tolist()})
+        torch.manual_seed(3)
+        ch_cnn = CharBasedCNN(5, encoder.n_chars, 7, 4)
+        expected = ch_cnn(input_batch)
+        self.assertEqual(35, ch_cnn.n_computed_words)
+
+        ch_cnn.dedup_words = True
+        ch_cnn.n_computed_words = 0
+        embeddings = ch_cnn(input_batch)
+        self.assertTrue(torch.allclose(expected, embeddings))
+        self.assertEqual(n_distinct_words, ch_cnn.n_computed_words)
+        # gradients flow through deduplicated embeddings
+        embeddings.sum().backward()
+        self.assertIsNotNone(ch_cnn.conv1d.weight.grad)
+
+        ch_cnn.embedding_cache_size = 100
+        ch_cnn.eval()
+        ch_cnn.n_computed_words = 0
+        self.assertTrue(torch.allclose(expected, ch_cnn(input_batch)))
+        self.assertTrue(torch.allclose(expected, ch_cnn(input_batch)))
+        self.assertEqual(n_distinct_words, ch_cnn.n_computed_words)
+
+        # cache is cleared when training, as parameters change
+        ch_cnn.train()
+        with torch.no_grad():
+            ch_cnn.conv1d.bias.add_(1.0)
+        expected = ch_cnn(input_batch)
+        ch_cnn.eval()
+        ch_cnn.n_computed_words = 0
+        self.assertTrue(torch.allclose(expected, ch_cnn(input_batch)))
+        self.assertEqual(n_distinct_words, ch_cnn.n_computed_words)
+
+        # and when loading parameters
+        state_dict = {name: value + 1.0 for name, value in ch_cnn.state_dict().items()}
+        ch_cnn.load_state_dict(state_dict)
+        ch_cnn.n_computed_words = 0
+        embeddings = ch_cnn(input_batch)
+        self.assertEqual(n_distinct_words, ch_cnn.n_computed_words)
+        self.assertFalse(torch.allclose(expected, embeddings))
+
+        # cache size is bounded
+        ch_cnn.embedding_cache_size = 3
+        ch_cnn(input_batch)
+        self.assertEqual(3, len(ch_cnn._embedding_cache))
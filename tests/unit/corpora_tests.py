@@ -1,12 +1,20 @@
 import codecs
+import gzip
 import os
 import shutil
+import tempfile
 import unittest
 from unittest.mock import patch
 
 from corpora_utils import sample_stanford_imdb_dataset, clean_text, get_bow_dictionary, \
-    get_stanford_imbd_vocabulary, get_stanford_imdb_markup_vocabulary, get_stanford_imdb_labels_features
-from utils import ConfigHelper
+    get_stanford_imbd_vocabulary, get_stanford_imdb_markup_vocabulary, get_stanford_imdb_labels_features, \
+    get_stanford_imdb_labels_sparse_features, _get_stanford_imdb_member_class, \
+    get_cached_stanford_imdb_labels_sparse_features, analyze_stanford_imdb_corpus, analyze_stanford_imdb_corpora, \
+    get_stanford_imdb_labels_hashed_features, _save_dataset, iter_stanford_imdb_labels_features, \
+    iter_stanford_imdb_labels_sparse_features, iter_stanford_imdb_labels_hashed_features, \
+    get_stanford_imdb_vocabulary_store, get_dataset_file_paths, _write_dataset
+from features import Vocabulary, HashingVectorizer
+from utils import ConfigHelper, ArrayCache, ProfileHelper, FileHelper
 
 
 def _mock_stfrd_imdb_file_download(url: str, local_file_path: str):
@@ -41,6 +49,122 @@ class TestCorporaUtils(unittest.TestCase):
             shutil.rmtree('data')
             shutil.rmtree('temp')
 
+    @patch('corpora_utils._download_file', _mock_stfrd_imdb_file_download)
+    def test_sample_stanford_imdb_dataset_profile(self):
+        try:
+            ProfileHelper.enable()
+            sample_stanford_imdb_dataset(train_size=5, dev_size=3, test_size=5)
+            stages = ProfileHelper.get_summary()['stages']
+            self.assertEqual(['sample_stanford_imdb_dataset'] + ['sample_stanford_imdb_dataset/{}'.format(stage)
+                                                                for stage in ['download', 'unpack', 'glob', 'sample',
+                                                                              'save_train', 'save_dev', 'save_test']],
+                             list(stages))
+            self.assertEqual(os.path.getsize('test-stfrd-reviews.tar.gz'),
+                             stages['sample_stanford_imdb_dataset/download']['n_bytes'])
+            self.assertEqual(40, stages['sample_stanford_imdb_dataset/glob']['n_items'])
+            self.assertEqual(3, stages['sample_stanford_imdb_dataset/save_dev']['n_items'])
+            self.assertEqual(os.path.getsize(ConfigHelper.get_config_value('stanford_movie_review_dev_file_path',
+                                                                           'corpora')),
+                             stages['sample_stanford_imdb_dataset/save_dev']['n_bytes'])
+        finally:
+            ProfileHelper.enable(False)
+            ProfileHelper.reset()
+            shutil.rmtree('data')
+            shutil.rmtree('temp')
+
+    @patch('corpora_utils._download_file', _mock_stfrd_imdb_file_download)
+    def test_sample_stanford_imdb_dataset_streaming(self):
+        try:
+            sample_stanford_imdb_dataset(train_size=15, dev_size=5, test_size=20, streaming=True)
+
+            train_lines = _read_lines(ConfigHelper.get_config_value('stanford_movie_review_train_file_path', 'corpora'))
+            dev_lines = _read_lines(ConfigHelper.get_config_value('stanford_movie_review_dev_file_path', 'corpora'))
+            test_lines = _read_lines(ConfigHelper.get_config_value('stanford_movie_review_test_file_path', 'corpora'))
+            self.assertEqual(15, len(train_lines))
+            self.assertEqual(5, len(dev_lines))
+            self.assertEqual(20, len(test_lines))
+
+            # all 20 training reviews are sampled, each exactly once, either into train or dev
+            self.assertEqual(20, len(set(train_lines + dev_lines)))
+            for line in train_lines + dev_lines + test_lines:
+                self.assertIn(line.split(' ', maxsplit=1)[0], ['1', '-1'])
+
+            # nothing is extracted to disk
+            self.assertEqual([], os.listdir('temp'))
+        finally:
+            shutil.rmtree('data')
+            shutil.rmtree('temp')
+
+    @patch('corpora_utils._download_file', _mock_stfrd_imdb_file_download)
+    def test_sample_stanford_imdb_dataset_sharded_compressed(self):
+        try:
+            for streaming in [False, True]:
+                sample_stanford_imdb_dataset(train_size=9, dev_size=3, test_size=5, streaming=streaming, n_shards=2,
+                                             compress=True)
+                self.assertEqual(['stanford_movie_reviews_dev-00000-of-00002.txt.gz',
+                                  'stanford_movie_reviews_dev-00001-of-00002.txt.gz',
+                                  'stanford_movie_reviews_test-00000-of-00002.txt.gz',
+                                  'stanford_movie_reviews_test-00001-of-00002.txt.gz',
+                                  'stanford_movie_reviews_train-00000-of-00002.txt.gz',
+                                  'stanford_movie_reviews_train-00001-of-00002.txt.gz'], sorted(os.listdir('data')))
+                for name, n_lines in [('train', [4, 5]), ('dev', [1, 2]), ('test', [2, 3])]:
+                    for shard in range(2):
+                        file_path = 'data/stanford_movie_reviews_{}-{:05d}-of-00002.txt.gz'.format(name, shard)
+                        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                            self.assertEqual(n_lines[shard], len(f.readlines()))
+                shutil.rmtree('data')
+        finally:
+            shutil.rmtree('data', ignore_errors=True)
+            shutil.rmtree('temp')
+
+    def test_read_sharded_compressed_dataset(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            shutil.copy('text_file_for_test.txt', file_path)
+            lines = _read_lines(file_path)
+            labels_features = get_stanford_imdb_labels_features(file_path, n_workers=1)
+            vocabulary = get_stanford_imbd_vocabulary(file_path, n_workers=1)
+            word_counts = get_stanford_imdb_vocabulary_store([file_path], os.path.join(temp_dir, 'v.npz')).most_common()
+            for n_shards, compress, n_files in [(2, True, 2), (3, False, 3), (1, True, 1)]:
+                _write_dataset(file_path, lines, len(lines), n_shards, compress)
+                # files written by previous iterations are deleted
+                self.assertEqual(n_files + 1, len(os.listdir(temp_dir)))
+                self.assertEqual(n_files, len(get_dataset_file_paths(file_path)))
+                for n_workers in [1, 2]:
+                    self.assertEqual(labels_features, get_stanford_imdb_labels_features(file_path, n_workers))
+                    self.assertEqual(vocabulary, get_stanford_imbd_vocabulary(file_path, n_workers))
+                store_path = os.path.join(temp_dir, 'v.npz')
+                os.remove(store_path)
+                self.assertEqual(word_counts, get_stanford_imdb_vocabulary_store([file_path], store_path).most_common())
+            _write_dataset(file_path, lines, len(lines))
+            self.assertEqual([file_path], get_dataset_file_paths(file_path))
+            self.assertEqual(['reviews.txt', 'v.npz'], sorted(os.listdir(temp_dir)))
+
+    def test_save_dataset(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            class_files = {1: [], -1: []}
+            for i in range(600):
+                c = 1 if i % 2 else -1
+                class_files[c].append(os.path.join(temp_dir, '{}.txt'.format(i)))
+                with open(class_files[c][-1], 'w', encoding='utf-8') as f:
+                    f.write(' review {} \n'.format(i))
+            class_indices = [(1 if i % 2 else -1, i // 2) for i in reversed(range(600))]
+            file_path = os.path.join(temp_dir, 'dataset.txt')
+            expected_lines = ['{} review {}\n'.format(1 if i % 2 else -1, i) for i in reversed(range(600))]
+            for n_threads in [1, 4]:
+                self.assertEqual((600, sum(len(line) for line in expected_lines)),
+                                 _save_dataset(file_path, class_indices, class_files, n_threads=n_threads))
+                # lines are in the sampled order
+                self.assertEqual(expected_lines, _read_lines(file_path))
+
+    def test_get_stanford_imdb_member_class(self):
+        self.assertEqual(('train', 1), _get_stanford_imdb_member_class('aclImdb/train/pos/0_9.txt'))
+        self.assertEqual(('test', -1), _get_stanford_imdb_member_class('a/test/b/neg/c/1_2.txt'))
+        self.assertIsNone(_get_stanford_imdb_member_class('aclImdb/train/urls_pos.txt'))
+        self.assertIsNone(_get_stanford_imdb_member_class('aclImdb/train/unsup/0_0.txt'))
+        self.assertIsNone(_get_stanford_imdb_member_class('aclImdb/pos/train/0_0.txt'))
+        self.assertIsNone(_get_stanford_imdb_member_class('aclImdb/train/pos/0_0.feat'))
+
     def test_clean_text(self):
         import corpora_utils
         temp = list(corpora_utils.HTML_WHITESPACE_PATTERNS)
@@ -83,3 +207,195 @@ class TestCorporaUtils(unittest.TestCase):
         self.assertEqual((1, {'efg': 1, '<p>': 1, '<pre/>': 1}), labels_features[2])
         self.assertEqual((1, {'hijk': 1}), labels_features[3])
         self.assertEqual((-1, {'lmnop': 1, '<test': 1, '123>': 1}), labels_features[4])
+
+    def test_get_stanford_imdb_labels_sparse_features(self):
+        labels, features, vocabulary = get_stanford_imdb_labels_sparse_features('text_file_for_test.txt')
+        self.assertEqual([1, -1, 1, 1, -1], labels.tolist())
+        self.assertEqual((5, len(vocabulary)), features.shape)
+        for i, (label, bow) in enumerate(get_stanford_imdb_labels_features('text_file_for_test.txt')):
+            self.assertEqual(bow, {vocabulary.get_word(j): c for j, c in features.get_row(i).items()})
+
+        # words missing in the vocabulary are dropped when vocabulary is not extended
+        _, features, vocabulary = get_stanford_imdb_labels_sparse_features('text_file_for_test.txt',
+                                                                           Vocabulary(['efg', 'hijk']),
+                                                                           extend_vocabulary=False)
+        self.assertEqual(2, len(vocabulary))
+        self.assertEqual([{}, {}, {0: 1.0}, {1: 1.0}, {}], [features.get_row(i) for i in range(5)])
+
+    def test_parallel_loading(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                for i in range(200):
+                    f.write('{} review #{} <br />is {}<p>\n'.format(1 if i % 3 else -1, i, 'good' if i % 3 else 'bad'))
+            self.assertEqual(get_stanford_imdb_labels_features(file_path, n_workers=1),
+                             get_stanford_imdb_labels_features(file_path, n_workers=3))
+            self.assertEqual(get_stanford_imbd_vocabulary(file_path, n_workers=1),
+                             get_stanford_imbd_vocabulary(file_path, n_workers=3))
+            self.assertEqual({'<br />', '<p>'}, get_stanford_imdb_markup_vocabulary(file_path, n_workers=2))
+
+    def test_parallel_loading_carriage_returns(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            with open(file_path, 'wb') as f:
+                for i in range(100):
+                    # a lone \r within a review, and Windows line endings
+                    f.write('{} review\r{} is good\r\n'.format(1 if i % 3 else -1, i).encode('utf-8'))
+            labels_features = get_stanford_imdb_labels_features(file_path, n_workers=1)
+            self.assertEqual(100, len(labels_features))
+            self.assertEqual(labels_features, get_stanford_imdb_labels_features(file_path, n_workers=3))
+            self.assertEqual(get_stanford_imbd_vocabulary(file_path, n_workers=1),
+                             get_stanford_imbd_vocabulary(file_path, n_workers=3))
+
+    def test_get_cached_stanford_imdb_labels_sparse_features(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ArrayCache(temp_dir)
+            expected_labels, expected_features, expected_vocabulary = \
+                get_stanford_imdb_labels_sparse_features('text_file_for_test.txt', Vocabulary(['efg']))
+            for _ in range(2):
+                # 1st call populates the cache, 2nd call reads from it
+                labels, features, vocabulary = get_cached_stanford_imdb_labels_sparse_features(
+                    'text_file_for_test.txt', Vocabulary(['efg']), cache=cache)
+                self.assertEqual(expected_labels.tolist(), labels.tolist())
+                self.assertEqual(expected_features.shape, features.shape)
+                self.assertEqual(expected_features.indptr.tolist(), features.indptr.tolist())
+                self.assertEqual(expected_features.indices.tolist(), features.indices.tolist())
+                self.assertEqual(expected_features.data.tolist(), features.data.tolist())
+                self.assertEqual(expected_vocabulary.words, vocabulary.words)
+            self.assertEqual(1, len(os.listdir(temp_dir)))
+
+            # a different vocabulary results in a different cache entry
+            _, features, vocabulary = get_cached_stanford_imdb_labels_sparse_features(
+                'text_file_for_test.txt', vocabulary, extend_vocabulary=False, cache=cache)
+            self.assertEqual(expected_vocabulary.words, vocabulary.words)
+            self.assertEqual(2, len(os.listdir(temp_dir)))
+
+            # a change in text cleaning settings invalidates cached features
+            import corpora_utils
+            temp = list(corpora_utils.HTML_WHITESPACE_PATTERNS)
+            corpora_utils.HTML_WHITESPACE_PATTERNS.append(r'<p>')
+            try:
+                _, _, vocabulary = get_cached_stanford_imdb_labels_sparse_features('text_file_for_test.txt',
+                                                                                  cache=cache)
+                self.assertNotIn('<p>', vocabulary)
+                self.assertEqual(3, len(os.listdir(temp_dir)))
+            finally:
+                corpora_utils.HTML_WHITESPACE_PATTERNS = temp
+
+    def test_feature_cache_key_digests(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ArrayCache(os.path.join(temp_dir, 'cache'))
+            file_path = os.path.join(temp_dir, 'dataset.txt')
+            shutil.copy('text_file_for_test.txt', file_path)
+            with patch.object(FileHelper, 'get_sha256', wraps=FileHelper.get_sha256) as get_sha256:
+                for _ in range(2):
+                    get_cached_stanford_imdb_labels_sparse_features(file_path, cache=cache)
+                # an unchanged file is hashed once
+                self.assertEqual(1, get_sha256.call_count)
+
+                with open(file_path, 'a', encoding='utf-8') as f:
+                    f.write('1 new review\n')
+                labels, _, _ = get_cached_stanford_imdb_labels_sparse_features(file_path, cache=cache)
+                self.assertEqual(2, get_sha256.call_count)
+                self.assertEqual(1, labels[-1])
+                self.assertEqual(2, len(os.listdir(cache.cache_dir)))
+
+    def test_get_stanford_imdb_vocabulary_store(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            store_path = os.path.join(temp_dir, 'vocabulary.npz')
+            shutil.copy('text_file_for_test.txt', file_path)
+            store = get_stanford_imdb_vocabulary_store([file_path], store_path)
+            self.assertEqual(get_stanford_imbd_vocabulary(file_path), set(store.to_vocabulary().words))
+            self.assertEqual(2, store.get_count('is'))
+            self.assertEqual(22, store.total_count)
+
+            # only appended reviews are read, a partially written line is left for the next update
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write('1 new is\n-1 partial')
+            with patch('corpora_utils.FileHelper.read_lines_in_range', wraps=FileHelper.read_lines_in_range) as read:
+                store = get_stanford_imdb_vocabulary_store([file_path], store_path)
+                self.assertEqual(os.path.getsize('text_file_for_test.txt'), read.call_args[0][1])
+            self.assertEqual(3, store.get_count('is'))
+            self.assertEqual(1, store.get_count('new'))
+            self.assertNotIn('partial', store)
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write(' line is\n')
+            store = get_stanford_imdb_vocabulary_store([file_path], store_path)
+            self.assertEqual(['<pre/>', 'is'], sorted(store.to_vocabulary(min_count=2).words))
+
+            # words occurring once per update reach min_count, same as when the store is rebuilt from scratch
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write('1 new\n')
+            store = get_stanford_imdb_vocabulary_store([file_path], store_path)
+            rebuilt = get_stanford_imdb_vocabulary_store([file_path], os.path.join(temp_dir, 'rebuilt.npz'))
+            self.assertEqual(rebuilt.most_common(), store.most_common())
+            self.assertEqual(rebuilt.to_vocabulary(min_count=2).words, store.to_vocabulary(min_count=2).words)
+            self.assertIn('new', store.to_vocabulary(min_count=2))
+
+    def test_analyze_stanford_imdb_corpus(self):
+        stats = analyze_stanford_imdb_corpus('text_file_for_test.txt')
+        self.assertEqual(5, stats.n_docs)
+        self.assertEqual({1: 3, -1: 2}, stats.label_counts)
+        self.assertEqual(get_stanford_imbd_vocabulary('text_file_for_test.txt'), set(stats.word_counts))
+        self.assertEqual(get_stanford_imdb_markup_vocabulary('text_file_for_test.txt'), set(stats.markup_counts))
+        self.assertEqual(2, stats.markup_counts['<pre/>'])
+        self.assertEqual({9: 1, 3: 3, 4: 1}, stats.doc_length_counts)
+        self.assertEqual(22, stats.n_words)
+        self.assertEqual({'min': 3, 'max': 9, 'mean': 4.4, 'median': 3.0}, stats.to_dict()['doc_length'])
+        vocabulary = {'lmnop', '<test', 'this', 'file', 'is', 'used', 'in', 'unit', 'tests,', "don't", 'delete'}
+        self.assertEqual((10 / 22, 0.45), stats.get_oov_rates(vocabulary))
+
+    def test_analyze_stanford_imdb_corpora(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write('1 efg new <br>\n-1 new words\n')
+            summary = analyze_stanford_imdb_corpora({'train': 'text_file_for_test.txt', 'test': file_path}, top_k=2)
+        self.assertEqual(22, summary['vocabulary_size'])
+        self.assertEqual(5, summary['markup_vocabulary_size'])
+        self.assertNotIn('oov', summary['files']['train'])
+        self.assertEqual({'reference': 'train', 'word_rate': 0.6, 'distinct_word_rate': 0.5},
+                         summary['files']['test']['oov'])
+        self.assertEqual([('new', 2), ('efg', 1)], summary['files']['test']['top_words'])
+        self.assertEqual({'min': 2, 'max': 3, 'mean': 2.5, 'median': 2.5}, summary['files']['test']['doc_length'])
+
+    def test_iter_stanford_imdb_labels_features(self):
+        chunks = list(iter_stanford_imdb_labels_features('text_file_for_test.txt', chunk_size=2))
+        self.assertEqual([2, 2, 1], [len(chunk) for chunk in chunks])
+        self.assertEqual(get_stanford_imdb_labels_features('text_file_for_test.txt'),
+                         [label_bow for chunk in chunks for label_bow in chunk])
+
+    def test_iter_stanford_imdb_labels_sparse_features(self):
+        labels, features, vocabulary = get_stanford_imdb_labels_sparse_features('text_file_for_test.txt')
+        chunk_vocabulary = Vocabulary()
+        chunks = list(iter_stanford_imdb_labels_sparse_features('text_file_for_test.txt', chunk_vocabulary,
+                                                                chunk_size=3))
+        self.assertEqual(vocabulary.words, chunk_vocabulary.words)
+        self.assertEqual(labels.tolist(), [label for chunk_labels, _ in chunks for label in chunk_labels.tolist()])
+        # earlier chunks have fewer columns, as vocabulary grows while reading the file
+        self.assertLess(chunks[0][1].shape[1], chunks[1][1].shape[1])
+        self.assertEqual(len(vocabulary), chunks[1][1].shape[1])
+        for i in range(features.shape[0]):
+            self.assertEqual(features.get_row(i), chunks[i // 3][1].get_row(i % 3))
+
+        # fixed vocabulary
+        chunks = list(iter_stanford_imdb_labels_sparse_features('text_file_for_test.txt', vocabulary, False, 2))
+        self.assertTrue(all(chunk_features.shape[1] == len(vocabulary) for _, chunk_features in chunks))
+
+    def test_iter_stanford_imdb_labels_hashed_features(self):
+        vectorizer = HashingVectorizer(2 ** 10)
+        labels, features = get_stanford_imdb_labels_hashed_features('text_file_for_test.txt', vectorizer)
+        chunks = list(iter_stanford_imdb_labels_hashed_features('text_file_for_test.txt', vectorizer, chunk_size=4))
+        self.assertEqual([4, 1], [len(chunk_labels) for chunk_labels, _ in chunks])
+        self.assertEqual(labels.tolist(), [label for chunk_labels, _ in chunks for label in chunk_labels.tolist()])
+        self.assertEqual(features.get_row(4), chunks[1][1].get_row(0))
+
+    def test_get_stanford_imdb_labels_hashed_features(self):
+        vectorizer = HashingVectorizer(2 ** 20, signed=False)
+        labels, features = get_stanford_imdb_labels_hashed_features('text_file_for_test.txt', vectorizer)
+        self.assertEqual([1, -1, 1, 1, -1], labels.tolist())
+        self.assertEqual((5, 2 ** 20), features.shape)
+        # no collisions among these few words
+        self.assertEqual([sum(bow.values()) for _, bow in get_stanford_imdb_labels_features('text_file_for_test.txt')],
+                         [sum(features.get_row(i).values()) for i in range(5)])
@@ -0,0 +1,152 @@
+import collections
+import os
+import tempfile
+import unittest
+import zlib
+
+import numpy as np
+
+from features import CsrMatrix, CsrMatrixBuilder, Vocabulary, HashingVectorizer, vstack_csr_matrices, \
+    VocabularyStore
+
+
+class TestFeatures(unittest.TestCase):
+    def _build_matrix(self) -> CsrMatrix:
+        builder = CsrMatrixBuilder()
+        builder.add_row({0: 1, 2: 2})
+        builder.add_row({})
+        builder.add_row({1: 3})
+        return builder.build(3)
+
+    def test_csr_matrix(self):
+        m = self._build_matrix()
+        self.assertEqual((3, 3), m.shape)
+        self.assertEqual(3, m.nnz)
+        self.assertEqual([0, 2, 2, 3], m.indptr.tolist())
+        self.assertEqual({0: 1.0, 2: 2.0}, m.get_row(0))
+        self.assertEqual({}, m.get_row(1))
+        self.assertEqual([5.0, 0.0, 6.0], m.dot(np.array([1.0, 2.0, 2.0])).tolist())
+        # columns beyond weights size are ignored
+        self.assertEqual([1.0, 0.0, 6.0], m.dot(np.array([1.0, 2.0])).tolist())
+
+    def test_csr_matrix_take_rows(self):
+        m = self._build_matrix().take_rows([2, 0, 1, 2])
+        self.assertEqual((4, 3), m.shape)
+        self.assertEqual([{1: 3.0}, {0: 1.0, 2: 2.0}, {}, {1: 3.0}], [m.get_row(i) for i in range(4)])
+
+    def test_vocabulary(self):
+        vocab = Vocabulary(['a', 'b'])
+        self.assertEqual(2, vocab.add('c'))
+        self.assertEqual(0, vocab.add('a'))
+        self.assertEqual({0: 2, 3: 1}, vocab.get_bow_ids({'a': 2, 'd': 1}))
+        self.assertEqual({1: 1}, vocab.get_bow_ids({'b': 1, 'e': 1}, extend=False))
+        self.assertNotIn('e', vocab)
+        self.assertEqual('d', vocab.get_word(3))
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'vocab.txt')
+            vocab.save(file_path)
+            self.assertEqual(['a', 'b', 'c', 'd'], Vocabulary.load(file_path).words)
+
+    def test_vstack_csr_matrices(self):
+        m = vstack_csr_matrices([self._build_matrix(), self._build_matrix().take_rows([2])])
+        self.assertEqual((4, 3), m.shape)
+        self.assertEqual([{0: 1.0, 2: 2.0}, {}, {1: 3.0}, {1: 3.0}], [m.get_row(i) for i in range(4)])
+
+    def test_hashing_vectorizer(self):
+        def _get_expected_row(ngrams: list, n_features: int, signed: bool) -> dict:
+            row = {}
+            for ngram in ngrams:
+                h = zlib.crc32(ngram.encode('utf-8'))
+                column = (h & 0x7fffffff) % n_features
+                row[column] = row.get(column, 0.0) + (-1.0 if signed and h & 0x80000000 else 1.0)
+            return {c: v for c, v in row.items() if v != 0}
+
+        docs = [['not', 'good', 'not', 'bad'], [], ['good']]
+        for n_features in [2 ** 20, 7]:
+            for signed in [True, False]:
+                vectorizer = HashingVectorizer(n_features, signed=signed)
+                m = vectorizer.transform(docs)
+                self.assertEqual((3, n_features), m.shape)
+                for i, doc in enumerate(docs):
+                    self.assertEqual(_get_expected_row(doc, n_features, signed), m.get_row(i))
+
+        vectorizer = HashingVectorizer(ngram_range=(1, 2))
+        self.assertEqual(['not', 'good', 'not', 'bad', 'not good', 'good not', 'not bad'],
+                         vectorizer.get_ngrams(docs[0]))
+        self.assertEqual(['not good', 'good not'], HashingVectorizer(ngram_range=(2, 2)).get_ngrams(docs[0][:3]))
+        self.assertEqual(6, len(vectorizer.transform(docs[:1]).get_row(0)))
+        self.assertEqual((0, 2 ** 20), vectorizer.transform([]).shape)
+        self.assertRaises(ValueError, HashingVectorizer, 0)
+        self.assertRaises(ValueError, HashingVectorizer, ngram_range=(2, 1))
+
+
+class TestVocabularyStore(unittest.TestCase):
+    def test_update(self):
+        store = VocabularyStore()
+        store.update(collections.Counter('the cat sat on the mat'.split()))
+        store.update({'zeta': 1, 'cat': 2, 'apple': 5, 'éclair': 1})
+        self.assertEqual(8, len(store))
+        self.assertEqual(15, store.total_count)
+        # ids in the order words were first added
+        self.assertEqual(['the', 'cat', 'sat', 'on', 'mat', 'zeta', 'apple', 'éclair'],
+                         [store.get_word(i) for i in range(len(store))])
+        self.assertEqual(6, store.get_id('apple'))
+        self.assertEqual(3, store.get_count('cat'))
+        self.assertEqual(0, store.get_count('dog'))
+        self.assertIsNone(store.get_id('dog'))
+        self.assertIn('éclair', store)
+        self.assertNotIn('dog', store)
+        self.assertEqual([('apple', 5), ('cat', 3), ('the', 2)], store.most_common(3))
+
+    def test_small_update(self):
+        # a few words are searched in the blob directly, the store is the same as one updated at once
+        words = ['w{:03d}'.format(i) for i in range(0, 1000, 2)]
+        store = VocabularyStore()
+        store.update(collections.Counter(words))
+        update = {'w001': 1, 'w998': 2, 'a': 1, 'zz': 3}
+        store.update(update)
+        expected = VocabularyStore()
+        expected.update(collections.Counter(words) + collections.Counter(update))
+        self.assertEqual([expected.get_word(i) for i in range(len(expected))],
+                         [store.get_word(i) for i in range(len(store))])
+        self.assertEqual([expected.get_count(word) for word in words + list(update)],
+                         [store.get_count(word) for word in words + list(update)])
+        self.assertEqual(expected.most_common(5), store.most_common(5))
+
+    def test_prune(self):
+        store = VocabularyStore()
+        store.update({'a': 1, 'b': 5, 'c': 3, 'd': 3, 'e': 2})
+        self.assertEqual(['b', 'c', 'd'], store.to_vocabulary(min_count=3).words)
+        self.assertEqual(['b', 'c'], store.to_vocabulary(max_size=2).words)
+        store.prune(min_count=2, max_size=3)
+        self.assertEqual(['b', 'c', 'd'], [store.get_word(i) for i in range(len(store))])
+        self.assertEqual([('b', 5), ('c', 3), ('d', 3)], store.most_common())
+        self.assertNotIn('e', store)
+        store.update({'a': 1, 'c': 1})
+        self.assertEqual(3, store.get_id('a'))
+        self.assertEqual(4, store.get_count('c'))
+
+    def test_save_load(self):
+        store = VocabularyStore()
+        store.update({'b': 2, 'a': 1, 'ü': 3})
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'reviews.txt')
+            with open(file_path, 'w') as f:
+                f.write('1 a b\n')
+            store.set_file_offset(file_path, 6)
+            store_path = os.path.join(temp_dir, 'vocabulary.npz')
+            store.save(store_path)
+            loaded = VocabularyStore.load(store_path)
+            self.assertEqual(store.most_common(), loaded.most_common())
+            self.assertEqual(['b', 'a', 'ü'], loaded.to_vocabulary().words)
+            self.assertEqual(6, loaded.get_file_offset(file_path))
+
+            # appending keeps the offset valid, any other modification invalidates it
+            with open(file_path, 'a') as f:
+                f.write('-1 c\n')
+            self.assertEqual(6, loaded.get_file_offset(file_path))
+            with open(file_path, 'w') as f:
+                f.write('1 x y\n')
+            self.assertRaises(ValueError, loaded.get_file_offset, file_path)
+            self.assertEqual(0, loaded.get_file_offset(os.path.join(temp_dir, 'new.txt')))
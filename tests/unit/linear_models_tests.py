@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+
+from features import CsrMatrixBuilder
+from linear_models import LinearClassifier
+
+
+def _get_separable_data(n_samples: int = 400, seed: int = 7):
+    """
+    Column 0 is a positive word, column 1 a negative word, remaining columns are noise
+    """
+    rng = np.random.default_rng(seed)
+    labels = rng.choice([-1, 1], size=n_samples).astype(np.int8)
+    builder = CsrMatrixBuilder()
+    for label in labels:
+        row = {int(c): 1.0 for c in rng.choice(np.arange(2, 20), size=3, replace=False)}
+        row[0 if label == 1 else 1] = 2.0
+        builder.add_row(row)
+    return builder.build(20), labels
+
+
+class TestLinearClassifier(unittest.TestCase):
+    def test_fit_predict(self):
+        features, labels = _get_separable_data()
+        for loss in ['hinge', 'log']:
+            for learning_rate in ['constant', 'invscaling', lambda t: 0.1]:
+                clf = LinearClassifier(loss=loss, eta=0.1, learning_rate=learning_rate, batch_size=16, n_epochs=5,
+                                       seed=3).fit(features, labels)
+                self.assertEqual(1.0, clf.score(features, labels), msg='loss = {}'.format(loss))
+                self.assertEqual(5, len(clf.loss_history))
+                self.assertLess(clf.loss_history[-1], clf.loss_history[0])
+                self.assertGreater(clf.weights[0], 0)
+                self.assertLess(clf.weights[1], 0)
+
+    def test_fit_is_reproducible(self):
+        features, labels = _get_separable_data()
+        w1 = LinearClassifier(seed=11, alpha=0.001).fit(features, labels).weights
+        w2 = LinearClassifier(seed=11, alpha=0.001).fit(features, labels).weights
+        self.assertTrue(np.array_equal(w1, w2))
+
+    def test_partial_fit(self):
+        features, labels = _get_separable_data()
+        clf = LinearClassifier(eta=0.1, batch_size=16, seed=3)
+        for _ in range(3):
+            for start in range(0, len(labels), 100):
+                rows = np.arange(start, min(start + 100, len(labels)))
+                clf.partial_fit(features.take_rows(rows), labels[rows])
+        self.assertEqual(12, len(clf.loss_history))
+        self.assertEqual(1.0, clf.score(features, labels))
+
+        # weights grow with the no.of columns, Eg: when vocabulary is extended
+        clf = LinearClassifier(seed=3).partial_fit(features.take_rows(np.arange(10)), labels[:10])
+        wider_features = CsrMatrixBuilder()
+        wider_features.add_row({25: 1.0})
+        clf.partial_fit(wider_features.build(30), [1])
+        self.assertEqual(30, len(clf.weights))
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError, LinearClassifier, loss='squared')
+        self.assertRaises(ValueError, LinearClassifier, learning_rate='optimal')
+        self.assertRaises(ValueError, LinearClassifier, batch_size=0)
+        self.assertRaises(ValueError, LinearClassifier, n_epochs=0)
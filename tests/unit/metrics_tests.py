@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from metrics import BinaryClassificationMetrics, evaluate_batches
+
+
+class TestBinaryClassificationMetrics(unittest.TestCase):
+    def test_update(self):
+        labels = [1, 1, 1, -1, -1, 1, -1]
+        predictions = [1, -1, 1, 1, -1, 1, -1]
+        metrics = BinaryClassificationMetrics().update(labels, predictions)
+        self.assertEqual((3, 1, 2, 1), (metrics.true_positives, metrics.false_positives, metrics.true_negatives,
+                                        metrics.false_negatives))
+        self.assertEqual(5 / 7, metrics.accuracy)
+        self.assertEqual(0.75, metrics.precision)
+        self.assertEqual(0.75, metrics.recall)
+        self.assertEqual(0.75, metrics.f1)
+
+        # same counts, when updated one batch (or one sample) at a time
+        incremental = BinaryClassificationMetrics()
+        incremental.update(np.array(labels[:3], dtype=np.int8), np.array(predictions[:3], dtype=np.int8))
+        for label, prediction in zip(labels[3:], predictions[3:]):
+            incremental.update(label, prediction)
+        self.assertEqual(metrics.to_dict(), incremental.to_dict())
+        self.assertEqual(metrics.to_dict(), BinaryClassificationMetrics().update(labels[:2], predictions[:2]).merge(
+            BinaryClassificationMetrics().update(labels[2:], predictions[2:])).to_dict())
+
+    def test_empty(self):
+        metrics = BinaryClassificationMetrics().update([-1, -1], [-1, -1])
+        self.assertEqual((1.0, 0.0, 0.0, 0.0), (metrics.accuracy, metrics.precision, metrics.recall, metrics.f1))
+        self.assertEqual(0.0, BinaryClassificationMetrics().accuracy)
+        self.assertRaises(ValueError, BinaryClassificationMetrics().update, [1, -1], [1])
+
+    def test_evaluate_batches(self):
+        batches = [([1, -1], np.array([0.5, -2.0])), ([1], np.array([-0.1]))]
+        metrics = evaluate_batches(lambda scores: np.where(scores > 0, 1, -1), batches)
+        self.assertEqual({'n_samples': 3, 'true_positives': 1, 'true_negatives': 1, 'false_negatives': 1,
+                          'false_positives': 0}, {k: v for k, v in metrics.to_dict().items()
+                                                  if k.startswith(('n_', 'true', 'false'))})
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from linear_models_tests import _get_separable_data
+from model_selection import get_grid_configs, get_random_configs, get_k_fold_ids, get_holdout_fold_ids, run_sweep
+from utils import SharedArrays
+
+
+class TestModelSelection(unittest.TestCase):
+    def test_get_configs(self):
+        grid = get_grid_configs({'eta': [0.1, 0.01], 'n_epochs': [1, 2, 3]})
+        self.assertEqual(6, len(grid))
+        self.assertEqual({'eta': 0.01, 'n_epochs': 3}, grid[-1])
+
+        configs = get_random_configs({'eta': [0.1, 0.01], 'n_epochs': [1, 2, 3]}, 4, seed=1)
+        self.assertEqual(4, len(configs))
+        self.assertEqual(4, len({tuple(config.items()) for config in configs}))
+        self.assertEqual(configs, get_random_configs({'eta': [0.1, 0.01], 'n_epochs': [1, 2, 3]}, 4, seed=1))
+        self.assertEqual(6, len(get_random_configs({'eta': [0.1, 0.01], 'n_epochs': [1, 2, 3]}, 10)))
+
+        configs = get_random_configs({'eta': lambda rng: 10 ** rng.uniform(-3, -1), 'n_epochs': [1, 2]}, 10, seed=2)
+        self.assertEqual(10, len(configs))
+        self.assertTrue(all(0.001 <= config['eta'] <= 0.1 and config['n_epochs'] in (1, 2) for config in configs))
+
+    def test_get_fold_ids(self):
+        fold_ids = get_k_fold_ids(10, 3, seed=0)
+        self.assertEqual([4, 3, 3], np.bincount(fold_ids).tolist())
+        self.assertFalse(np.array_equal(np.arange(10) % 3, fold_ids))
+        self.assertRaises(ValueError, get_k_fold_ids, 10, 1)
+        self.assertEqual([-1, -1, 0], get_holdout_fold_ids(2, 1).tolist())
+
+    def test_shared_arrays(self):
+        arrays = {'x': np.arange(5, dtype=np.int32), 'y': np.ones((2, 3)), 'z': np.array(7)}
+        with SharedArrays.create(arrays) as shared:
+            attached = SharedArrays.attach(shared.spec)
+            for name, a in arrays.items():
+                self.assertTrue(np.array_equal(a, attached.arrays[name]))
+                self.assertEqual(a.dtype, attached.arrays[name].dtype)
+            attached.close()
+
+    def test_run_sweep(self):
+        features, labels = _get_separable_data(n_samples=300, seed=5)
+        configs = get_grid_configs({'eta': [0.1, 1e-6], 'batch_size': [16]})
+        fold_ids = get_k_fold_ids(len(labels), 3, seed=0)
+        for n_workers in [1, 2]:
+            results = run_sweep(features, labels, fold_ids, configs, base_params={'n_epochs': 3, 'seed': 0},
+                                n_workers=n_workers)
+            self.assertEqual([{'eta': 0.1, 'batch_size': 16, 'n_epochs': 3, 'seed': 0},
+                              {'eta': 1e-6, 'batch_size': 16, 'n_epochs': 3, 'seed': 0}],
+                             [result['params'] for result in results])
+            self.assertEqual(1.0, results[0]['accuracy_mean'])
+            self.assertEqual(3, len(results[0]['folds']))
+            self.assertEqual(len(labels), sum(fold['n_samples'] for fold in results[0]['folds']))
+            self.assertGreater(results[0]['fit_seconds'], 0)
+
+        # holdout: the last 100 samples are evaluated
+        results = run_sweep(features, labels, get_holdout_fold_ids(200, 100), configs[:1], n_workers=1)
+        self.assertEqual(100, results[0]['folds'][0]['n_samples'])
@@ -0,0 +1,132 @@
+import http.client
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+
+import numpy as np
+
+from features import Vocabulary, HashingVectorizer, CsrMatrixBuilder
+from scoring import LinearTextModel, iter_chunk_scores, get_scoring_server
+from text_utils import TextPipeline
+
+TEXTS = ['a great movie<br />great', 'A terrible movie', '', 'unknown words only']
+
+
+def _get_model(hashing: bool = False) -> LinearTextModel:
+    text_pipeline = TextPipeline([r'<br */?>'], lowercase=True)
+    if hashing:
+        vectorizer = HashingVectorizer(1024, signed=False)
+        weights = np.zeros(1024)
+        weights[vectorizer.transform([['great']]).indices[0]] = 1.0
+        weights[vectorizer.transform([['terrible']]).indices[0]] = -2.0
+        return LinearTextModel(weights, 0.25, text_pipeline, vectorizer=vectorizer)
+    # 'extra' was added to the vocabulary after training, it has no weight
+    vocabulary = Vocabulary(['a', 'great', 'movie', 'terrible', 'extra'])
+    return LinearTextModel([0.0, 1.0, 0.5, -2.0], 0.25, text_pipeline, vocabulary=vocabulary)
+
+
+class TestLinearTextModel(unittest.TestCase):
+    def test_decision_function(self):
+        model = _get_model()
+        np.testing.assert_allclose([2.75, -1.25, 0.25, 0.25], model.decision_function(TEXTS))
+        self.assertEqual([1, -1, 1, 1], model.predict(TEXTS).tolist())
+        self.assertEqual(0.25, model.decision_function(['extra extra'])[0])
+        self.assertEqual(0, len(model.decision_function([])))
+
+        # same scores as a bag of words matrix
+        builder = CsrMatrixBuilder()
+        builder.add_row({1: 2.0, 2: 1.0})
+        np.testing.assert_allclose(builder.build(4).dot(model.weights) + 0.25,
+                                   model.decision_function(['great movie great']))
+
+        np.testing.assert_allclose([2.25, -1.75, 0.25, 0.25], _get_model(hashing=True).decision_function(TEXTS))
+        self.assertRaises(ValueError, LinearTextModel, [1.0], 0.0, TextPipeline())
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for hashing in [False, True]:
+                model = _get_model(hashing)
+                file_path = os.path.join(tmp_dir, 'model.npz')
+                model.save(file_path)
+                loaded = LinearTextModel.load(file_path)
+                self.assertEqual(model.text_pipeline.get_settings(), loaded.text_pipeline.get_settings())
+                self.assertEqual(model.bias, loaded.bias)
+                np.testing.assert_array_equal(model.decision_function(TEXTS), loaded.decision_function(TEXTS))
+                self.assertEqual(['model.npz'], os.listdir(tmp_dir))
+                if hashing:
+                    self.assertEqual(model.vectorizer.get_settings(), loaded.vectorizer.get_settings())
+                else:
+                    self.assertEqual(['a', 'great', 'movie', 'terrible'], loaded.vocabulary.words)
+
+    def test_save_failure(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, 'model.npz')
+            _get_model().save(file_path)
+            with patch('scoring.np.savez', side_effect=OSError('disk full')):
+                self.assertRaises(OSError, _get_model(hashing=True).save, file_path)
+            # the previous model is still there
+            self.assertIsNotNone(LinearTextModel.load(file_path).vocabulary)
+
+    def test_iter_chunk_scores(self):
+        model = _get_model()
+        chunks = list(iter_chunk_scores(model, TEXTS, chunk_size=3))
+        self.assertEqual([3, 1], [len(scores) for _, scores in chunks])
+        self.assertTrue(all(labels is None for labels, _ in chunks))
+
+        lines = ['1 great\n', '\n', '-1 terrible movie\n', '-1\n']
+        chunks = list(iter_chunk_scores(model, iter(lines), chunk_size=2, labeled=True))
+        self.assertEqual([1, -1, -1], np.concatenate([labels for labels, _ in chunks]).tolist())
+        np.testing.assert_allclose([1.25, -1.25, 0.25], np.concatenate([scores for _, scores in chunks]))
+
+
+class TestScoringServer(unittest.TestCase):
+    def setUp(self):
+        self.server = get_scoring_server(_get_model(), port=0)
+        self.url = 'http://{}:{}'.format(*self.server.server_address[:2])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _post(self, path: str, body: bytes):
+        request = urllib.request.Request(self.url + path, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def test_score(self):
+        response = self._post('/score', json.dumps({'texts': TEXTS}).encode('utf-8'))
+        self.assertEqual([1, -1, 1, 1], response['labels'])
+        np.testing.assert_allclose([2.75, -1.25, 0.25, 0.25], response['scores'])
+        with urllib.request.urlopen(self.url + '/health') as response:
+            self.assertEqual({'status': 'ok'}, json.loads(response.read().decode('utf-8')))
+
+    def test_invalid_requests(self):
+        for path, body, status in [('/score', b'{"texts": "text"}', 400), ('/score', b'not json', 400),
+                                   ('/other', b'{}', 404)]:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self._post(path, body)
+            self.assertEqual(status, context.exception.code)
+            context.exception.close()
+
+        for content_length in ['abc', '-1']:
+            connection = http.client.HTTPConnection(*self.server.server_address[:2], timeout=5)
+            connection.putrequest('POST', '/score')
+            connection.putheader('Content-Length', content_length)
+            connection.endheaders()
+            response = connection.getresponse()
+            self.assertEqual(400, response.status)
+            self.assertIn('error', json.loads(response.read().decode('utf-8')))
+            connection.close()
+
+        with patch.object(self.server.model, 'decision_function', side_effect=RuntimeError('failed')), \
+                self.assertRaises(urllib.error.HTTPError) as context:
+            self._post('/score', json.dumps({'texts': TEXTS}).encode('utf-8'))
+        self.assertEqual(500, context.exception.code)
+        self.assertIn('error', json.loads(context.exception.read().decode('utf-8')))
+        context.exception.close()
@@ -0,0 +1,32 @@
+import unittest
+
+from text_utils import TextPipeline, ENGLISH_STOPWORDS
+
+
+class TestTextPipeline(unittest.TestCase):
+    def test_clean(self):
+        pipeline = TextPipeline([r'<br */?>', r'<pre */?>'])
+        s = ' \t\nabcd <br> <br />  <br > <br/> <br   /><pre><pre/><pre /> efg\n\t  '
+        self.assertEqual('abcd               efg', pipeline.clean(s))
+        self.assertEqual('abcd', TextPipeline().clean(' abcd\n'))
+        self.assertEqual('ab cd', TextPipeline(lowercase=True).clean('AB Cd'))
+
+    def test_transform(self):
+        s = 'The road goes ever on and on,<br />down from the road where it began. I don\'t know'
+        self.assertEqual(['The', 'road', 'goes', 'ever', 'on', 'and', 'on,<br', '/>down', 'from', 'the', 'road',
+                          'where', 'it', 'began.', 'I', "don't", 'know'], TextPipeline().transform(s))
+        pipeline = TextPipeline([r'<br */?>'], lowercase=True, split_punctuation=True, stopwords=ENGLISH_STOPWORDS)
+        self.assertEqual(['road', 'goes', 'ever', ',', 'down', 'road', 'where', 'began', '.', "don't", 'know'],
+                         pipeline.transform(s))
+        self.assertEqual({'road': 2, 'goes': 1}, TextPipeline(stopwords=['the']).get_bow('the road goes the road'))
+
+    def test_transform_batch(self):
+        texts = [' The road <br/>goes ', '', 'ever ON,and on']
+        for pipeline in [TextPipeline(), TextPipeline([r'<br */?>']),
+                         TextPipeline([r'<br */?>'], lowercase=True, split_punctuation=True, stopwords=['and'])]:
+            self.assertEqual([pipeline.transform(text) for text in texts], pipeline.transform_batch(texts))
+
+    def test_get_fingerprint(self):
+        self.assertEqual(TextPipeline([r'<br */?>']).get_fingerprint(), TextPipeline((r'<br */?>',)).get_fingerprint())
+        self.assertNotEqual(TextPipeline([r'<br */?>']).get_fingerprint(), TextPipeline().get_fingerprint())
+        self.assertNotEqual(TextPipeline().get_fingerprint(), TextPipeline(lowercase=True).get_fingerprint())
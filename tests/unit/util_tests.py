@@ -1,6 +1,157 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
-from utils import ConfigHelper, HttpHelper, get_sample_dataset, StringHelper, FileHelper
+import numpy as np
+
+from utils import ConfigHelper, HttpHelper, get_sample_dataset, StringHelper, FileHelper, \
+    ReservoirSampler, IndexedLineReader, ArrayCache, get_streaming_sample_dataset, ProfileHelper
+
+
+class _RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves TestHttpHelper.content at any path, supports 'Range: bytes=<start>-' requests
+    """
+    def do_GET(self):
+        content = TestHttpHelper.content
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest())
+        TestHttpHelper.requests.append(self.headers.get('Range'))
+        start = 0
+        # ranges are ignored if content changed since the client's copy, see If-Range
+        if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            start = int(self.headers['Range'][len('bytes='):-1])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */{}'.format(len(content)))
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHttpHelper(unittest.TestCase):
+    content: bytes = os.urandom(100000)
+    requests: list = []
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), _RangeRequestHandler)
+        cls.url = 'http://127.0.0.1:{}/data.tar.gz'.format(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        TestHttpHelper.requests = []
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.local_file_path = os.path.join(self.temp_dir, 'data.tar.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _read_local_file(self) -> bytes:
+        with open(self.local_file_path, 'rb') as f:
+            return f.read()
+
+    def test_download_file(self):
+        HttpHelper.download_file(self.url, self.local_file_path, chunk_size=1000)
+        self.assertEqual(self.content, self._read_local_file())
+        self.assertFalse(os.path.exists(self.local_file_path + '.part'))
+
+    def test_download_file_cache(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        HttpHelper.download_file(self.url, self.local_file_path, cache_dir=self.cache_dir)
+        self.assertEqual(self.content, self._read_local_file())
+        self.assertEqual(1, len(self.requests))
+
+        # repeat downloads are served from the cache, with or without a checksum
+        os.remove(self.local_file_path)
+        HttpHelper.download_file(self.url, self.local_file_path, cache_dir=self.cache_dir)
+        HttpHelper.download_file(self.url, self.local_file_path, sha256=sha256.upper(), cache_dir=self.cache_dir)
+        self.assertEqual(self.content, self._read_local_file())
+        self.assertEqual(1, len(self.requests))
+
+        # corrupt cached files are downloaded again
+        with open(os.path.join(self.cache_dir, 'objects', sha256), 'wb') as f:
+            f.write(b'corrupt')
+        HttpHelper.download_file(self.url, self.local_file_path, cache_dir=self.cache_dir)
+        self.assertEqual(self.content, self._read_local_file())
+        self.assertEqual(2, len(self.requests))
+
+    def test_download_file_checksum_mismatch(self):
+        self.assertRaises(ValueError, HttpHelper.download_file, self.url, self.local_file_path,
+                          sha256='0' * 64, cache_dir=self.cache_dir)
+        self.assertFalse(os.path.exists(self.local_file_path))
+        self.assertEqual(['objects'], os.listdir(self.cache_dir))
+
+    def _write_partial_file(self, content: bytes, etag: str = None, length: int = None):
+        """
+        Simulates an interrupted download into the cache
+        """
+        url_key = hashlib.sha256(self.url.encode('utf-8')).hexdigest()
+        partial_file_path = os.path.join(self.cache_dir, '{}.part'.format(url_key))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(partial_file_path, 'wb') as f:
+            f.write(content)
+        if etag is not None:
+            with open(HttpHelper._get_validators_file_path(partial_file_path), 'w', encoding='utf-8') as f:
+                json.dump({'etag': etag, 'last_modified': None, 'length': length}, f)
+
+    def test_download_file_resume(self):
+        etag = '"{}"'.format(hashlib.sha256(self.content).hexdigest())
+        self._write_partial_file(self.content[:30000], etag, len(self.content))
+        HttpHelper.download_file(self.url, self.local_file_path, cache_dir=self.cache_dir)
+        self.assertEqual(self.content, self._read_local_file())
+        self.assertEqual(['bytes=30000-'], self.requests)
+        # partial and validators files are gone
+        url_key = hashlib.sha256(self.url.encode('utf-8')).hexdigest()
+        self.assertEqual(['{}.ref'.format(url_key), 'objects'], sorted(os.listdir(self.cache_dir)))
+
+        # a complete partial file only costs a (416) request, when its checksum is known
+        shutil.rmtree(self.cache_dir)
+        TestHttpHelper.requests = []
+        self._write_partial_file(self.content, etag, len(self.content))
+        HttpHelper.download_file(self.url, self.local_file_path, sha256=hashlib.sha256(self.content).hexdigest(),
+                                 cache_dir=self.cache_dir)
+        self.assertEqual(self.content, self._read_local_file())
+        self.assertEqual(['bytes=100000-'], self.requests)
+
+    def test_download_file_restart(self):
+        etag = '"{}"'.format(hashlib.sha256(self.content).hexdigest())
+        for partial_content, partial_etag, length, expected_requests in [
+                # no validators saved, the partial file can't be trusted
+                (self.content[:30000], None, None, [None]),
+                # content changed, the server ignores the range
+                (os.urandom(30000), '"old"', 200000, ['bytes=30000-']),
+                # content of another length
+                (self.content[:30000], etag, 200000, ['bytes=30000-', None]),
+                # partial file larger than content, without a checksum
+                (self.content + b'stale', etag, len(self.content), ['bytes=100005-', None])]:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            TestHttpHelper.requests = []
+            self._write_partial_file(partial_content, partial_etag, length)
+            HttpHelper.download_file(self.url, self.local_file_path, cache_dir=self.cache_dir)
+            self.assertEqual(self.content, self._read_local_file())
+            self.assertEqual(expected_requests, self.requests)
 
 
 class TestUtils(unittest.TestCase):
@@ -48,6 +199,51 @@ class TestUtils(unittest.TestCase):
                 # and row indices are bounded within [0, #rows of the class)
                 self.assertTrue(c in class_counts_dict and 0 <= i <= class_counts_dict[c])
 
+    def test_get_sample_dataset_stratified(self):
+        class_counts = [('A', 100), ('B', 91), ('C', 109)]
+        for n in [1, 3, 200, 300]:
+            sample = get_sample_dataset(class_counts, n, stratified=True)
+            self.assertEqual(n, len(set(sample)))
+            for c, count in class_counts:
+                # no.of rows per class is proportional to the class size, after rounding
+                n_class_rows = len([i for sc, i in sample if sc == c])
+                self.assertLessEqual(abs(n_class_rows - count * n / 300), 1)
+                self.assertTrue(all(0 <= i < count for sc, i in sample if sc == c))
+
+    def test_get_sample_dataset_is_reproducible(self):
+        class_counts = [('A', 10 ** 9), ('B', 10 ** 10)]
+        for stratified in [False, True]:
+            sample = get_sample_dataset(class_counts, 1000, stratified, random.Random(3))
+            self.assertEqual(sample, get_sample_dataset(class_counts, 1000, stratified, random.Random(3)))
+            self.assertEqual(1000, len(set(sample)))
+            self.assertTrue(all(0 <= i < n for c, i in sample for cc, n in class_counts if c == cc))
+
+    def test_get_streaming_sample_dataset(self):
+        row_classes = ['A'] * 100 + ['B'] * 91 + ['C'] * 109
+        random.Random(1).shuffle(row_classes)
+        self.assertEqual([], get_streaming_sample_dataset(iter(row_classes), 400))
+        sample = get_streaming_sample_dataset(iter(row_classes), 300)
+        self.assertEqual(sorted([('A', i) for i in range(100)] + [('B', i) for i in range(91)] +
+                                [('C', i) for i in range(109)]), sorted(sample))
+        sample = get_streaming_sample_dataset(iter(row_classes), 50, random.Random(2))
+        self.assertEqual(50, len(set(sample)))
+        self.assertEqual(sample, get_streaming_sample_dataset(iter(row_classes), 50, random.Random(2)))
+
+    def test_reservoir_sampler(self):
+        sampler = ReservoirSampler(10, random.Random(5))
+        for i in range(1000):
+            sampler.add(i)
+        sample = sampler.get_sample()
+        self.assertEqual(1000, sampler.n_seen)
+        self.assertEqual(10, len(set(sample)))
+        self.assertTrue(all(0 <= i < 1000 for i in sample))
+
+        # fewer items than sample size
+        sampler = ReservoirSampler(10)
+        for i in range(3):
+            sampler.add(i)
+        self.assertEqual([0, 1, 2], sorted(sampler.get_sample()))
+
     def test_find_markups(self):
         markups = StringHelper.find_markups('this is a <test> string <> to find <markups>. N is <= 10 or >= 20 >>><<< END!')
         self.assertEqual(['<test>', '<>', '<markups>', '<= 10 or >'], markups)
@@ -55,3 +251,135 @@ class TestUtils(unittest.TestCase):
     def test_read_lines(self):
         lines = [line for line in FileHelper.read_lines('text_file_for_test.txt')]
         self.assertEqual(7, len(lines))
+
+        # only \n ends a line, same as when reading byte ranges
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'lines.txt')
+            with open(file_path, 'wb') as f:
+                f.write(b'a\rb\r\nc\n\rd')
+            self.assertEqual(['a\rb\r\n', 'c\n', '\rd'], list(FileHelper.read_lines(file_path)))
+            self.assertEqual(list(FileHelper.read_lines_in_range(file_path, 0, 9)),
+                             list(FileHelper.read_lines(file_path)))
+
+    def test_get_line_aligned_shards(self):
+        with open('text_file_for_test.txt', 'rb') as f:
+            content = f.read()
+        for n_shards in [1, 2, 3, 7, 100]:
+            shards = FileHelper.get_line_aligned_shards('text_file_for_test.txt', n_shards)
+            self.assertLessEqual(len(shards), n_shards)
+            self.assertEqual(0, shards[0][0])
+            self.assertEqual(len(content), shards[-1][1])
+            lines = []
+            for i, (start, end) in enumerate(shards):
+                if i > 0:
+                    # shards are contiguous and begin at the beginning of a line
+                    self.assertEqual(shards[i-1][1], start)
+                    self.assertEqual(b'\n'[0], content[start-1])
+                lines.extend(FileHelper.read_lines_in_range('text_file_for_test.txt', start, end))
+            self.assertEqual(list(FileHelper.read_lines('text_file_for_test.txt')), lines)
+
+    def test_get_complete_lines_size(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'lines.txt')
+            for content, size in [(b'', 0), (b'abc', 0), (b'ab\ncd\n', 6), (b'ab\ncd', 3), (b'ab\n' + b'x' * 100, 3)]:
+                with open(file_path, 'wb') as f:
+                    f.write(content)
+                self.assertEqual(size, FileHelper.get_complete_lines_size(file_path, block_size=16))
+
+    def test_indexed_line_reader(self):
+        lines = list(FileHelper.read_lines('text_file_for_test.txt'))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, 'lines.txt')
+            shutil.copy('text_file_for_test.txt', file_path)
+            with IndexedLineReader(file_path) as reader:
+                self.assertEqual(len(lines), len(reader))
+                self.assertEqual(lines, [reader[i] for i in range(len(reader))])
+                self.assertEqual(lines[-1], reader[-1])
+                self.assertRaises(IndexError, reader.__getitem__, len(lines))
+                self.assertEqual([lines[3], lines[0]], reader.get_lines([3, 0]))
+                sample = reader.sample(4, np.random.default_rng(1))
+                self.assertEqual(4, len(sample))
+                self.assertTrue(all(line in lines for line in sample))
+                batches = list(reader.iter_batches(3))
+                self.assertEqual([3, 3, 1], [len(batch) for batch in batches])
+                self.assertEqual(sorted(lines), sorted(line for batch in batches for line in batch))
+            self.assertTrue(os.path.isfile(file_path + IndexedLineReader.INDEX_FILE_SUFFIX))
+
+            # index is rebuilt when the file changes, last line need not end with a newline
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write('1 new line')
+            with IndexedLineReader(file_path) as reader:
+                self.assertEqual(len(lines) + 1, len(reader))
+                self.assertEqual('1 new line', reader[-1])
+
+            # empty file
+            open(file_path, 'w').close()
+            with IndexedLineReader(file_path) as reader:
+                self.assertEqual(0, len(reader))
+
+    def test_array_cache(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ArrayCache(temp_dir, max_bytes=2500)
+            self.assertIsNone(cache.get('a'))
+            cache.put('a', {'x': np.arange(100), 'y': np.array(5)})
+            arrays = cache.get('a')
+            self.assertEqual(list(range(100)), arrays['x'].tolist())
+            self.assertEqual(5, int(arrays['y']))
+            self.assertIsInstance(arrays['x'], np.memmap)
+
+            # least recently used entries are evicted once the cache exceeds max_bytes
+            cache.put('b', {'x': np.arange(100)})
+            os.utime(os.path.join(temp_dir, 'b'), (0, 0))
+            cache.put('c', {'x': np.arange(100)})
+            self.assertEqual(['a', 'c'], sorted(os.listdir(temp_dir)))
+
+
+class TestProfileHelper(unittest.TestCase):
+    def tearDown(self):
+        ProfileHelper.enable(False)
+        ProfileHelper.reset()
+
+    @ProfileHelper.profile('decorated')
+    def _decorated(self, x):
+        ProfileHelper.count('calls')
+        return x + 1
+
+    def test_disabled(self):
+        with ProfileHelper.span('stage') as span:
+            span.add(1, 10)
+        ProfileHelper.count('counter')
+        self.assertEqual(2, self._decorated(1))
+        self.assertEqual({'stages': {}, 'counters': {}}, ProfileHelper.get_summary())
+
+    def test_spans_and_counters(self):
+        ProfileHelper.enable()
+        with ProfileHelper.span('outer') as outer:
+            outer.add(n_items=2)
+            for _ in range(3):
+                with ProfileHelper.span('inner') as inner:
+                    inner.add(1, 100)
+            self.assertEqual(2, self._decorated(1))
+        ProfileHelper.count('counter', 5)
+        summary = ProfileHelper.get_summary()
+        self.assertEqual(['outer', 'outer/inner', 'outer/decorated'], list(summary['stages']))
+        self.assertEqual({'n_calls': 1, 'n_items': 2, 'n_bytes': 0},
+                         {k: v for k, v in summary['stages']['outer'].items() if k != 'seconds'})
+        self.assertEqual({'n_calls': 3, 'n_items': 3, 'n_bytes': 300},
+                         {k: v for k, v in summary['stages']['outer/inner'].items() if k != 'seconds'})
+        self.assertGreaterEqual(summary['stages']['outer']['seconds'], summary['stages']['outer/inner']['seconds'])
+        self.assertEqual({'counter': 5, 'calls': 1}, summary['counters'])
+        self.assertEqual(summary, json.loads(ProfileHelper.to_json()))
+
+        # failed stages are recorded too
+        with self.assertRaises(ValueError):
+            with ProfileHelper.span('failed'):
+                raise ValueError()
+        self.assertEqual(1, ProfileHelper.get_summary()['stages']['failed']['n_calls'])
+
+    def test_file_helper_stages(self):
+        ProfileHelper.enable()
+        FileHelper.get_sha256('text_file_for_test.txt')
+        self.assertEqual(7, len(list(FileHelper.read_lines('text_file_for_test.txt'))))
+        summary = ProfileHelper.get_summary()
+        self.assertEqual(os.path.getsize('text_file_for_test.txt'), summary['stages']['sha256']['n_bytes'])
+        self.assertEqual(7, summary['counters']['lines_read'])
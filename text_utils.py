@@ -0,0 +1,102 @@
+"""
+Text normalization and tokenization
+"""
+import collections
+import hashlib
+import json
+import re
+
+# a small list of frequent English function words
+ENGLISH_STOPWORDS: frozenset = frozenset('''
+a an and are as at be been but by for from had has have he her his i if in into is it its me my no not of on or our
+she so than that the their them then there these they this to was we were what when which who will with you your
+'''.split())
+
+# words (with inner apostrophes, Eg: don't) or single punctuation characters
+WORD_PUNCTUATION_PATTERN: str = r"\w+(?:'\w+)*|[^\w\s]"
+
+
+class TextPipeline:
+    """
+    Cleans and tokenizes text. All patterns are compiled once, when the pipeline is created
+
+    Cleaning:
+        > removes leading/trailing whitespaces
+        > replaces substrings matching any of whitespace_patterns with a space, in a single pass. Eg: <br />
+        > optionally, converts text to lower case
+    Tokenization:
+        > splits text on whitespaces, or optionally into words and punctuation characters (Eg: 'on,' -> 'on', ',')
+        > optionally, drops stopwords
+    """
+    def __init__(self, whitespace_patterns=(), lowercase: bool = False, split_punctuation: bool = False,
+                 stopwords=None):
+        """
+        whitespace_patterns: regular expressions of substrings to be replaced with a space
+        lowercase: convert text to lower case
+        split_punctuation: split punctuation characters into separate tokens
+        stopwords: tokens to drop. Eg: ENGLISH_STOPWORDS. Matched after lower casing, if lowercase is True
+        """
+        self.whitespace_patterns = tuple(whitespace_patterns)
+        self.lowercase = lowercase
+        self.split_punctuation = split_punctuation
+        self.stopwords = frozenset(stopwords) if stopwords else frozenset()
+        self._whitespace_regex = re.compile('|'.join('(?:{})'.format(p) for p in self.whitespace_patterns)) \
+            if self.whitespace_patterns else None
+        self._token_regex = re.compile(WORD_PUNCTUATION_PATTERN) if split_punctuation else None
+
+    def clean(self, text: str) -> str:
+        text = text.strip()
+        if self._whitespace_regex is not None:
+            text = self._whitespace_regex.sub(' ', text)
+        if self.lowercase:
+            text = text.lower()
+        return text
+
+    def tokenize(self, text: str) -> list:
+        """
+        Splits (already cleaned) text into tokens
+        """
+        tokens = self._token_regex.findall(text) if self._token_regex is not None else text.split()
+        if self.stopwords:
+            stopwords = self.stopwords
+            tokens = [token for token in tokens if token not in stopwords]
+        return tokens
+
+    def transform(self, text: str) -> list:
+        """
+        Cleans and tokenizes text, returns a list of tokens
+        """
+        return self.tokenize(self.clean(text))
+
+    def transform_batch(self, texts) -> list:
+        """
+        Same as transform, applied to every text in given iterable. Returns a list of lists of tokens
+        """
+        if self.lowercase or self.split_punctuation or self.stopwords:
+            transform = self.transform
+            return [transform(text) for text in texts]
+        # fast path, leading/trailing whitespaces need not be removed as split() drops them anyway
+        if self._whitespace_regex is None:
+            return [text.split() for text in texts]
+        sub = self._whitespace_regex.sub
+        return [sub(' ', text).split() for text in texts]
+
+    def get_bow(self, text: str) -> collections.Counter:
+        """
+        Cleans and tokenizes text, returns a bag-of-words representation (a dictionary of token counts)
+        """
+        return collections.Counter(self.transform(text))
+
+    def get_settings(self) -> dict:
+        return {
+            'whitespace_patterns': list(self.whitespace_patterns),
+            'lowercase': self.lowercase,
+            'split_punctuation': self.split_punctuation,
+            'stopwords': sorted(self.stopwords),
+        }
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a hash of pipeline settings. Pipelines with the same fingerprint produce the same tokens
+        """
+        return hashlib.sha256(json.dumps(self.get_settings(), sort_keys=True).encode('utf-8')).hexdigest()
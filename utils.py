@@ -1,10 +1,24 @@
 """
 Module for utility functions and helper classes
 """
+import bisect
+import collections
+import functools
+import gzip
+import hashlib
+import json
+import itertools
+import mmap
 import os
 import re
+import shutil
+import threading
+import time
+import uuid
 from configparser import ConfigParser, ExtendedInterpolation, NoOptionError, NoSectionError
+from multiprocessing import shared_memory
 
+import numpy as np
 import requests
 from requests import Response
 import logging
@@ -30,21 +44,327 @@ class ConfigHelper:
             return default_value
 
 
+class _Span:
+    """
+    A stage being timed, see ProfileHelper.span
+    """
+    __slots__ = ('name', 'n_items', 'n_bytes', '_start')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.n_items = 0
+        self.n_bytes = 0
+        self._start = None
+
+    def add(self, n_items: int = 0, n_bytes: int = 0):
+        """
+        Adds to no.of items (Eg: files, lines, reviews) and bytes processed in the stage
+        """
+        self.n_items += n_items
+        self.n_bytes += n_bytes
+
+    def __enter__(self):
+        stack = ProfileHelper._get_span_stack()
+        if stack:
+            self.name = '{}/{}'.format(stack[-1].name, self.name)
+        stack.append(self)
+        ProfileHelper._get_stage(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        elapsed = time.perf_counter() - self._start
+        ProfileHelper._get_span_stack().pop()
+        with ProfileHelper._lock:
+            stage = ProfileHelper._get_stage(self.name)
+            stage['n_calls'] += 1
+            stage['seconds'] += elapsed
+            stage['n_items'] += self.n_items
+            stage['n_bytes'] += self.n_bytes
+
+
+class _NullSpan:
+    """
+    Span returned when profiling is disabled, records nothing
+    """
+    def add(self, n_items: int = 0, n_bytes: int = 0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+class ProfileHelper:
+    """
+    Records wall time, no.of calls, items and bytes of named stages, and named counters
+    Disabled by default. When disabled, spans and counters only cost a function call and a flag check
+
+    Stages nest: a stage started within another stage (in the same thread) is recorded as '<outer stage>/<stage>'
+    Only the current process is recorded, work done in worker processes (Eg: corpus loaders with n_workers > 1) is
+    accounted to the stage waiting for it
+    Eg:
+        ProfileHelper.enable()
+        with ProfileHelper.span('download') as span:
+            ...
+            span.add(n_bytes=n)
+        ProfileHelper.count('cache_hits')
+        print(ProfileHelper.to_json())
+    """
+    enabled: bool = False
+    _stages: dict = {}
+    _counters: collections.Counter = collections.Counter()
+    _lock = threading.Lock()
+    _local = threading.local()
+    _null_span = _NullSpan()
+
+    @classmethod
+    def enable(cls, enabled: bool = True):
+        cls.enabled = enabled
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._stages = {}
+            cls._counters = collections.Counter()
+
+    @classmethod
+    def span(cls, name: str):
+        """
+        Returns a context manager timing the stage. Use its add(n_items, n_bytes) to record items/bytes processed
+        """
+        return _Span(name) if cls.enabled else cls._null_span
+
+    @classmethod
+    def profile(cls, name: str = None):
+        """
+        Decorator, times every call of the function as a stage. Stage name defaults to the function name
+        Generator functions are timed until they return a generator, use span within generators instead
+        """
+        def decorator(function):
+            stage_name = name or function.__name__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return function(*args, **kwargs)
+                with _Span(stage_name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def count(cls, name: str, value: int = 1):
+        if cls.enabled:
+            with cls._lock:
+                cls._counters[name] += value
+
+    @classmethod
+    def get_summary(cls) -> dict:
+        """
+        Returns a dictionary {'stages': {<stage>: {'n_calls', 'seconds', 'n_items', 'n_bytes'}}, 'counters': {...}}
+        Stages are in the order they were first started
+        """
+        with cls._lock:
+            return {
+                'stages': {name: dict(stage) for name, stage in cls._stages.items()},
+                'counters': dict(cls._counters),
+            }
+
+    @classmethod
+    def to_json(cls) -> str:
+        return json.dumps(cls.get_summary(), indent=2)
+
+    @classmethod
+    def _get_span_stack(cls) -> list:
+        stack = getattr(cls._local, 'stack', None)
+        if stack is None:
+            stack = cls._local.stack = []
+        return stack
+
+    @classmethod
+    def _get_stage(cls, name: str) -> dict:
+        stage = cls._stages.get(name)
+        if stage is None:
+            stage = cls._stages.setdefault(name, {'n_calls': 0, 'seconds': 0.0, 'n_items': 0, 'n_bytes': 0})
+        return stage
+
+
 class HttpHelper:
     """
     Helper for HTTP operations
     """
+    DEFAULT_CHUNK_SIZE: int = 1024 * 1024
+    # seconds to wait for a connection, and for each read from it
+    TIMEOUT: tuple = (10, 60)
+    CONTENT_RANGE_PATTERN = re.compile(r'bytes (?:(\d+)-\d+|\*)/(\d+|\*)')
+
     @classmethod
-    def _http_get(cls, url, stream=False) -> Response:
-        return requests.get(url, stream=stream)
+    def _http_get(cls, url, stream=False, headers: dict = None) -> Response:
+        return requests.get(url, stream=stream, headers=headers, timeout=cls.TIMEOUT)
 
     @classmethod
-    def download_file(cls, url: str, local_file_path: str):
-        with cls._http_get(url, stream=True) as r:
+    def download_file(cls, url: str, local_file_path: str, chunk_size: int = None, sha256: str = None,
+                      cache_dir: str = None):
+        """
+        Downloads given URL and saves the content into local_file_path
+
+        chunk_size: no.of bytes read/written at a time, defaults to 'download_chunk_size' config value
+        sha256: optional expected SHA-256 hex digest of the content. A ValueError is raised if downloaded content
+            doesn't match
+        cache_dir: optional folder to cache downloaded files in. Cached files are stored by content hash, and
+            reused (without any network access) as long as their content is intact and matches sha256, if given
+
+        Partially downloaded files are kept (in cache_dir, or next to local_file_path) and the download is resumed
+        using an HTTP Range request the next time, if the content hasn't changed since (see _download_partial_file)
+        """
+        if chunk_size is None:
+            chunk_size = int(ConfigHelper.get_config_value('download_chunk_size',
+                                                           default_value=cls.DEFAULT_CHUNK_SIZE))
+        if sha256:
+            sha256 = sha256.lower()
+        if not cache_dir:
+            partial_file_path = '{}.part'.format(local_file_path)
+            cls._download_partial_file(url, partial_file_path, chunk_size, sha256)
+            cls._verify_sha256(partial_file_path, sha256)
+            os.replace(partial_file_path, local_file_path)
+            return
+
+        cached_file_path = cls._get_cached_file_path(cache_dir, url, sha256)
+        if cached_file_path:
+            LOGGER.debug('Using cached file %s for %s', cached_file_path, url)
+            ProfileHelper.count('download_cache_hits')
+        else:
+            url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+            partial_file_path = os.path.join(cache_dir, '{}.part'.format(url_key))
+            os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+            cls._download_partial_file(url, partial_file_path, chunk_size, sha256)
+            digest = cls._verify_sha256(partial_file_path, sha256)
+            cached_file_path = os.path.join(cache_dir, 'objects', digest)
+            os.replace(partial_file_path, cached_file_path)
+            with open(os.path.join(cache_dir, '{}.ref'.format(url_key)), 'w', encoding='utf-8') as f:
+                f.write(digest)
+        FileHelper.link_or_copy(cached_file_path, local_file_path)
+
+    @classmethod
+    def _download_partial_file(cls, url: str, partial_file_path: str, chunk_size: int, sha256: str = None):
+        """
+        Downloads given URL into partial_file_path, resuming from the end of partial_file_path if it exists
+
+        ETag/Last-Modified and length of the content are saved next to the partial file (see _get_validators_file_path)
+        when a download starts. A download is resumed only if they are known: If-Range makes the server send all of
+        the content if it changed, and the range returned must continue the partial file, for content of the same
+        length. Otherwise the download restarts from byte 0
+        A partial file is taken to be complete, when the requested range is beyond the end of content (416), only if
+        sha256 is given (it's verified by the caller). Without it, the download restarts
+        """
+        validators_file_path = cls._get_validators_file_path(partial_file_path)
+        validators = {}
+        if os.path.exists(validators_file_path):
+            with open(validators_file_path, 'r', encoding='utf-8') as f:
+                validators = json.load(f)
+        validator = validators.get('etag') or validators.get('last_modified')
+        offset = os.path.getsize(partial_file_path) if os.path.exists(partial_file_path) and validator else 0
+        headers = {'Range': 'bytes={}-'.format(offset), 'If-Range': validator} if offset else None
+        with ProfileHelper.span('http_download') as span, cls._http_get(url, stream=True, headers=headers) as r:
+            if offset and r.status_code == 416:
+                if sha256:
+                    # requested range is beyond the end of content, partial file should be complete
+                    LOGGER.debug('%s is already downloaded into %s', url, partial_file_path)
+                    os.remove(validators_file_path)
+                    return
+                restart_reason = 'range beyond the end of content'
+            elif offset and r.status_code == 206:
+                restart_reason = cls._get_range_mismatch(r.headers.get('Content-Range'), offset,
+                                                         validators.get('length'))
+            else:
+                restart_reason = None
+            if restart_reason:
+                r.close()
+                LOGGER.warning('Restarting download of %s (%s)', url, restart_reason)
+                os.remove(partial_file_path)
+                os.remove(validators_file_path)
+                return cls._download_partial_file(url, partial_file_path, chunk_size, sha256)
             r.raise_for_status()
-            with open(local_file_path, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=4096):
+            if offset and r.status_code == 206:
+                LOGGER.debug('Resuming download of %s from byte %s', url, offset)
+                ProfileHelper.count('download_resumes')
+                mode = 'ab'
+            else:
+                mode = 'wb'
+                cls._save_validators(r, validators_file_path)
+            with open(partial_file_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=chunk_size):
                     f.write(chunk)
+                    span.add(n_bytes=len(chunk))
+            span.add(n_items=1)
+        os.remove(validators_file_path)
+
+    @classmethod
+    def _get_validators_file_path(cls, partial_file_path: str) -> str:
+        return '{}.json'.format(partial_file_path)
+
+    @classmethod
+    def _save_validators(cls, r: Response, validators_file_path: str):
+        """
+        Saves ETag, Last-Modified and length of the content of a (200) response
+        """
+        length = r.headers.get('Content-Length')
+        validators = {
+            'etag': r.headers.get('ETag'),
+            'last_modified': r.headers.get('Last-Modified'),
+            'length': int(length) if length and 'Content-Encoding' not in r.headers else None,
+        }
+        with open(validators_file_path, 'w', encoding='utf-8') as f:
+            json.dump(validators, f)
+
+    @classmethod
+    def _get_range_mismatch(cls, content_range: str, offset: int, length: int = None):
+        """
+        Returns why a partial (206) response doesn't continue a partial file of offset bytes, of content of given
+        length (if known), None if it does
+        """
+        match = cls.CONTENT_RANGE_PATTERN.fullmatch(content_range or '')
+        if match is None or match.group(1) is None:
+            return 'invalid Content-Range {}'.format(content_range)
+        if int(match.group(1)) != offset:
+            return 'range starts at byte {}, expected {}'.format(match.group(1), offset)
+        if length is not None and match.group(2) != str(length):
+            return 'content length changed from {} to {}'.format(length, match.group(2))
+        return None
+
+    @classmethod
+    def _verify_sha256(cls, file_path: str, sha256: str = None) -> str:
+        """
+        Returns SHA-256 hex digest of given file. Raises ValueError (and deletes the file) if it doesn't match sha256
+        """
+        digest = FileHelper.get_sha256(file_path)
+        if sha256 and digest != sha256:
+            os.remove(file_path)
+            raise ValueError('SHA-256 of downloaded file is {}, expected {}'.format(digest, sha256))
+        return digest
+
+    @classmethod
+    def _get_cached_file_path(cls, cache_dir: str, url: str, sha256: str = None):
+        """
+        Returns path of the cached copy of given URL, or None if there's no intact cached copy
+        """
+        if not sha256:
+            ref_file_path = os.path.join(cache_dir, '{}.ref'.format(hashlib.sha256(url.encode('utf-8')).hexdigest()))
+            if not os.path.isfile(ref_file_path):
+                return None
+            with open(ref_file_path, 'r', encoding='utf-8') as f:
+                sha256 = f.read().strip()
+        cached_file_path = os.path.join(cache_dir, 'objects', sha256)
+        if not os.path.isfile(cached_file_path):
+            return None
+        if FileHelper.get_sha256(cached_file_path) != sha256:
+            LOGGER.warning('Cached file %s is corrupt, deleting it', cached_file_path)
+            os.remove(cached_file_path)
+            return None
+        return cached_file_path
 
 
 class StringHelper:
@@ -58,20 +378,350 @@ class StringHelper:
 
 
 class FileHelper:
+    READ_BUFFER_SIZE: int = 1024 * 1024
+
     @classmethod
-    def read_lines(cls, file_path: str):
+    def read_lines(cls, file_path: str, buffer_size: int = None):
         """
-        Reads one line at a time and yields the same
+        Reads one line at a time and yields the same. Files ending with .gz are decompressed
+        Lines end with '\n' only (no universal newlines), a '\r' is kept as is, same as read_lines_in_range
+        buffer_size: no.of bytes read from the file at a time, defaults to READ_BUFFER_SIZE
         """
-        with open(file_path, 'r', encoding="utf-8") as f:
-            while True:
+        n_lines = 0
+        if file_path.endswith('.gz'):
+            f = gzip.open(file_path, 'rt', encoding='utf-8', newline='\n')
+        else:
+            f = open(file_path, 'r', encoding='utf-8', newline='\n', buffering=buffer_size or cls.READ_BUFFER_SIZE)
+        with f:
+            for line in f:
+                n_lines += 1
+                yield line
+        ProfileHelper.count('lines_read', n_lines)
+
+    @classmethod
+    def get_line_aligned_shards(cls, file_path: str, n_shards: int) -> list:
+        """
+        Splits a file into (at most) n_shards byte ranges of about equal size, each range starting at the beginning of
+        a line and ending after a newline (or at the end of file). Returns a list of tuples (start, end), end exclusive
+        """
+        file_size = os.path.getsize(file_path)
+        shards = []
+        with open(file_path, 'rb') as f:
+            start = 0
+            for i in range(1, n_shards + 1):
+                if start >= file_size:
+                    break
+                end = file_size * i // n_shards
+                if end <= start:
+                    continue
+                if end < file_size:
+                    # move shard boundary to the end of the line
+                    f.seek(end)
+                    end += len(f.readline())
+                shards.append((start, end))
+                start = end
+        return shards
+
+    @classmethod
+    def read_lines_in_range(cls, file_path: str, start: int, end: int):
+        """
+        Reads lines in byte range [start, end) one at a time and yields the same. start must be the beginning of a line
+        See get_line_aligned_shards
+        """
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            position = start
+            while position < end:
                 line = f.readline()
                 if len(line) == 0:
                     break
-                yield line
+                position += len(line)
+                yield line.decode('utf-8')
+
+    @classmethod
+    def get_complete_lines_size(cls, file_path: str, block_size: int = 64 * 1024) -> int:
+        """
+        Returns no.of bytes of the file up to (and including) its last newline, i.e. excluding a partially written
+        last line. Eg: when another process is appending lines to the file
+        """
+        end = os.path.getsize(file_path)
+        with open(file_path, 'rb') as f:
+            while end > 0:
+                start = max(end - block_size, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline >= 0:
+                    return start + newline + 1
+                end = start
+        return 0
+
+    @classmethod
+    def get_sha256(cls, file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """
+        Returns SHA-256 hex digest of the file's content
+        """
+        sha256 = hashlib.sha256()
+        with ProfileHelper.span('sha256') as span, open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha256.update(chunk)
+                span.add(n_bytes=len(chunk))
+            span.add(n_items=1)
+        return sha256.hexdigest()
+
+    @classmethod
+    def link_or_copy(cls, src_file_path: str, dst_file_path: str):
+        """
+        Creates a hard link to src_file_path at dst_file_path, falls back to copying if a link can't be created
+        """
+        if os.path.exists(dst_file_path):
+            os.remove(dst_file_path)
+        try:
+            os.link(src_file_path, dst_file_path)
+            ProfileHelper.count('files_linked')
+        except OSError:
+            shutil.copyfile(src_file_path, dst_file_path)
+            ProfileHelper.count('files_copied')
+
+
+class IndexedLineReader:
+    """
+    Random access to lines of a text file, without reading the whole file into memory
 
+    Start offsets of all lines are computed once and saved into an index file next to the text file. The index file is
+    rebuilt when size or modification time of the text file changes. The text file is memory mapped and only the lines
+    requested are decoded. Lines are returned as is, i.e. same as FileHelper.read_lines, including trailing newlines
 
-def get_sample_dataset(class_counts: list, sample_size: int) -> list:
+    Usage:
+        with IndexedLineReader('reviews.txt') as reader:
+            n_lines = len(reader)
+            line = reader[10]
+            lines = reader.sample(100)
+    """
+    INDEX_FILE_SUFFIX: str = '.lineidx.npz'
+    READ_CHUNK_SIZE: int = 16 * 1024 * 1024
+
+    def __init__(self, file_path: str, index_file_path: str = None):
+        self.file_path = file_path
+        self.index_file_path = index_file_path or file_path + self.INDEX_FILE_SUFFIX
+        # offsets[i] is the start of line i, offsets[-1] is the file size
+        self.offsets: np.ndarray = self._load_or_build_index()
+        self._file = open(file_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else None
+
+    def _load_or_build_index(self) -> np.ndarray:
+        stat = os.stat(self.file_path)
+        if os.path.isfile(self.index_file_path):
+            with np.load(self.index_file_path) as index:
+                if int(index['file_size']) == stat.st_size and int(index['file_mtime_ns']) == stat.st_mtime_ns:
+                    return index['offsets']
+            LOGGER.debug('Line index %s is stale', self.index_file_path)
+        LOGGER.debug('Building line index for %s', self.file_path)
+        offsets = self.build_index(self.file_path)
+        try:
+            with open(self.index_file_path, 'wb') as f:
+                np.savez(f, offsets=offsets, file_size=stat.st_size, file_mtime_ns=stat.st_mtime_ns)
+        except OSError as e:
+            LOGGER.warning('Failed to save line index %s: %s', self.index_file_path, e)
+        return offsets
+
+    @classmethod
+    def build_index(cls, file_path: str) -> np.ndarray:
+        """
+        Returns start offsets of all lines in given file, followed by the file size
+        """
+        offsets = [np.zeros(1, dtype=np.int64)]
+        position = 0
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.READ_CHUNK_SIZE), b''):
+                offsets.append(np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord('\n')) + (position + 1))
+                position += len(chunk)
+        offsets = np.concatenate(offsets)
+        if offsets[-1] != position:
+            # last line doesn't end with a newline
+            offsets = np.append(offsets, position)
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('Line index {} out of range'.format(i))
+        return self._mmap[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def get_lines(self, indices) -> list:
+        """
+        Returns lines at given indices, in the given order
+        """
+        return [self[i] for i in np.asarray(indices, dtype=np.int64).tolist()]
+
+    def sample(self, sample_size: int, rng: np.random.Generator = None) -> list:
+        """
+        Returns a uniform random sample (without replacement) of lines
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        return self.get_lines(rng.choice(len(self), size=sample_size, replace=False))
+
+    def iter_batches(self, batch_size: int, shuffle: bool = True, rng: np.random.Generator = None):
+        """
+        Yields all lines, as lists of (at most) batch_size lines, in random order if shuffle is True
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        order = rng.permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(order), batch_size):
+            yield self.get_lines(order[start:start + batch_size])
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ArrayCache:
+    """
+    On-disk cache of named NumPy arrays. Each cache entry is a folder of .npy files, named after the cache key
+    Cached arrays are memory mapped when read, so reading an entry costs about the same irrespective of its size
+
+    When total size of all entries exceeds max_bytes, least recently used entries are deleted
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _get_entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str):
+        """
+        Returns a dictionary of array name -> (read-only, memory mapped) array, or None if key is not cached
+        """
+        entry_dir = self._get_entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return None
+        arrays = {}
+        for file_name in os.listdir(entry_dir):
+            if file_name.endswith('.npy'):
+                arrays[file_name[:-len('.npy')]] = np.load(os.path.join(entry_dir, file_name), mmap_mode='r')
+        # mark entry as recently used
+        os.utime(entry_dir)
+        return arrays
+
+    def put(self, key: str, arrays: dict):
+        """
+        Saves given dictionary of array name -> array. Entries are written to a temp folder first and then renamed,
+        so readers never see partially written entries
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_entry_dir = os.path.join(self.cache_dir, '.{}.{}'.format(key, uuid.uuid4()))
+        os.makedirs(temp_entry_dir)
+        try:
+            for name, arr in arrays.items():
+                np.save(os.path.join(temp_entry_dir, '{}.npy'.format(name)), arr)
+            entry_dir = self._get_entry_dir(key)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(temp_entry_dir, entry_dir)
+        finally:
+            if os.path.isdir(temp_entry_dir):
+                shutil.rmtree(temp_entry_dir)
+        self.evict(keep_key=key)
+
+    def evict(self, keep_key: str = None):
+        """
+        Deletes least recently used entries (except keep_key), until total size is within max_bytes
+        """
+        if self.max_bytes is None or not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._get_entry_dir(key)
+            if key.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            size = sum(os.path.getsize(os.path.join(entry_dir, f)) for f in os.listdir(entry_dir))
+            entries.append((os.path.getmtime(entry_dir), key, size))
+        total_size = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            if key == keep_key:
+                continue
+            LOGGER.debug('Evicting cache entry %s of %s bytes', key, size)
+            shutil.rmtree(self._get_entry_dir(key))
+            total_size -= size
+
+
+class SharedArrays:
+    """
+    NumPy arrays copied into a single block of shared memory, so that worker processes can read them without the
+    arrays being pickled. Only a small spec (block name, and dtype/shape/offset of each array) is passed to workers
+
+    Eg:
+        with SharedArrays.create({'x': x}) as shared:
+            executor = ProcessPoolExecutor(initializer=init_worker, initargs=(shared.spec,))
+            ...
+        def init_worker(spec):
+            global x
+            x = SharedArrays.attach(spec).arrays['x']
+
+    The creating process owns the block, closing it (or exiting the with block) frees shared memory. Workers must be
+    done with it by then
+    """
+    # arrays are aligned to this many bytes within the block
+    ALIGNMENT: int = 64
+
+    def __init__(self, shm: shared_memory.SharedMemory, spec: dict, owner: bool):
+        self._shm = shm
+        self.spec = spec
+        self._owner = owner
+        self.arrays = {name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+                       for name, (dtype, shape, offset) in spec['arrays'].items()}
+
+    @classmethod
+    def create(cls, arrays: dict):
+        layout = {}
+        size = 0
+        for name, a in arrays.items():
+            a = np.asarray(a)
+            layout[name] = (a.dtype.str, a.shape, size)
+            size += -(-a.nbytes // cls.ALIGNMENT) * cls.ALIGNMENT
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = cls(shm, {'name': shm.name, 'arrays': layout}, owner=True)
+        for name, a in arrays.items():
+            shared.arrays[name][...] = a
+        return shared
+
+    @classmethod
+    def attach(cls, spec: dict):
+        return cls(shared_memory.SharedMemory(name=spec['name']), spec, owner=False)
+
+    def close(self):
+        """
+        Detaches from shared memory, and frees it if this is the creating process. Arrays must not be used afterwards
+        """
+        if self._shm is None:
+            return
+        self.arrays = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def get_sample_dataset(class_counts: list, sample_size: int, stratified: bool = False, rng=None) -> list:
     """
     Given number of rows (usually files) per class, randomize uniformly and select required number of rows. Return
     a list of tuples, each tuple containing the class and row index
@@ -88,13 +738,110 @@ def get_sample_dataset(class_counts: list, sample_size: int) -> list:
     This function returns a list of tuples, each tuple is of the form (<class name/id>, row index).
     Example: [('A', 501), ('A', 943), ('C', 89), .... ]
 
+    Rows are returned in random order, so any slice of the sample (Eg: first N rows for training and the rest for
+    validation) is a uniform random sample too. Time and memory needed are proportional to the sample size, not to
+    the population size
+
     class_counts: a list of tuples of the form (<class name/id>, count of rows)
     required_size: no. of rows required
+    stratified: if True, no.of rows selected from each class is exactly proportional to the class size (rounded,
+        largest remainders first), instead of being proportional on average
+    rng: random number generator (Eg: random.Random(seed)), defaults to the global one in 'random' module
     """
+    rng = rng if rng is not None else random
     population_size = sum(n for _, n in class_counts)
     if population_size < sample_size:
         LOGGER.error('Sample size %s is greater than the population size %s', sample_size, population_size)
         return []
-    class_indices = [(c, i) for c, n in class_counts for i in range(n)]
-    random.shuffle(class_indices)
-    return class_indices[0:sample_size]
+    if stratified:
+        sample = [(c, i) for (c, n), k in zip(class_counts, _get_class_sample_sizes(class_counts, sample_size))
+                  for i in rng.sample(range(n), k)]
+        rng.shuffle(sample)
+        return sample
+
+    # select row ids in [0, population size), and map them to (class, row index) using class boundaries
+    class_ends = list(itertools.accumulate(n for _, n in class_counts))
+    sample = []
+    for row_id in rng.sample(range(population_size), sample_size):
+        class_id = bisect.bisect_right(class_ends, row_id)
+        class_start = class_ends[class_id] - class_counts[class_id][1]
+        sample.append((class_counts[class_id][0], row_id - class_start))
+    return sample
+
+
+def _get_class_sample_sizes(class_counts: list, sample_size: int) -> list:
+    """
+    Splits sample_size across classes, in proportion to class sizes, using largest remainder method
+    """
+    population_size = sum(n for _, n in class_counts)
+    if population_size == 0:
+        return [0] * len(class_counts)
+    quotas = [n * sample_size / population_size for _, n in class_counts]
+    sizes = [int(q) for q in quotas]
+    by_remainder = sorted(range(len(quotas)), key=lambda i: quotas[i] - sizes[i], reverse=True)
+    for i in by_remainder[:sample_size - sum(sizes)]:
+        sizes[i] += 1
+    return sizes
+
+
+def get_streaming_sample_dataset(row_classes, sample_size: int, rng=None) -> list:
+    """
+    Same as get_sample_dataset, but the population is given as an iterable of row classes (of unknown length), Eg: the
+    class of each file, while iterating an archive. Row index of a row is the no.of rows of the same class before it
+
+    Rows are selected in a single pass, using ReservoirSampler. Memory needed is proportional to the sample size
+    """
+    sampler = ReservoirSampler(sample_size, rng)
+    class_counts = collections.Counter()
+    for c in row_classes:
+        sampler.add((c, class_counts[c]))
+        class_counts[c] += 1
+    if sampler.n_seen < sample_size:
+        LOGGER.error('Sample size %s is greater than the population size %s', sample_size, sampler.n_seen)
+        return []
+    return sampler.get_sample()
+
+
+class ReservoirSampler:
+    """
+    Selects a uniform random sample of fixed size from a stream of items of unknown size, in a single pass
+    Memory used is proportional to the sample size, not to the no.of items in the stream (reservoir sampling)
+    """
+    def __init__(self, sample_size: int, rng=None):
+        """
+        sample_size: no.of items to select
+        rng: random number generator (Eg: random.Random(seed)), defaults to the global one in 'random' module
+        """
+        self.sample_size = sample_size
+        self.n_seen = 0
+        self._rng = rng if rng is not None else random
+        self._sample: list = []
+
+    def add(self, item):
+        if self.n_seen < self.sample_size:
+            self._sample.append(item)
+        else:
+            i = self._rng.randrange(self.n_seen + 1)
+            if i < self.sample_size:
+                self._sample[i] = item
+        self.n_seen += 1
+
+    def get_sample(self) -> list:
+        """
+        Returns selected items in random order. Returns all items seen, if less than sample size items were seen
+        """
+        sample = list(self._sample)
+        self._rng.shuffle(sample)
+        return sample
+
+
+def get_chunks(iterable, chunk_size: int):
+    """
+    Yields lists of (at most) chunk_size consecutive items from given iterable
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            break
+        yield chunk